@@ -29,10 +29,43 @@ def create_app():
         # Use a simple, fixed secret key for local development.
         # IMPORTANT: DO NOT use this key if the app ever becomes public.
         SECRET_KEY='local-therabot-secret-key-dev',
-        DATABASE=os.path.join(app.instance_path, DATABASE),
+        DATABASE=os.getenv('THERABOT_DATABASE') or os.path.join(app.instance_path, DATABASE),
+        # SQLite connection tuning (see app/db.py)
+        DB_POOL=os.getenv('THERABOT_DB_POOL', '1') == '1',
+        DB_BUSY_TIMEOUT_MS=int(os.getenv('THERABOT_DB_BUSY_TIMEOUT_MS', '5000')),
+        DB_SYNCHRONOUS=os.getenv('THERABOT_DB_SYNCHRONOUS', 'NORMAL'),
+        DB_CACHE_SIZE_KB=int(os.getenv('THERABOT_DB_CACHE_SIZE_KB', '16384')),
+        # Model warm-up: background, blocking or off (see app/warmup.py);
+        # THERABOT_PRELOAD_MODELS=1 is the older spelling of blocking
+        WARM_UP=os.getenv('THERABOT_WARM_UP',
+                          'blocking' if os.getenv('THERABOT_PRELOAD_MODELS') == '1' else 'background'),
+        # Persist chat turns from a background batching writer (see app/chat_writer.py)
+        CHAT_WRITE_BEHIND=os.getenv('THERABOT_CHAT_WRITE_BEHIND', '0') == '1',
+        CHAT_WRITE_BATCH_ROWS=int(os.getenv('THERABOT_CHAT_WRITE_BATCH_ROWS', '256')),
+        CHAT_WRITE_MAX_WAIT_MS=float(os.getenv('THERABOT_CHAT_WRITE_MAX_WAIT_MS', '50')),
+        CHAT_WRITE_QUEUE_SIZE=int(os.getenv('THERABOT_CHAT_WRITE_QUEUE_SIZE', '1024')),
+        # Messages rendered with the chat page / returned per /chat/history request
+        CHAT_PAGE_SIZE=int(os.getenv('THERABOT_CHAT_PAGE_SIZE', '50')),
+        # Chat admission control (see app/admission.py): per-user token bucket,
+        # global cap on messages in the pipeline, and what happens beyond it
+        # (fallback or reject); 0 turns a limit off
+        CHAT_RATE_PER_MIN=float(os.getenv('THERABOT_CHAT_RATE_PER_MIN', '20')),
+        CHAT_BURST=int(os.getenv('THERABOT_CHAT_BURST', '5')),
+        CHAT_MAX_IN_FLIGHT=int(os.getenv('THERABOT_CHAT_MAX_IN_FLIGHT', '8')),
+        CHAT_OVERLOAD=os.getenv('THERABOT_CHAT_OVERLOAD', 'fallback'),
+        # gzip/brotli-encode JSON responses of at least this size (see app/compression.py)
+        COMPRESS=os.getenv('THERABOT_COMPRESS', '1') == '1',
+        COMPRESS_MIN_BYTES=int(os.getenv('THERABOT_COMPRESS_MIN_BYTES', '1024')),
+        # Serve Prometheus metrics on /metrics (disable if the port is publicly reachable)
+        METRICS_ENABLED=os.getenv('THERABOT_METRICS_ENABLED', '1') == '1',
     )
     # Removed loading from instance/config.py
 
+    # --- Logging ---
+    # Leveled logging through a background queue so request threads never block on stderr
+    from observability import configure_logging
+    configure_logging()
+
     # --- Extensions ---
     # Initialize login_manager with the app
     login_manager.init_app(app)
@@ -54,6 +87,27 @@ def create_app():
     # --- Blueprints ---
     from . import routes
     app.register_blueprint(routes.main)
+    from . import compression
+    compression.init_app(app)
+
+    # --- Models ---
+    # Nothing heavy is imported yet; the models load on a background thread
+    # started by the first request (or by main.py at boot), or right here
+    from model_registry import registry
+    from .warmup import warmup_for_app
+    warmup = warmup_for_app(app)
+    if app.config['WARM_UP'] == 'blocking':
+        warmup.run()
+    elif app.config['WARM_UP'] == 'background':
+        app.before_request(warmup.start)
+
+    @app.cli.command('model-stats')
+    def model_stats_command():
+        """Load the shared models and report load time and memory use."""
+        import click
+        registry.warm_up()
+        for name, value in registry.stats().items():
+            click.echo(f"{name}: {value}")
 
     # --- Context Processors ---
     @app.context_processor
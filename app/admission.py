@@ -0,0 +1,167 @@
+"""Admission control for the chat pipeline.
+
+Every chat message runs emotion detection, retrieval and a Gemini call, and
+nothing used to stop one user (or everyone at once) from queueing as many of
+those as they liked. ``ChatAdmission`` decides, before any of that work
+starts, whether a message may run the full pipeline:
+
+* Per user, a token bucket: ``CHAT_RATE_PER_MIN`` messages a minute on
+  average, with bursts of up to ``CHAT_BURST``. A user over their rate gets a
+  429 with ``Retry-After`` set to when their next token arrives.
+* Globally, at most ``CHAT_MAX_IN_FLIGHT`` messages in the pipeline at once.
+  Beyond that, ``CHAT_OVERLOAD`` selects what happens: ``fallback`` answers
+  with the keyword emotion detector and a canned reply (no models, no Gemini),
+  ``reject`` returns a 429 straight away.
+
+Neither check waits: a request that is not admitted costs microseconds instead
+of a place in a queue. Limits are per server process (per gunicorn worker).
+``0`` turns either limit off.
+"""
+import math
+import threading
+import time
+
+from observability import metrics
+
+OVERLOAD_MODES = ('fallback', 'reject')
+# Retry-After for requests turned away because the server is at capacity
+CAPACITY_RETRY_AFTER_SECONDS = 1
+
+_controllers = []
+_create_lock = threading.Lock()
+
+admission_total = metrics.counter(
+    "therabot_chat_admission_total",
+    "Chat messages by admission decision (admitted, degraded, rejected) and reason."
+)
+
+
+class Admission:
+    """The outcome of ``ChatAdmission.admit``; ``release`` it once the pipeline has finished."""
+
+    def __init__(self, controller, decision, reason, retry_after=0):
+        self._controller = controller
+        self.decision = decision
+        self.reason = reason
+        self.retry_after = retry_after
+        self._held = decision == 'admitted' and controller.max_in_flight > 0
+
+    @property
+    def admitted(self):
+        return self.decision == 'admitted'
+
+    @property
+    def degraded(self):
+        return self.decision == 'degraded'
+
+    @property
+    def rejected(self):
+        return self.decision == 'rejected'
+
+    def release(self):
+        """Free the in-flight slot; safe to call more than once."""
+        if self._held:
+            self._held = False
+            self._controller._release()
+
+
+class ChatAdmission:
+    """Per-user token buckets plus a global cap on messages in the pipeline."""
+
+    def __init__(self, rate_per_min=20.0, burst=5, max_in_flight=8, overload='fallback', clock=time.monotonic):
+        if overload not in OVERLOAD_MODES:
+            raise ValueError(f"Unknown CHAT_OVERLOAD {overload!r}; expected one of {', '.join(OVERLOAD_MODES)}")
+        self.rate = max(0.0, float(rate_per_min)) / 60.0
+        self.burst = max(1, int(burst))
+        self.max_in_flight = max(0, int(max_in_flight))
+        self.overload = overload
+        self._clock = clock
+        self._buckets = {}  # user_id -> [tokens, last refill time]
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._last_prune = clock()
+        _controllers.append(self)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def _take_token(self, user_id, now):
+        """Take one of ``user_id``'s tokens; returns 0, or the seconds until one is available."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / self.rate
+
+    def _prune(self, now):
+        # A bucket untouched for as long as a full refill takes is full again,
+        # which is the same as having no bucket at all
+        refill = self.burst / self.rate
+        if now - self._last_prune < refill:
+            return
+        self._last_prune = now
+        for user_id in [u for u, (_, last) in self._buckets.items() if now - last >= refill]:
+            del self._buckets[user_id]
+
+    def admit(self, user_id):
+        """Decide, without waiting, whether ``user_id``'s message may run the full pipeline."""
+        with self._lock:
+            admission = self._decide(user_id, self._clock())
+        admission_total.inc(decision=admission.decision, reason=admission.reason)
+        return admission
+
+    def _decide(self, user_id, now):
+        if self.rate > 0:
+            self._prune(now)
+            wait = self._take_token(user_id, now)
+            if wait:
+                return Admission(self, 'rejected', 'user_rate', max(1, math.ceil(wait)))
+        if self.max_in_flight and self._in_flight >= self.max_in_flight:
+            if self.overload == 'fallback':
+                return Admission(self, 'degraded', 'capacity')
+            if self.rate > 0:
+                # Nothing ran, so the message does not count against the user's rate
+                bucket = self._buckets[user_id]
+                bucket[0] = min(self.burst, bucket[0] + 1)
+            return Admission(self, 'rejected', 'capacity', CAPACITY_RETRY_AFTER_SECONDS)
+        if self.max_in_flight:
+            self._in_flight += 1
+        return Admission(self, 'admitted', 'ok')
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+
+def admission_for_app(app):
+    """The app's ChatAdmission, created on first use."""
+    controller = app.extensions.get('chat_admission')
+    if controller is None:
+        with _create_lock:
+            controller = app.extensions.get('chat_admission')
+            if controller is None:
+                config = app.config
+                controller = ChatAdmission(
+                    rate_per_min=config.get('CHAT_RATE_PER_MIN', 20),
+                    burst=config.get('CHAT_BURST', 5),
+                    max_in_flight=config.get('CHAT_MAX_IN_FLIGHT', 8),
+                    overload=config.get('CHAT_OVERLOAD', 'fallback')
+                )
+                app.extensions['chat_admission'] = controller
+    return controller
+
+
+@metrics.register_collector
+def _admission_metrics():
+    return [
+        ("therabot_chat_in_flight", "gauge", "Chat messages currently in the full pipeline.",
+         [({}, sum(controller.in_flight for controller in _controllers))]),
+        ("therabot_chat_rate_buckets", "gauge", "Per-user chat token buckets held (users seen within one refill).",
+         [({}, sum(len(controller._buckets) for controller in _controllers))]),
+    ]
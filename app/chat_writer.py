@@ -0,0 +1,229 @@
+"""Write-behind persistence for chat_history.
+
+With ``CHAT_WRITE_BEHIND`` enabled, request threads hand finished chat turns to
+a ``ChatHistoryWriter`` instead of inserting and committing them themselves. A
+background thread drains the bounded queue and commits rows in one transaction
+per batch, once ``max_batch_rows`` rows are waiting or ``max_wait_ms`` has
+passed since the first one.
+
+* Backpressure: when the queue is full ``submit`` blocks for up to
+  ``put_timeout`` seconds, then the caller writes the turn itself.
+* Read-your-writes: the writer counts queued rows per user, and
+  ``wait_for_user`` (called before a history read) asks for an immediate flush
+  and waits until that user's rows are committed.
+* Failures: a batch is retried ``max_attempts`` times, then its rows are
+  written one per transaction; only rows that still fail are dropped.
+* Shutdown: ``close`` (registered with ``atexit``) drains the queue.
+
+The queue and the pending counts live in one process, so ``wait_for_user``
+only sees turns queued by that process. With several server processes a
+user's next request can land on another one and miss their latest turn;
+``gunicorn.conf.py`` turns write-behind off when it runs more than one worker.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from observability import metrics, record_event
+
+logger = logging.getLogger(__name__)
+
+INSERT_SQL = (
+    'INSERT INTO chat_history (user_id, sender, message, emotion, emotion_source, timestamp) '
+    'VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))'
+)
+_STOP = object()
+_writers = []
+_create_lock = threading.Lock()
+
+
+class ChatHistoryWriter:
+    """Batches chat_history inserts on a background thread."""
+
+    def __init__(self, connect, max_batch_rows=256, max_wait_ms=50.0, max_queue=1024,
+                 put_timeout=1.0, max_attempts=3):
+        self._connect = connect
+        self.max_batch_rows = max(1, int(max_batch_rows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._pending = {}  # user_id -> rows queued but not yet committed
+        self._pending_cond = threading.Condition()
+        self._flush_now = threading.Event()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self.stats = {"batches": 0, "rows": 0, "backpressure_fallbacks": 0, "failed_rows": 0}
+        _writers.append(self)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="chat-history-writer", daemon=True)
+                self._worker.start()
+
+    def submit(self, user_id, rows):
+        """
+        Queue ``rows`` (``(user_id, sender, message, emotion, emotion_source, timestamp)`` tuples)
+        for one user. Returns False if the queue stayed full for ``put_timeout``
+        seconds or the writer is closed; the caller must then write them itself.
+        """
+        if self._closed:
+            return False
+        self._ensure_worker()
+        with self._pending_cond:
+            self._pending[user_id] = self._pending.get(user_id, 0) + len(rows)
+        try:
+            self._queue.put((user_id, rows), timeout=self.put_timeout)
+        except queue.Full:
+            self._done(user_id, len(rows))
+            self.stats["backpressure_fallbacks"] += 1
+            record_event("chat_write_backpressure")
+            return False
+        return True
+
+    def wait_for_user(self, user_id, timeout=5.0):
+        """Block until every queued row for ``user_id`` is committed. Returns False on timeout."""
+        with self._pending_cond:
+            if not self._pending.get(user_id):
+                return True
+            self._flush_now.set()
+            return self._pending_cond.wait_for(lambda: not self._pending.get(user_id), timeout)
+
+    def _done(self, user_id, count):
+        with self._pending_cond:
+            remaining = self._pending.get(user_id, 0) - count
+            if remaining > 0:
+                self._pending[user_id] = remaining
+            else:
+                self._pending.pop(user_id, None)
+            self._pending_cond.notify_all()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        if batch[0] is _STOP:
+            return batch
+        rows = len(batch[0][1])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_rows and not self._flush_now.is_set():
+            remaining = deadline - time.perf_counter()
+            try:
+                # Poll in short slices so a flush request cuts the wait short
+                item = self._queue.get(timeout=min(remaining, 0.005)) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                if remaining <= 0:
+                    break
+                continue
+            batch.append(item)
+            if item is _STOP:
+                break
+            rows += len(item[1])
+        self._flush_now.clear()
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = self._collect()
+                stop = batch[-1] is _STOP
+                items = [item for item in batch if item is not _STOP]
+                if items:
+                    self._write(conn, items)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, items):
+        rows = [row for _, item_rows in items for row in item_rows]
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with conn:
+                    conn.executemany(INSERT_SQL, rows)
+                self.stats["batches"] += 1
+                self.stats["rows"] += len(rows)
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.warning("chat_history batch write failed %d times, writing its %d rows one by one: %s",
+                                   attempt, len(rows), e)
+                    self._write_rows(conn, rows)
+                    break
+                logger.warning("chat_history batch write failed (attempt %d): %s", attempt, e)
+                time.sleep(0.05 * attempt)
+        for user_id, item_rows in items:
+            self._done(user_id, len(item_rows))
+
+    def _write_rows(self, conn, rows):
+        # One transaction per row, so one bad row (or a lock held through the
+        # retries) does not take the rest of the batch with it
+        for row in rows:
+            try:
+                with conn:
+                    conn.execute(INSERT_SQL, row)
+                self.stats["rows"] += 1
+            except Exception as e:
+                self.stats["failed_rows"] += 1
+                record_event("chat_write_failed")
+                logger.error("Dropping chat_history row for user %s: %s", row[0], e)
+
+    def close(self, timeout=10.0):
+        """Stop accepting rows, commit everything queued and stop the worker."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._worker is None or not self._worker.is_alive():
+            return
+        self._flush_now.set()
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+
+def writer_for_app(app):
+    """The app's ChatHistoryWriter, created on first use."""
+    # The writer thread has no app context, so it must not hold on to current_app
+    app = getattr(app, '_get_current_object', lambda: app)()
+    writer = app.extensions.get('chat_writer')
+    if writer is None:
+        with _create_lock:
+            writer = app.extensions.get('chat_writer')
+            if writer is None:
+                from app.db import connect_for_app
+                config = app.config
+                writer = ChatHistoryWriter(
+                    lambda: connect_for_app(app),
+                    max_batch_rows=config.get('CHAT_WRITE_BATCH_ROWS', 256),
+                    max_wait_ms=config.get('CHAT_WRITE_MAX_WAIT_MS', 50.0),
+                    max_queue=config.get('CHAT_WRITE_QUEUE_SIZE', 1024)
+                )
+                app.extensions['chat_writer'] = writer
+                atexit.register(writer.close)
+    return writer
+
+
+@metrics.register_collector
+def _writer_metrics():
+    totals = {key: 0 for key in ("batches", "rows", "backpressure_fallbacks", "failed_rows")}
+    queued = 0
+    for writer in _writers:
+        for key in totals:
+            totals[key] += writer.stats[key]
+        queued += writer._queue.qsize()
+    return [
+        ("therabot_chat_write_batches_total", "counter", "Write-behind batches committed.",
+         [({}, totals["batches"])]),
+        ("therabot_chat_write_rows_total", "counter", "chat_history rows committed by the write-behind writer.",
+         [({}, totals["rows"])]),
+        ("therabot_chat_write_fallbacks_total", "counter", "Turns written synchronously because the queue was full.",
+         [({}, totals["backpressure_fallbacks"])]),
+        ("therabot_chat_write_failed_rows_total", "counter", "Rows dropped after repeated write failures.",
+         [({}, totals["failed_rows"])]),
+        ("therabot_chat_write_queue_depth", "gauge", "Turns waiting in the write-behind queue.",
+         [({}, queued)]),
+    ]
@@ -0,0 +1,61 @@
+"""Compressed JSON responses.
+
+JSON responses of at least ``COMPRESS_MIN_BYTES`` are sent brotli-encoded when
+the client accepts it and the optional ``brotli`` package is installed, else
+gzip-encoded. Journal listings, chat history pages and search results are
+mostly repetitive text and shrink several-fold; smaller bodies are not worth
+the CPU. Streamed responses (the SSE chat stream) are never buffered here.
+
+``COMPRESS`` (``THERABOT_COMPRESS``) turns it off, e.g. behind a proxy that
+compresses already.
+"""
+import gzip
+
+from flask import current_app, request
+
+from observability import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Levels for dynamic responses: most of the size reduction at a fraction of
+# the CPU of the maximum levels
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+response_bytes = metrics.counter(
+    "therabot_json_response_bytes_total", "JSON response bytes before and after compression, by encoding."
+)
+
+
+def _encode(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response):
+    if response.mimetype != 'application/json' or response.direct_passthrough or response.is_streamed:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config.get('COMPRESS_MIN_BYTES', 1024):
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if encoding is None:
+        return response
+    compressed = _encode(data, encoding)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response_bytes.inc(len(data), encoding=encoding, stage='raw')
+    response_bytes.inc(len(compressed), encoding=encoding, stage='sent')
+    return response
+
+
+def init_app(app):
+    if app.config.get('COMPRESS', True):
+        app.after_request(compress_response)
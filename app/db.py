@@ -1,28 +1,405 @@
+import datetime
+import html
+import itertools
+import logging
+import re
 import sqlite3
+import threading
 import click
 import os
 from flask import current_app, g
 
+from conversation_memory import conversation_memory
+
+logger = logging.getLogger(__name__)
+
 # g is a special object unique for each request. Used to store data during a request context.
 # current_app is another special object pointing to the Flask app handling the request.
 
+# Pooled connections, one per (worker thread, database path). sqlite3 connections
+# may only be used by the thread that created them, so a thread-local pool lets
+# every request served by the same worker reuse its already-tuned connection.
+_pool = threading.local()
+
+def _reset_pool_in_child():
+    # A forked worker must not share the parent's SQLite connections; it opens its own
+    global _pool
+    _pool = threading.local()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool_in_child)
+
+def connect(path, busy_timeout_ms=5000, synchronous='NORMAL', cache_size_kb=16384):
+    """Open a connection with the pragmas used for the app database."""
+    conn = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=busy_timeout_ms / 1000.0
+    )
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers run alongside the single writer instead of blocking it
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+    # NORMAL only fsyncs at checkpoints; still crash-safe under WAL
+    conn.execute(f'PRAGMA synchronous={synchronous}')
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f'PRAGMA cache_size=-{int(cache_size_kb)}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+def connect_for_app(app):
+    """A new connection to ``app``'s database with its configured tuning."""
+    config = app.config
+    return connect(
+        config['DATABASE'],
+        busy_timeout_ms=config.get('DB_BUSY_TIMEOUT_MS', 5000),
+        synchronous=config.get('DB_SYNCHRONOUS', 'NORMAL'),
+        cache_size_kb=config.get('DB_CACHE_SIZE_KB', 16384)
+    )
+
 def get_db():
     """Connect to the application's configured database. Cache the connection on 'g'."""
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
-        print(f"Database connection established for request {id(g)}.")
+        if not current_app.config.get('DB_POOL', True):
+            g.db = connect_for_app(current_app)
+            g.db_pooled = False
+            return g.db
+        connections = getattr(_pool, 'connections', None)
+        if connections is None:
+            connections = _pool.connections = {}
+        path = current_app.config['DATABASE']
+        if path not in connections:
+            connections[path] = connect_for_app(current_app)
+        g.db = connections[path]
+        g.db_pooled = True
     return g.db
 
 def close_db(e=None):
-    """Close the database connection if it was opened."""
+    """Return the connection to the pool (or close it if pooling is disabled)."""
     db = g.pop('db', None)
-    if db is not None:
+    pooled = g.pop('db_pooled', False)
+    if db is None:
+        return
+    if not pooled:
         db.close()
-        print(f"Database connection closed for request {id(g)}.")
+    elif db.in_transaction:
+        # Never hand a half-finished transaction to the next request on this thread
+        db.rollback()
+
+def close_pool():
+    """Close this thread's pooled connections (e.g. before deleting the database file)."""
+    for conn in getattr(_pool, 'connections', {}).values():
+        conn.close()
+    _pool.connections = {}
+
+def insert_chat_turn(user_id, user_message, bot_reply, emotion, received_at=None, emotion_source='model'):
+    """
+    Write both rows of a chat turn in one transaction.
+
+    ``received_at`` (``YYYY-MM-DD HH:MM:SS`` UTC) keeps the user row stamped with
+    when the message arrived rather than when the reply finished. ``bot_reply``
+    may be None when the reply never completed; only the user row is written.
+    ``emotion_source`` is ``'model'`` for a detected emotion and ``'user'`` for
+    a mood the user picked; ``flask rescore-emotions`` never touches the latter.
+
+    With ``CHAT_WRITE_BEHIND`` the rows are queued for the background writer
+    (see app/chat_writer.py) and this returns without touching the database.
+    """
+    rows = [(user_id, 'user', user_message, None, None, received_at)]
+    if bot_reply is not None:
+        rows.append((user_id, 'bot', bot_reply, emotion, emotion_source, None))
+    if current_app.config.get('CHAT_WRITE_BEHIND', False):
+        from app.chat_writer import writer_for_app
+        # Stamp rows now so batching delay does not shift their timestamps
+        now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [row[:5] + (row[5] or now,) for row in rows]
+        writer = writer_for_app(current_app)
+        if writer.submit(user_id, rows):
+            return
+        # Queue full: keep this user's rows in order, then write synchronously
+        writer.wait_for_user(user_id)
+    db = get_db()
+    with db:
+        db.executemany(
+            'INSERT INTO chat_history (user_id, sender, message, emotion, emotion_source, timestamp) '
+            'VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))',
+            rows
+        )
+
+def _wait_for_pending_writes(user_id):
+    """Make the user's own queued write-behind rows visible before reading history."""
+    writer = current_app.extensions.get('chat_writer')
+    if writer is not None:
+        writer.wait_for_user(user_id)
+
+def load_conversation_memory(user_id):
+    """The user's rolling summary and recent turns, for the next prompt (None if disabled)."""
+    _wait_for_pending_writes(user_id)
+    try:
+        return conversation_memory.load(get_db(), user_id)
+    except sqlite3.OperationalError as e:
+        # Most likely a database that predates migration 0002; chat still works without memory
+        logger.warning("Conversation memory unavailable (run 'flask db-upgrade'?): %s", e)
+        return None
+
+def schedule_memory_update(user_id, summarize):
+    """Fold turns that left the verbatim window into the summary, off the request thread."""
+    app = current_app._get_current_object()
+    conversation_memory.schedule_update(lambda: connect_for_app(app), user_id, summarize)
+
+def fetch_chat_page(user_id, before=None, limit=50):
+    """
+    Return ``(rows, has_more)``: up to ``limit`` chat messages older than message
+    ``before`` (or the latest ones), oldest first.
+
+    Keyset pagination on ``(timestamp, id)`` walks idx_chat_history_user_timestamp
+    backwards, so every page costs the same however long the history is.
+    """
+    _wait_for_pending_writes(user_id)
+    db = get_db()
+    if before is None:
+        rows = db.execute(
+            'SELECT id, sender, message, emotion, timestamp FROM chat_history '
+            'WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?',
+            (user_id, limit + 1)
+        ).fetchall()
+    else:
+        rows = db.execute(
+            'SELECT id, sender, message, emotion, timestamp FROM chat_history '
+            'WHERE user_id = ? AND (timestamp, id) < '
+            '(SELECT timestamp, id FROM chat_history WHERE id = ? AND user_id = ?) '
+            'ORDER BY timestamp DESC, id DESC LIMIT ?',
+            (user_id, before, user_id, limit + 1)
+        ).fetchall()
+    has_more = len(rows) > limit
+    return rows[:limit][::-1], has_more
+
+JOURNAL_PREVIEW_CHARS = 100
+# Millisecond updated_at stamps, so two saves in the same second still change
+# the listing's validators
+JOURNAL_TIMESTAMP_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+def journal_preview(content):
+    """The listing preview stored with each entry (migration 0005)."""
+    if len(content) > JOURNAL_PREVIEW_CHARS:
+        return content[:JOURNAL_PREVIEW_CHARS] + '...'
+    return content
+
+def journal_list_state(user_id, date_from, date_to):
+    """
+    ``(count, last_updated)`` of the user's entries dated ``date_from`` to
+    ``date_to``: any save or delete in the range changes one of them, so they
+    validate a cached listing without reading the entries.
+    """
+    row = get_db().execute(
+        'SELECT COUNT(*), MAX(updated_at) FROM journal_entries WHERE user_id = ? AND entry_date BETWEEN ? AND ?',
+        (user_id, date_from, date_to)
+    ).fetchone()
+    return row[0], row[1]
+
+def fetch_journal_page(user_id, date_from, date_to, limit):
+    """
+    Return ``(rows, has_more)``: up to ``limit`` of the user's entries dated
+    ``date_from`` to ``date_to``, newest first.
+    """
+    rows = get_db().execute(
+        'SELECT id, entry_date, mood, preview FROM journal_entries '
+        'WHERE user_id = ? AND entry_date BETWEEN ? AND ? ORDER BY entry_date DESC LIMIT ?',
+        (user_id, date_from, date_to, limit + 1)
+    ).fetchall()
+    return rows[:limit], len(rows) > limit
+
+def journal_match_query(text, user_id):
+    """
+    Build the FTS5 MATCH expression for a user's search box ``text``, or None if
+    it has no searchable words.
+
+    Every word must match; "quoted phrases" match as phrases and a trailing ``*``
+    matches a prefix. Terms are passed to FTS5 as quoted strings, so operators
+    or column filters typed by the user are plain words, never query syntax.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"?|(\S+)', text):
+        words = re.findall(r'\w+', phrase or word)
+        if words:
+            term = '"' + ' '.join(words) + '"'
+            terms.append(term + ' *' if word.endswith('*') else term)
+    if not terms:
+        return None
+    return f'owner:"u{int(user_id)}" AND content:({" ".join(terms)})'
+
+# BM25 term-frequency saturation and length normalisation (see search_journal)
+JOURNAL_SEARCH_K1 = 1.2
+JOURNAL_SEARCH_B = 0.75
+
+def search_journal(user_id, text, date_from=None, date_to=None, mood=None, limit=20):
+    """
+    Rank the user's journal entries against ``text`` (best first), optionally
+    within ``[date_from, date_to]`` and for one ``mood``.
+
+    Returns dicts with ``snippet_html``: the best-matching fragment, HTML-escaped,
+    with matched terms in ``<mark>``.
+    """
+    match = journal_match_query(text, user_id)
+    if match is None:
+        return []
+    db = get_db()
+    # CROSS JOIN keeps the index lookup first; led by journal_entries, SQLite
+    # would re-run the MATCH once per entry of the user
+    sql = (
+        'SELECT j.id, j.entry_date, j.mood, length(j.content) AS length, '
+        'highlight(journal_fts, 1, char(2), char(3)) AS marked '
+        'FROM journal_fts CROSS JOIN journal_entries j ON j.id = journal_fts.rowid '
+        'WHERE journal_fts MATCH ? AND j.user_id = ?'
+    )
+    params = [match, user_id]
+    if date_from:
+        sql += ' AND j.entry_date >= ?'
+        params.append(date_from)
+    if date_to:
+        sql += ' AND j.entry_date <= ?'
+        params.append(date_to)
+    if mood:
+        sql += ' AND j.mood = ?'
+        params.append(mood)
+    rows = db.execute(sql, params).fetchall()
+    if not rows:
+        return []
+
+    # Not ORDER BY bm25(): its IDF walks each term's postings for every user's
+    # entries (~100 ms for a common phrase at 300k entries). All candidates
+    # contain every term, so rank them by BM25's saturated, length-normalised
+    # frequency of highlighted terms, which only needs this user's matches.
+    # (Entry length in characters stands in for length in words.)
+    average_length = sum(row['length'] for row in rows) / len(rows) or 1
+    scored = []
+    for row in rows:
+        hits = row['marked'].count('\x02')
+        norm = JOURNAL_SEARCH_K1 * (1 - JOURNAL_SEARCH_B + JOURNAL_SEARCH_B * row['length'] / average_length)
+        scored.append((hits * (JOURNAL_SEARCH_K1 + 1) / (hits + norm), row['entry_date'], row))
+    scored.sort(key=lambda item: item[:2], reverse=True)
+
+    return [
+        {
+            'id': row['id'],
+            'date': row['entry_date'],
+            'mood': row['mood'],
+            'score': round(score, 4),
+            'snippet_html': _snippet_html(row['marked']),
+        }
+        for score, _, row in scored[:limit]
+    ]
+
+def _snippet_html(marked, words=16):
+    """
+    The ``words``-word window of highlighted text with the most matches, as
+    HTML. Cut here rather than with FTS5's snippet(), which would run the
+    MATCH again for every result.
+    """
+    tokens = []
+    inside = False
+    for token in re.finditer(r'\w+|[\x02\x03]', marked):
+        if token.group() in '\x02\x03':
+            inside = token.group() == '\x02'
+        else:
+            tokens.append((token.start(), token.end(), inside))
+    if not tokens:
+        return html.escape(marked.replace('\x02', '').replace('\x03', ''))
+    # hits[i]: matched words among the first i
+    hits = list(itertools.accumulate((hit for _, _, hit in tokens), initial=0))
+    last_start = max(len(tokens) - words, 0)
+    best = max(range(last_start + 1), key=lambda i: hits[min(i + words, len(tokens))] - hits[i])
+    if hits[-1]:
+        # Lead into the first match with a few words of context
+        first = next(i for i in range(best, len(tokens)) if tokens[i][2])
+        best = max(best, min(first - words // 4, last_start))
+    start = tokens[best][0] if best > 0 else 0
+    end = tokens[best + words - 1][1] if best + words < len(tokens) else len(marked)
+    text = marked[start:end]
+    if marked.rfind('\x02', 0, start) > marked.rfind('\x03', 0, start):
+        text = '\x02' + text
+    if text.rfind('\x02') > text.rfind('\x03'):
+        text += '\x03'
+    text = ('…' if start > 0 else '') + text + ('…' if end < len(marked) else '')
+    return html.escape(text).replace('\x02', '<mark>').replace('\x03', '</mark>')
+
+def backfill_journal_search(db, batch_size=1000):
+    """
+    Index journal entries that predate migration 0003, ``batch_size`` rows per
+    transaction so the app keeps writing in between. Safe to rerun: rows that
+    are already indexed are skipped. Returns the number of rows indexed.
+    """
+    indexed = 0
+    last_id = 0
+    while True:
+        # IMMEDIATE: no trigger can index a row between the SELECT and the INSERT
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(
+                'SELECT id, owner, content FROM journal_fts_source WHERE id > ? '
+                'AND id NOT IN (SELECT id FROM journal_fts_docsize) ORDER BY id LIMIT ?',
+                (last_id, batch_size)
+            ).fetchall()
+            db.executemany('INSERT INTO journal_fts (rowid, owner, content) VALUES (?, ?, ?)',
+                           [tuple(row) for row in rows])
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        if not rows:
+            return indexed
+        indexed += len(rows)
+        last_id = rows[-1][0]
+
+# What mood_daily and mood_weekly should hold, computed from the raw tables
+# (see migrations/0004_mood_rollups.sql)
+MOOD_DAILY_SQL = (
+    "SELECT user_id, date(timestamp) AS day, 'chat' AS source, emotion AS mood, COUNT(*) AS count "
+    "FROM chat_history WHERE sender = 'bot' AND emotion IS NOT NULL "
+    "GROUP BY user_id, date(timestamp), emotion "
+    "UNION ALL "
+    "SELECT user_id, entry_date, 'journal', COALESCE(mood, 'none'), COUNT(*) "
+    "FROM journal_entries GROUP BY user_id, entry_date, COALESCE(mood, 'none')"
+)
+MOOD_WEEKLY_SQL = (
+    "SELECT user_id, date(day, 'weekday 0', '-6 days') AS week, source, mood, SUM(count) AS count "
+    f"FROM ({MOOD_DAILY_SQL}) GROUP BY user_id, date(day, 'weekday 0', '-6 days'), source, mood"
+)
+
+def rebuild_mood_rollups(db):
+    """Recompute both mood rollup tables from the raw tables in one transaction."""
+    with db:
+        db.execute('DELETE FROM mood_daily')
+        db.execute(f'INSERT INTO mood_daily (user_id, day, source, mood, count) {MOOD_DAILY_SQL}')
+        db.execute('DELETE FROM mood_weekly')
+        db.execute('INSERT INTO mood_weekly (user_id, week, source, mood, count) '
+                   "SELECT user_id, date(day, 'weekday 0', '-6 days'), source, mood, SUM(count) "
+                   "FROM mood_daily GROUP BY user_id, date(day, 'weekday 0', '-6 days'), source, mood")
+    return (db.execute('SELECT COUNT(*) FROM mood_daily').fetchone()[0],
+            db.execute('SELECT COUNT(*) FROM mood_weekly').fetchone()[0])
+
+def check_mood_rollups(db):
+    """
+    Compare the mood rollups with the raw tables. Returns
+    ``[(table, user_id, period, source, mood, expected, found), ...]``, empty
+    when they agree; a count missing on either side is reported as 0.
+    """
+    mismatches = []
+    for table, period, expected_sql in (('mood_daily', 'day', MOOD_DAILY_SQL),
+                                        ('mood_weekly', 'week', MOOD_WEEKLY_SQL)):
+        actual_sql = f'SELECT user_id, {period}, source, mood, count FROM {table}'
+        # Read in one transaction so a concurrent write cannot show up as a mismatch
+        with db:
+            db.execute('BEGIN')
+            missing = db.execute(f'SELECT * FROM ({expected_sql}) EXCEPT {actual_sql}').fetchall()
+            extra = db.execute(f'{actual_sql} EXCEPT SELECT * FROM ({expected_sql})').fetchall()
+        counts = {}
+        for row in missing:
+            counts.setdefault(tuple(row[:4]), [0, 0])[0] = row[4]
+        for row in extra:
+            counts.setdefault(tuple(row[:4]), [0, 0])[1] = row[4]
+        mismatches.extend((table, *key, expected, found) for key, (expected, found) in sorted(counts.items()))
+    return mismatches
 
 def init_db():
     """Clear existing data and create new tables."""
@@ -51,6 +428,109 @@ def init_db():
         print("Default 'users' table created.")
     except Exception as e:
         print(f"Error executing schema: {e}")
+    # schema.sql describes version 0; bring the fresh database up to date
+    db.execute('PRAGMA user_version = 0')
+    migrate(db)
+
+# Numbered migration scripts, e.g. migrations/0002_add_column.sql. Each one runs
+# once, in order, inside a transaction that also bumps PRAGMA user_version.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+def available_migrations():
+    """Return ``[(version, name, path), ...]`` sorted by version."""
+    migrations = []
+    for name in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r'^(\d+)_(.+)\.sql$', name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, name)))
+    return sorted(migrations)
+
+def schema_version(db):
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(db, target=None):
+    """Apply pending migrations up to ``target`` (default: latest). Returns the applied ones."""
+    current = schema_version(db)
+    applied = []
+    for version, name, path in available_migrations():
+        if version <= current or (target is not None and version > target):
+            continue
+        with open(path, encoding='utf8') as f:
+            script = f.read()
+        try:
+            # executescript commits any pending transaction first, so the
+            # explicit BEGIN/COMMIT makes the migration and version bump atomic
+            db.executescript(f'BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;')
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        applied.append((version, name))
+    return applied
+
+# The queries on the request path. Each must be answered from an index: a
+# plain table scan or a temp b-tree sort here means a missing/unused index.
+HOT_QUERIES = {
+    'chat history (latest page)': (
+        'SELECT id, sender, message, emotion, timestamp FROM chat_history '
+        'WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?',
+        (1, 51)
+    ),
+    'chat history (older page)': (
+        'SELECT id, sender, message, emotion, timestamp FROM chat_history '
+        'WHERE user_id = ? AND (timestamp, id) < '
+        '(SELECT timestamp, id FROM chat_history WHERE id = ? AND user_id = ?) '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?',
+        (1, 100, 1, 51)
+    ),
+    'conversation memory': (
+        'SELECT id, sender, message FROM chat_history WHERE user_id = ? AND id > ? ORDER BY id DESC LIMIT ?',
+        (1, 100, 212)
+    ),
+    'journal listing': (
+        'SELECT id, entry_date, mood, preview FROM journal_entries '
+        'WHERE user_id = ? AND entry_date BETWEEN ? AND ? ORDER BY entry_date DESC LIMIT ?',
+        (1, '2024-01-01', '2024-01-31', 101)
+    ),
+    'journal listing validators': (
+        'SELECT COUNT(*), MAX(updated_at) FROM journal_entries WHERE user_id = ? AND entry_date BETWEEN ? AND ?',
+        (1, '2024-01-01', '2024-01-31')
+    ),
+    'journal entry': ('SELECT id FROM journal_entries WHERE user_id = ? AND entry_date = ?', (1, '2024-01-01')),
+    'journal search': (
+        'SELECT j.id, j.entry_date FROM journal_fts CROSS JOIN journal_entries j ON j.id = journal_fts.rowid '
+        'WHERE journal_fts MATCH ? AND j.user_id = ? AND j.entry_date >= ?',
+        ('owner:"u1" AND content:("exam")', 1, '2024-01-01')
+    ),
+    'insights (daily moods)': (
+        'SELECT day, source, mood, count FROM mood_daily WHERE user_id = ? AND day >= ?',
+        (1, '2024-01-01')
+    ),
+    'insights (active days)': (
+        "SELECT day, MAX(source = 'journal') FROM mood_daily WHERE user_id = ? GROUP BY day ORDER BY day",
+        (1,)
+    ),
+    'insights (weekly moods)': (
+        'SELECT week, source, mood, count FROM mood_weekly WHERE user_id = ? AND week >= ?',
+        (1, '2024-01-01')
+    ),
+    'user by id': ('SELECT * FROM users WHERE id = ?', (1,)),
+    'user by name': ('SELECT * FROM users WHERE username = ?', ('alice',)),
+}
+
+def check_query_plans(db, queries=None):
+    """Return ``{name: (plan_lines, problems)}`` from EXPLAIN QUERY PLAN for each hot query."""
+    results = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        plan = [row[3] for row in db.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+        problems = [
+            line for line in plan
+            # "VIRTUAL TABLE INDEX n:M..." is an FTS5 MATCH lookup, not a scan
+            if (line.startswith('SCAN') and 'USING' not in line and ':M' not in line)
+            or 'USE TEMP B-TREE' in line
+        ]
+        results[name] = (plan, problems)
+    return results
 
 
 @click.command('init-db')
@@ -59,9 +539,122 @@ def init_db_command():
     init_db()
     click.echo('Initialized the database.')
 
+@click.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Stop at this schema version.')
+def db_upgrade_command(target):
+    """Apply pending schema migrations without touching existing data."""
+    db = get_db()
+    before = schema_version(db)
+    applied = migrate(db, target)
+    for version, name in applied:
+        click.echo(f'Applied migration {version:04d} {name}')
+    click.echo(f'Schema version {before} -> {schema_version(db)}.')
+
+@click.command('db-check-plans')
+def db_check_plans_command():
+    """Fail if any hot query is planned as a table scan or temp b-tree sort."""
+    failed = []
+    for name, (plan, problems) in check_query_plans(get_db()).items():
+        click.echo(f"{'FAIL' if problems else 'ok  '} {name}: {'; '.join(plan)}")
+        if problems:
+            failed.append(name)
+    if failed:
+        raise click.ClickException(f"Unindexed hot queries: {', '.join(failed)} (run 'flask db-upgrade')")
+
+@click.command('journal-search-backfill')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+@click.option('--rebuild', is_flag=True, help='Re-index every entry from scratch in one transaction.')
+@click.option('--check', is_flag=True, help='Verify the index against journal_entries afterwards.')
+def journal_search_backfill_command(batch_size, rebuild, check):
+    """Index journal entries written before journal search existed."""
+    db = get_db()
+    if rebuild:
+        with db:
+            db.execute("INSERT INTO journal_fts (journal_fts) VALUES ('rebuild')")
+        click.echo('Rebuilt the journal search index.')
+    else:
+        click.echo(f'Indexed {backfill_journal_search(db, batch_size)} journal entries.')
+    with db:
+        db.execute("INSERT INTO journal_fts (journal_fts) VALUES ('optimize')")
+    if check:
+        try:
+            db.execute("INSERT INTO journal_fts (journal_fts, rank) VALUES ('integrity-check', 1)")
+        except sqlite3.DatabaseError as e:
+            raise click.ClickException(f'Journal search index is inconsistent ({e}); run with --rebuild')
+        click.echo('Journal search index is consistent.')
+
+@click.command('mood-rollups-rebuild')
+def mood_rollups_rebuild_command():
+    """Recompute the mood rollups behind /insights from chat history and journal entries."""
+    daily, weekly = rebuild_mood_rollups(get_db())
+    click.echo(f'Rebuilt mood rollups: {daily} daily and {weekly} weekly rows.')
+
+@click.command('mood-rollups-check')
+@click.option('--show', type=int, default=20, show_default=True, help='Mismatches to list.')
+def mood_rollups_check_command(show):
+    """Check that the mood rollups match chat history and journal entries."""
+    mismatches = check_mood_rollups(get_db())
+    for table, user_id, period, source, mood, expected, found in mismatches[:show]:
+        click.echo(f'{table}: user {user_id} {period} {source} {mood}: expected {expected}, found {found}')
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} mood rollup rows are inconsistent; '
+                                   'run "flask mood-rollups-rebuild"')
+    click.echo('Mood rollups are consistent.')
+
+@click.command('rescore-emotions')
+@click.option('--workers', type=int, default=min(4, os.cpu_count() or 1), show_default=True,
+              help='Classifier processes (0: classify in this process).')
+@click.option('--batch-rows', type=int, default=512, show_default=True,
+              help='Replies read, labelled and committed together.')
+@click.option('--infer-batch', type=int, default=64, show_default=True, help='Messages per classifier pass.')
+@click.option('--dry-run', is_flag=True, help='Write a report of the labels that would change; update nothing.')
+@click.option('--report', default='emotion-rescore-report.csv', show_default=True,
+              help='CSV report written by --dry-run.')
+@click.option('--restart', is_flag=True, help="Ignore this classifier's checkpoint and start from the first reply.")
+@click.option('--limit', type=int, default=None, help='Stop after this many replies.')
+def rescore_emotions_command(workers, batch_rows, infer_batch, dry_run, report, restart, limit):
+    """Recompute the emotion of stored bot replies with the current classifier."""
+    from app.rescore import rescore_emotions
+    db = get_db()
+    last_report = [0.0]
+
+    def progress(stats):
+        if stats['seconds'] - last_report[0] >= 5:
+            last_report[0] = stats['seconds']
+            click.echo(f"  {stats['scanned']} replies, {stats['changed']} changed, "
+                       f"{stats['scanned'] / stats['seconds']:.0f} rows/s")
+
+    try:
+        stats = rescore_emotions(db, workers=workers, batch_rows=batch_rows, infer_batch=infer_batch,
+                                 dry_run=dry_run, report=report, restart=restart, limit=limit, progress=progress)
+    except sqlite3.OperationalError as e:
+        raise click.ClickException(f'{e} (run "flask db-upgrade")')
+    except KeyboardInterrupt:
+        raise click.ClickException('Interrupted; run the command again to resume from the last committed batch.')
+    rate = stats['scanned'] / stats['seconds'] if stats['seconds'] else 0
+    if stats['resumed_from']:
+        click.echo(f"Resumed after chat_history id {stats['resumed_from']}.")
+    click.echo(f"{'Would change' if dry_run else 'Changed'} {stats['changed']} of {stats['scanned']} reply "
+               f"emotions with {stats['model']} in {stats['seconds']:.1f}s ({rate:.0f} rows/s).")
+    for (old, new), count in stats['transitions'].most_common():
+        click.echo(f'  {old} -> {new}: {count}')
+    skipped = stats['skipped']
+    if skipped:
+        click.echo(f"Left {sum(skipped.values())} replies alone: {skipped['user_picked']} with a mood the user "
+                   f"picked, {skipped['unknown_source']} written before emotion sources were recorded, "
+                   f"{skipped['unpaired']} with no user message before them.")
+    if dry_run:
+        click.echo(f'Report written to {report}.')
+
 def init_app(app):
     """Register database functions with the Flask app."""
     # Tell Flask to call close_db when cleaning up after returning the response
     app.teardown_appcontext(close_db)
     # Add the new command to be called with the 'flask' command
-    app.cli.add_command(init_db_command)
\ No newline at end of file
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_check_plans_command)
+    app.cli.add_command(journal_search_backfill_command)
+    app.cli.add_command(mood_rollups_rebuild_command)
+    app.cli.add_command(mood_rollups_check_command)
+    app.cli.add_command(rescore_emotions_command)
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""Mood insights for ``/insights``, read from the mood rollups.
+
+``mood_daily`` and ``mood_weekly`` (migrations/0004_mood_rollups.sql) count each
+user's moods per day and per week and are kept current by triggers on every chat
+reply and journal save. ``mood_insights`` reads only those rows, so its cost
+grows with the number of days a user has been active, not with the length of
+their chat history. Chat days are UTC dates; journal days are the entry dates.
+"""
+import datetime
+
+# How pleasant each mood is, for the week-over-week trend
+MOOD_VALENCE = {'happy': 1.0, 'neutral': 0.0, 'worried': -1.0, 'sad': -1.0, 'angry': -1.0}
+
+
+def _distribution(counts):
+    total = sum(counts.values())
+    return {
+        'total': total,
+        'counts': dict(sorted(counts.items(), key=lambda item: -item[1])),
+        'shares': {mood: round(count / total, 3) for mood, count in counts.items()} if total else {},
+    }
+
+
+def _valence(counts):
+    """Mean valence of the moods in ``counts``, or None if none of them has one."""
+    scored = [(MOOD_VALENCE[mood], count) for mood, count in counts.items() if mood in MOOD_VALENCE]
+    total = sum(count for _, count in scored)
+    return round(sum(value * count for value, count in scored) / total, 3) if total else None
+
+
+def _streaks(days, today):
+    """
+    Longest run of consecutive dates in the sorted ``days``, and the current
+    one: the run ending today, or yesterday if today has nothing yet.
+    """
+    longest = run = 0
+    previous = None
+    for day in days:
+        run = run + 1 if previous is not None and (day - previous).days == 1 else 1
+        longest = max(longest, run)
+        previous = day
+    current = run if previous is not None and (today - previous).days <= 1 else 0
+    return {'current': current, 'longest': longest}
+
+
+def mood_insights(db, user_id, days=30, today=None):
+    """
+    Mood distribution over the last ``days`` days, journaling and activity
+    streaks, and this week's moods against last week's.
+    """
+    today = today or datetime.datetime.utcnow().date()
+    since = today - datetime.timedelta(days=days - 1)
+
+    by_source = {'chat': {}, 'journal': {}}
+    for row in db.execute('SELECT day, source, mood, count FROM mood_daily WHERE user_id = ? AND day >= ?',
+                          (user_id, since.isoformat())):
+        if row['mood'] != 'none' and row['source'] in by_source:
+            counts = by_source[row['source']]
+            counts[row['mood']] = counts.get(row['mood'], 0) + row['count']
+    combined = {}
+    for counts in by_source.values():
+        for mood, count in counts.items():
+            combined[mood] = combined.get(mood, 0) + count
+
+    active_days, journal_days = [], []
+    for day, journaled in db.execute(
+        "SELECT day, MAX(source = 'journal') FROM mood_daily WHERE user_id = ? GROUP BY day ORDER BY day",
+        (user_id,)
+    ):
+        try:
+            day = datetime.date.fromisoformat(day)
+        except ValueError:
+            continue
+        active_days.append(day)
+        if journaled:
+            journal_days.append(day)
+
+    this_week = today - datetime.timedelta(days=today.weekday())
+    last_week = this_week - datetime.timedelta(days=7)
+    weeks = {this_week.isoformat(): {}, last_week.isoformat(): {}}
+    for row in db.execute('SELECT week, source, mood, count FROM mood_weekly WHERE user_id = ? AND week >= ?',
+                          (user_id, last_week.isoformat())):
+        counts = weeks.get(row['week'])
+        if counts is not None and row['mood'] != 'none':
+            counts[row['mood']] = counts.get(row['mood'], 0) + row['count']
+    current, previous = weeks[this_week.isoformat()], weeks[last_week.isoformat()]
+    current_share, previous_share = _distribution(current)['shares'], _distribution(previous)['shares']
+    current_valence, previous_valence = _valence(current), _valence(previous)
+
+    return {
+        'window': {'from': since.isoformat(), 'to': today.isoformat(), 'days': days},
+        'distribution': {
+            'combined': _distribution(combined),
+            'chat': _distribution(by_source['chat']),
+            'journal': _distribution(by_source['journal']),
+        },
+        'streaks': {
+            'journal': _streaks(journal_days, today),
+            'active': _streaks(active_days, today),
+        },
+        'week_over_week': {
+            'this_week': this_week.isoformat(),
+            'last_week': last_week.isoformat(),
+            'moods': {
+                mood: {
+                    'this_week': current.get(mood, 0),
+                    'last_week': previous.get(mood, 0),
+                    'share_change': round(current_share.get(mood, 0) - previous_share.get(mood, 0), 3),
+                }
+                for mood in sorted(set(current) | set(previous))
+            },
+            'valence': {
+                'this_week': current_valence,
+                'last_week': previous_valence,
+                'change': (round(current_valence - previous_valence, 3)
+                           if current_valence is not None and previous_valence is not None else None),
+            },
+        },
+    }
@@ -0,0 +1,5 @@
+-- /chat loads a user's history ordered by time. Without this index that query
+-- scans the whole chat_history table and sorts the result in a temp b-tree.
+-- id breaks ties between rows written in the same second.
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_timestamp
+  ON chat_history (user_id, timestamp, id);
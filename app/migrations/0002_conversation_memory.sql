@@ -0,0 +1,13 @@
+-- Per-user rolling summary of the conversation (see conversation_memory.py).
+-- summarized_through_id is the last chat_history row folded into the summary.
+CREATE TABLE IF NOT EXISTS conversation_memory (
+  user_id INTEGER PRIMARY KEY,
+  summary TEXT NOT NULL DEFAULT '',
+  summarized_through_id INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+-- Memory reads the newest rows after summarized_through_id in id order
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_id
+  ON chat_history (user_id, id);
@@ -0,0 +1,35 @@
+-- Full-text search over journal entries (see search_journal in app/db.py).
+--
+-- journal_fts is an external-content FTS5 index: entry text is stored only in
+-- journal_entries and read through journal_fts_source, which adds an "owner"
+-- token ("u<user_id>") to every row. Searches require owner:"u<id>", so a query
+-- walks that user's postings rather than every user's.
+CREATE VIEW IF NOT EXISTS journal_fts_source AS
+  SELECT id, 'u' || user_id AS owner, content FROM journal_entries;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS journal_fts USING fts5(
+  owner, content,
+  content='journal_fts_source', content_rowid='id',
+  tokenize='porter unicode61 remove_diacritics 2'
+);
+
+-- Keep the index in step with journal_entries. Rows written before this
+-- migration are indexed by 'flask journal-search-backfill'; until then the
+-- 'delete' halves skip them (journal_fts_docsize lists the indexed rowids),
+-- because removing text that was never indexed would corrupt the index.
+CREATE TRIGGER IF NOT EXISTS journal_fts_insert AFTER INSERT ON journal_entries BEGIN
+  INSERT INTO journal_fts (rowid, owner, content) VALUES (new.id, 'u' || new.user_id, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS journal_fts_delete AFTER DELETE ON journal_entries BEGIN
+  INSERT INTO journal_fts (journal_fts, rowid, owner, content)
+    SELECT 'delete', old.id, 'u' || old.user_id, old.content
+    WHERE EXISTS (SELECT 1 FROM journal_fts_docsize WHERE id = old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS journal_fts_update AFTER UPDATE OF user_id, content ON journal_entries BEGIN
+  INSERT INTO journal_fts (journal_fts, rowid, owner, content)
+    SELECT 'delete', old.id, 'u' || old.user_id, old.content
+    WHERE EXISTS (SELECT 1 FROM journal_fts_docsize WHERE id = old.id);
+  INSERT INTO journal_fts (rowid, owner, content) VALUES (new.id, 'u' || new.user_id, new.content);
+END;
@@ -0,0 +1,114 @@
+-- Per-user mood rollups for /insights (see app/insights.py).
+--
+-- mood_daily and mood_weekly count moods per user per day and per week (the
+-- Monday it starts on) from two sources: 'chat', the emotion of each bot
+-- reply (days in UTC), and 'journal', the mood of each entry ('none' when no
+-- mood was picked). The triggers below keep them in step with chat_history
+-- and journal_entries, so insights read a few rollup rows instead of grouping
+-- the whole history. 'flask mood-rollups-check' compares them with the raw
+-- tables and 'flask mood-rollups-rebuild' recomputes them.
+CREATE TABLE IF NOT EXISTS mood_daily (
+  user_id INTEGER NOT NULL,
+  day TEXT NOT NULL,
+  source TEXT NOT NULL,
+  mood TEXT NOT NULL,
+  count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, day, source, mood)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS mood_weekly (
+  user_id INTEGER NOT NULL,
+  week TEXT NOT NULL,
+  source TEXT NOT NULL,
+  mood TEXT NOT NULL,
+  count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, week, source, mood)
+) WITHOUT ROWID;
+
+INSERT INTO mood_daily (user_id, day, source, mood, count)
+  SELECT user_id, date(timestamp), 'chat', emotion, COUNT(*)
+  FROM chat_history WHERE sender = 'bot' AND emotion IS NOT NULL
+  GROUP BY user_id, date(timestamp), emotion
+  UNION ALL
+  SELECT user_id, entry_date, 'journal', COALESCE(mood, 'none'), COUNT(*)
+  FROM journal_entries
+  GROUP BY user_id, entry_date, COALESCE(mood, 'none');
+
+INSERT INTO mood_weekly (user_id, week, source, mood, count)
+  SELECT user_id, date(day, 'weekday 0', '-6 days'), source, mood, SUM(count)
+  FROM mood_daily
+  GROUP BY user_id, date(day, 'weekday 0', '-6 days'), source, mood;
+
+-- chat_history: only bot replies carry an emotion
+CREATE TRIGGER IF NOT EXISTS mood_rollup_chat_insert AFTER INSERT ON chat_history
+WHEN new.sender = 'bot' AND new.emotion IS NOT NULL BEGIN
+  INSERT INTO mood_daily (user_id, day, source, mood, count)
+    VALUES (new.user_id, date(new.timestamp), 'chat', new.emotion, 1)
+    ON CONFLICT (user_id, day, source, mood) DO UPDATE SET count = count + 1;
+  INSERT INTO mood_weekly (user_id, week, source, mood, count)
+    VALUES (new.user_id, date(new.timestamp, 'weekday 0', '-6 days'), 'chat', new.emotion, 1)
+    ON CONFLICT (user_id, week, source, mood) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS mood_rollup_chat_delete AFTER DELETE ON chat_history
+WHEN old.sender = 'bot' AND old.emotion IS NOT NULL BEGIN
+  UPDATE mood_daily SET count = count - 1
+    WHERE user_id = old.user_id AND day = date(old.timestamp) AND source = 'chat' AND mood = old.emotion;
+  DELETE FROM mood_daily
+    WHERE user_id = old.user_id AND day = date(old.timestamp) AND source = 'chat' AND mood = old.emotion
+    AND count <= 0;
+  UPDATE mood_weekly SET count = count - 1
+    WHERE user_id = old.user_id AND week = date(old.timestamp, 'weekday 0', '-6 days')
+    AND source = 'chat' AND mood = old.emotion;
+  DELETE FROM mood_weekly
+    WHERE user_id = old.user_id AND week = date(old.timestamp, 'weekday 0', '-6 days')
+    AND source = 'chat' AND mood = old.emotion AND count <= 0;
+END;
+
+-- journal_entries: saving an entry with the same date and mood (a content
+-- edit) leaves the rollups alone; a changed mood moves one count across
+CREATE TRIGGER IF NOT EXISTS mood_rollup_journal_insert AFTER INSERT ON journal_entries BEGIN
+  INSERT INTO mood_daily (user_id, day, source, mood, count)
+    VALUES (new.user_id, new.entry_date, 'journal', COALESCE(new.mood, 'none'), 1)
+    ON CONFLICT (user_id, day, source, mood) DO UPDATE SET count = count + 1;
+  INSERT INTO mood_weekly (user_id, week, source, mood, count)
+    VALUES (new.user_id, date(new.entry_date, 'weekday 0', '-6 days'), 'journal', COALESCE(new.mood, 'none'), 1)
+    ON CONFLICT (user_id, week, source, mood) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS mood_rollup_journal_delete AFTER DELETE ON journal_entries BEGIN
+  UPDATE mood_daily SET count = count - 1
+    WHERE user_id = old.user_id AND day = old.entry_date AND source = 'journal'
+    AND mood = COALESCE(old.mood, 'none');
+  DELETE FROM mood_daily
+    WHERE user_id = old.user_id AND day = old.entry_date AND source = 'journal'
+    AND mood = COALESCE(old.mood, 'none') AND count <= 0;
+  UPDATE mood_weekly SET count = count - 1
+    WHERE user_id = old.user_id AND week = date(old.entry_date, 'weekday 0', '-6 days')
+    AND source = 'journal' AND mood = COALESCE(old.mood, 'none');
+  DELETE FROM mood_weekly
+    WHERE user_id = old.user_id AND week = date(old.entry_date, 'weekday 0', '-6 days')
+    AND source = 'journal' AND mood = COALESCE(old.mood, 'none') AND count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS mood_rollup_journal_update AFTER UPDATE OF user_id, entry_date, mood ON journal_entries
+WHEN old.user_id != new.user_id OR old.entry_date != new.entry_date OR old.mood IS NOT new.mood BEGIN
+  UPDATE mood_daily SET count = count - 1
+    WHERE user_id = old.user_id AND day = old.entry_date AND source = 'journal'
+    AND mood = COALESCE(old.mood, 'none');
+  DELETE FROM mood_daily
+    WHERE user_id = old.user_id AND day = old.entry_date AND source = 'journal'
+    AND mood = COALESCE(old.mood, 'none') AND count <= 0;
+  UPDATE mood_weekly SET count = count - 1
+    WHERE user_id = old.user_id AND week = date(old.entry_date, 'weekday 0', '-6 days')
+    AND source = 'journal' AND mood = COALESCE(old.mood, 'none');
+  DELETE FROM mood_weekly
+    WHERE user_id = old.user_id AND week = date(old.entry_date, 'weekday 0', '-6 days')
+    AND source = 'journal' AND mood = COALESCE(old.mood, 'none') AND count <= 0;
+  INSERT INTO mood_daily (user_id, day, source, mood, count)
+    VALUES (new.user_id, new.entry_date, 'journal', COALESCE(new.mood, 'none'), 1)
+    ON CONFLICT (user_id, day, source, mood) DO UPDATE SET count = count + 1;
+  INSERT INTO mood_weekly (user_id, week, source, mood, count)
+    VALUES (new.user_id, date(new.entry_date, 'weekday 0', '-6 days'), 'journal', COALESCE(new.mood, 'none'), 1)
+    ON CONFLICT (user_id, week, source, mood) DO UPDATE SET count = count + 1;
+END;
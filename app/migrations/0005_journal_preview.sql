@@ -0,0 +1,14 @@
+-- Journal listing (see fetch_journal_page in app/db.py).
+--
+-- preview is written with the entry (journal_preview) instead of being cut
+-- from the full content of every entry on every listing request.
+ALTER TABLE journal_entries ADD COLUMN preview TEXT NOT NULL DEFAULT '';
+
+UPDATE journal_entries
+  SET preview = SUBSTR(content, 1, 100) || CASE WHEN LENGTH(content) > 100 THEN '...' ELSE '' END;
+
+-- Pages are date ranges of one user's entries; their ETag/Last-Modified come
+-- from COUNT(*) and MAX(updated_at) over the same range, read from this index
+-- alone
+CREATE INDEX IF NOT EXISTS idx_journal_entries_user_date_updated
+  ON journal_entries (user_id, entry_date, updated_at);
@@ -0,0 +1,37 @@
+-- Re-scoring stored emotions with a new classifier (see app/rescore.py).
+--
+-- One row per classifier: the last chat_history id 'flask rescore-emotions'
+-- has committed for it, so an interrupted run resumes after that row.
+CREATE TABLE IF NOT EXISTS emotion_rescore_runs (
+  model TEXT PRIMARY KEY,
+  last_id INTEGER NOT NULL DEFAULT 0,
+  scanned INTEGER NOT NULL DEFAULT 0,
+  changed INTEGER NOT NULL DEFAULT 0,
+  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Re-scoring changes the emotion of existing bot replies; move their count in
+-- the mood rollups (migrations/0004_mood_rollups.sql) from the old emotion to
+-- the new one
+CREATE TRIGGER IF NOT EXISTS mood_rollup_chat_update AFTER UPDATE OF emotion ON chat_history
+WHEN old.sender = 'bot' AND old.emotion IS NOT new.emotion BEGIN
+  UPDATE mood_daily SET count = count - 1
+    WHERE user_id = old.user_id AND day = date(old.timestamp) AND source = 'chat' AND mood = old.emotion;
+  DELETE FROM mood_daily
+    WHERE user_id = old.user_id AND day = date(old.timestamp) AND source = 'chat' AND mood = old.emotion
+    AND count <= 0;
+  UPDATE mood_weekly SET count = count - 1
+    WHERE user_id = old.user_id AND week = date(old.timestamp, 'weekday 0', '-6 days')
+    AND source = 'chat' AND mood = old.emotion;
+  DELETE FROM mood_weekly
+    WHERE user_id = old.user_id AND week = date(old.timestamp, 'weekday 0', '-6 days')
+    AND source = 'chat' AND mood = old.emotion AND count <= 0;
+  INSERT INTO mood_daily (user_id, day, source, mood, count)
+    SELECT new.user_id, date(new.timestamp), 'chat', new.emotion, 1 WHERE new.emotion IS NOT NULL
+    ON CONFLICT (user_id, day, source, mood) DO UPDATE SET count = count + 1;
+  INSERT INTO mood_weekly (user_id, week, source, mood, count)
+    SELECT new.user_id, date(new.timestamp, 'weekday 0', '-6 days'), 'chat', new.emotion, 1
+    WHERE new.emotion IS NOT NULL
+    ON CONFLICT (user_id, week, source, mood) DO UPDATE SET count = count + 1;
+END;
@@ -0,0 +1,6 @@
+-- Where the emotion of each bot reply came from (see insert_chat_turn in
+-- app/db.py): 'model' when it was detected from the user's message, 'user'
+-- when the user picked their mood in the chat page's mood dialog. Replies
+-- written before this migration are NULL, since the two cannot be told apart.
+-- 'flask rescore-emotions' only re-labels 'model' rows.
+ALTER TABLE chat_history ADD COLUMN emotion_source TEXT;
@@ -0,0 +1,190 @@
+"""Re-score the emotion of stored chat replies with the current classifier.
+
+The emotion saved on each bot reply in ``chat_history`` was detected from the
+user's message just before it by whichever classifier was running at the time.
+After the classifier is swapped or retrained, ``rescore_emotions`` recomputes
+those labels:
+
+* Bot replies are read in id order, ``batch_rows`` at a time, by keyset
+  (``id > last id``), so the scan never slows down as it goes. Each one is
+  paired with its user's latest earlier row, which must be a user message.
+  Before turns were written in one transaction, another user's row could sit
+  between the two, so pairing by id alone would miss those replies.
+* Only replies whose ``emotion_source`` is ``'model'`` are re-labelled. A mood
+  the user picked (``'user'``) is what they told us, not a stale label, and
+  replies written before migration 0007 (NULL) cannot be told apart from
+  those, so both are left alone. Replies with no user message before them
+  (greetings) are skipped too. All three are counted in the stats.
+* Each batch is labelled by ``detect_emotions_batch`` on a pool of
+  ``workers`` processes, each of which loads the classifier once and runs
+  padded passes of ``infer_batch`` messages; a few batches are kept in flight
+  so the workers never wait for the database.
+* Results are applied in id order, one transaction per batch that updates the
+  changed rows and advances the checkpoint in ``emotion_rescore_runs`` (one
+  row per classifier). An interrupted run resumes after the last committed
+  batch. The mood rollups follow through the ``mood_rollup_chat_update``
+  trigger.
+
+A dry run writes nothing to the database; it lists the replies whose label
+would change in a CSV report and counts old -> new transitions.
+"""
+import collections
+import csv
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Labelled bot replies with the user message they answered (NULL if there is none)
+PAIRS_SQL = (
+    "SELECT b.id, b.user_id, b.timestamp, b.emotion, b.emotion_source, u.message FROM chat_history b "
+    "LEFT JOIN chat_history u ON u.id = ("
+    "SELECT MAX(p.id) FROM chat_history p WHERE p.user_id = b.user_id AND p.id < b.id"
+    ") AND u.sender = 'user' "
+    "WHERE b.id > ? AND b.sender = 'bot' AND b.emotion IS NOT NULL "
+    "ORDER BY b.id LIMIT ?"
+)
+CHECKPOINT_SQL = (
+    'INSERT INTO emotion_rescore_runs (model, last_id, scanned, changed) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT (model) DO UPDATE SET last_id = excluded.last_id, scanned = scanned + excluded.scanned, '
+    'changed = changed + excluded.changed, updated_at = CURRENT_TIMESTAMP'
+)
+REPORT_FIELDS = ('id', 'user_id', 'timestamp', 'old_emotion', 'new_emotion')
+
+
+def model_tag():
+    """Names the classifier configuration whose labels a run writes (its checkpoint key)."""
+    from model_registry import registry
+    from emotion_chatbot import emotion_cascade
+    tag = f'{registry.classifier_name}:{registry.classifier_mode}'
+    return f'{tag}+{emotion_cascade.cache_tag}' if emotion_cascade.cache_tag else tag
+
+
+def _init_worker(threads):
+    # Split the cores between the workers instead of each torch using all of them
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _label(texts, infer_batch):
+    if not texts:
+        return []
+    from emotion_chatbot import detect_emotions_batch
+    return detect_emotions_batch(texts, infer_batch)
+
+
+def checkpoint(db, model):
+    """The checkpoint row for ``model``, or None."""
+    return db.execute('SELECT * FROM emotion_rescore_runs WHERE model = ?', (model,)).fetchone()
+
+
+def _relabel(rows, skipped):
+    """The rows of a batch to re-label; counts the others in ``skipped``."""
+    todo = []
+    for row in rows:
+        if row['emotion_source'] == 'user':
+            skipped['user_picked'] += 1
+        elif row['emotion_source'] != 'model':
+            skipped['unknown_source'] += 1
+        elif row['message'] is None:
+            skipped['unpaired'] += 1
+        else:
+            todo.append(row)
+    return todo
+
+
+def _batches(db, last_id, batch_rows, limit):
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_rows if remaining is None else min(batch_rows, remaining)
+        rows = db.execute(PAIRS_SQL, (last_id, size)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def rescore_emotions(db, workers=1, batch_rows=512, infer_batch=64, dry_run=False, report=None,
+                     restart=False, limit=None, progress=None):
+    """
+    Re-label bot replies with the current classifier (see the module docstring).
+
+    ``workers=0`` labels in this process. ``report`` is a CSV path for the
+    changed labels (dry runs only); ``limit`` stops after that many replies;
+    ``progress(stats)`` is called after every batch. Returns the stats dict:
+    model, resumed_from, scanned, changed, seconds, transitions (``Counter``
+    of ``(old, new)``) and skipped (``Counter`` of ``user_picked``,
+    ``unknown_source`` and ``unpaired`` replies, which are in ``scanned`` but
+    never re-labelled).
+    """
+    model = model_tag()
+    last_id = 0
+    if not dry_run:
+        if restart:
+            with db:
+                db.execute('DELETE FROM emotion_rescore_runs WHERE model = ?', (model,))
+        row = checkpoint(db, model)
+        last_id = row['last_id'] if row else 0
+    stats = {'model': model, 'resumed_from': last_id, 'scanned': 0, 'changed': 0, 'seconds': 0.0,
+             'transitions': collections.Counter(), 'skipped': collections.Counter()}
+
+    pool = None
+    if workers > 0:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(threads,))
+    report_file = open(report, 'w', newline='', encoding='utf8') if dry_run and report else None
+    writer = csv.writer(report_file) if report_file else None
+    if writer:
+        writer.writerow(REPORT_FIELDS)
+
+    start = time.perf_counter()
+    in_flight = collections.deque()
+    batches = _batches(db, last_id, batch_rows, limit)
+    try:
+        while True:
+            # Keep every worker busy with the next batch while this one is written
+            while pool is not None and len(in_flight) < 2 * workers:
+                rows = next(batches, None)
+                if rows is None:
+                    break
+                todo = _relabel(rows, stats['skipped'])
+                in_flight.append((rows, todo, pool.submit(_label, [row['message'] for row in todo], infer_batch)))
+            if pool is not None:
+                if not in_flight:
+                    break
+                rows, todo, future = in_flight.popleft()
+                labels = future.result()
+            else:
+                rows = next(batches, None)
+                if rows is None:
+                    break
+                todo = _relabel(rows, stats['skipped'])
+                labels = _label([row['message'] for row in todo], infer_batch)
+
+            changes = [(row, label) for row, label in zip(todo, labels) if label != row['emotion']]
+            if dry_run:
+                if writer:
+                    writer.writerows((row['id'], row['user_id'], row['timestamp'], row['emotion'], label)
+                                     for row, label in changes)
+            else:
+                with db:
+                    db.executemany("UPDATE chat_history SET emotion = ? WHERE id = ? AND emotion = ? "
+                                   "AND emotion_source = 'model'",
+                                   [(label, row['id'], row['emotion']) for row, label in changes])
+                    db.execute(CHECKPOINT_SQL, (model, rows[-1]['id'], len(rows), len(changes)))
+            stats['scanned'] += len(rows)
+            stats['changed'] += len(changes)
+            stats['transitions'].update((row['emotion'], label) for row, label in changes)
+            stats['seconds'] = time.perf_counter() - start
+            if progress:
+                progress(stats)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if report_file:
+            report_file.close()
+    stats['seconds'] = time.perf_counter() - start
+    return stats
@@ -1,18 +1,29 @@
 import os
 import json
+import sqlite3
+import calendar
+import hashlib
 import datetime
 from flask import (
     Blueprint, flash, g, redirect, render_template, request,
-    session, url_for, jsonify, current_app
+    session, url_for, jsonify, current_app, Response, stream_with_context
 )
+from werkzeug.http import is_resource_modified
 from werkzeug.security import check_password_hash, generate_password_hash
-from app.db import get_db
+from app.db import get_db, insert_chat_turn, fetch_chat_page, load_conversation_memory, schedule_memory_update, search_journal
+from app.db import JOURNAL_TIMESTAMP_SQL, journal_preview, journal_list_state, fetch_journal_page
 from app.models import User
+from app.admission import admission_for_app
+from app.insights import mood_insights
+from app.warmup import warmup_for_app
 from flask_login import login_user, logout_user, login_required, current_user
 from app import login_manager
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 # Import the chatbot from emotion_chatbot.py
-from emotion_chatbot import chatbot_respond
+from emotion_chatbot import (
+    ResponseStream, chatbot_respond, chatbot_respond_degraded, chatbot_respond_stream, summarize_conversation
+)
+from observability import metrics, span
 
 # Change bp to main to match what __init__.py expects
 main = Blueprint('main', __name__)
@@ -42,33 +53,32 @@ def chat():
                     'error': 'Message is required.'
                 }), 400
             
-            # Only save user message to chat history if it's not hidden
-            if not hidden:
-                db.execute(
-                    'INSERT INTO chat_history (user_id, sender, message) VALUES (?, ?, ?)',
-                    (user_id, 'user', message)
-                )
-                db.commit()  # Add commit here to prevent database locks
+            # Turn the message away now rather than queue it behind others (see app/admission.py)
+            admission = _admit_chat(user_id)
+            if admission.rejected:
+                return _too_many_requests(admission)
+            
+            # Stamp the user message now; both rows are written together once the reply exists
+            received_at = _utc_timestamp()
             
             # Get bot response with mood context if provided
-            if user_mood:
-                bot_reply, detected_emotion, should_play_rain = chatbot_respond(message, user_id=user_id, user_mood=user_mood, username=username)
-            else:
-                bot_reply, detected_emotion, should_play_rain = chatbot_respond(message, user_id=user_id, username=username)
+            with span("chatbot_respond"):
+                bot_reply, detected_emotion, should_play_rain = _respond(admission, message, user_id, user_mood, username)
             
-            # Only save bot response to chat history if it's not hidden
+            # Only save the chat turn to history if it's not hidden. The canned overload
+            # reply is not saved, so it never reaches conversation memory or the mood rollups
             if not hidden:
-                db.execute(
-                    'INSERT INTO chat_history (user_id, sender, message, emotion) VALUES (?, ?, ?, ?)',
-                    (user_id, 'bot', bot_reply, detected_emotion)
-                )
-                db.commit()
+                with span("db_insert_chat_turn"):
+                    insert_chat_turn(user_id, message, None if admission.degraded else bot_reply,
+                                     detected_emotion, received_at, 'user' if user_mood else 'model')
+                _update_memory(user_id, username)
             
             # Return JSON response for AJAX
             return jsonify({
                 'bot_reply': bot_reply,
                 'emotion': detected_emotion if user_mood is None else user_mood,
-                'play_music': should_play_rain  # Changed from play_rain to play_music for consistency
+                'play_music': should_play_rain,  # Changed from play_rain to play_music for consistency
+                'degraded': admission.degraded
             })
         
         # For regular form submissions
@@ -78,22 +88,23 @@ def chat():
                 flash('Message is required.', 'danger')
                 return redirect(url_for('main.chat'))
             
-            # Save user message to chat history
-            db.execute(
-                'INSERT INTO chat_history (user_id, sender, message) VALUES (?, ?, ?)',
-                (user_id, 'user', message)
-            )
-            db.commit()  # Add commit here to prevent database locks
+            admission = _admit_chat(user_id)
+            if admission.rejected:
+                flash(_SHED_MESSAGES[admission.reason], 'warning')
+                return redirect(url_for('main.chat'))
+            
+            received_at = _utc_timestamp()
             
             # Get bot response
-            bot_reply, detected_emotion, should_play_rain = chatbot_respond(message, user_id=user_id, username=username)
+            with span("chatbot_respond"):
+                bot_reply, detected_emotion, should_play_rain = _respond(admission, message, user_id, None, username)
             
-            # Save bot response to chat history
-            db.execute(
-                'INSERT INTO chat_history (user_id, sender, message, emotion) VALUES (?, ?, ?, ?)',
-                (user_id, 'bot', bot_reply, detected_emotion)
-            )
-            db.commit()
+            # Save the user message and bot response to chat history in one transaction
+            # (only the message when the reply is the canned overload one)
+            with span("db_insert_chat_turn"):
+                insert_chat_turn(user_id, message, None if admission.degraded else bot_reply,
+                                 detected_emotion, received_at)
+            _update_memory(user_id, username)
             
             return redirect(url_for('main.chat'))
     
@@ -101,32 +112,25 @@ def chat():
     # Check if we need to show the mood modal
     show_modal = session.pop('show_mood_modal', False)
     
-    # Fetch chat history for this user
-    chat_history = db.execute(
-        'SELECT * FROM chat_history WHERE user_id = ? ORDER BY timestamp',
-        (user_id,)
-    ).fetchall()
+    # Render only the latest page of history; script.js loads older pages on scroll
+    page_size = current_app.config.get('CHAT_PAGE_SIZE', 50)
+    with span("db_load_history"):
+        chat_history, has_more = fetch_chat_page(user_id, limit=page_size)
     
     # Create a list of dictionaries for easier template rendering
-    chat_messages = []
-    for msg in chat_history:
-        chat_messages.append({
-            'sender': msg['sender'],
-            'message': msg['message'],
-            'emotion': msg['emotion'],
-            'timestamp': msg['timestamp']
-        })
+    chat_messages = [_chat_message_dict(msg) for msg in chat_history]
     
     # If there are no messages yet, generate an initial greeting
     if not chat_messages:
         greeting = f"Hello {username}! 👋 I'm Therabot, your mental health assistant. How are you feeling today? 😊"
-        db.execute(
+        cursor = db.execute(
             'INSERT INTO chat_history (user_id, sender, message, emotion) VALUES (?, ?, ?, ?)',
             (user_id, 'bot', greeting, 'neutral')
         )
         db.commit()
         
         chat_messages.append({
+            'id': cursor.lastrowid,
             'sender': 'bot',
             'message': greeting,
             'emotion': 'neutral',
@@ -135,7 +139,169 @@ def chat():
     
     current_year = datetime.now().year
     # Pass the show_modal flag to the template
-    return render_template('chat.html', chat_history=chat_messages, current_year=current_year, show_modal=show_modal)
+    return render_template(
+        'chat.html', chat_history=chat_messages, current_year=current_year, show_modal=show_modal,
+        history_has_more=has_more, history_oldest_id=chat_messages[0].get('id') if chat_messages else None
+    )
+
+def _chat_message_dict(msg):
+    timestamp = msg['timestamp']
+    return {
+        'id': msg['id'],
+        'sender': msg['sender'],
+        'message': msg['message'],
+        'emotion': msg['emotion'],
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if hasattr(timestamp, 'strftime') else timestamp
+    }
+
+@main.route('/chat/history')
+@login_required
+def chat_history_page():
+    """Keyset-paginated chat history: messages older than ``before``, oldest first."""
+    max_limit = current_app.config.get('CHAT_PAGE_SIZE', 50) * 4
+    before = request.args.get('before', type=int)
+    limit = request.args.get('limit', current_app.config.get('CHAT_PAGE_SIZE', 50), type=int)
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, max_limit)
+
+    with span("db_load_history_page"):
+        rows, has_more = fetch_chat_page(current_user.id, before=before, limit=limit)
+    messages = [_chat_message_dict(msg) for msg in rows]
+    return jsonify({
+        'messages': messages,
+        'has_more': has_more,
+        'next_before': messages[0]['id'] if messages and has_more else None
+    })
+
+_SHED_MESSAGES = {
+    'user_rate': "You're sending messages faster than I can answer them. Please wait a moment and try again.",
+    'capacity': "I'm talking with a lot of people right now. Please try again in a moment.",
+}
+
+def _admit_chat(user_id):
+    """Admission decision for one chat message (see app/admission.py)."""
+    return admission_for_app(current_app._get_current_object()).admit(user_id)
+
+def _too_many_requests(admission):
+    response = jsonify({'error': _SHED_MESSAGES[admission.reason], 'retry_after': admission.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(admission.retry_after)
+    return response
+
+def _respond(admission, message, user_id, user_mood, username):
+    """``chatbot_respond`` for an admitted message, or the keyword-fallback reply for a degraded one."""
+    if admission.degraded:
+        return chatbot_respond_degraded(message, user_mood=user_mood)
+    try:
+        with span("load_memory"):
+            memory = load_conversation_memory(user_id)
+        return chatbot_respond(message, user_id=user_id, user_mood=user_mood, username=username, memory=memory)
+    finally:
+        admission.release()
+
+def _update_memory(user_id, username):
+    """Fold older turns into the user's rolling summary in the background."""
+    schedule_memory_update(
+        user_id, lambda summary, messages: summarize_conversation(summary, messages, username)
+    )
+
+def _utc_timestamp():
+    """Current time in SQLite's CURRENT_TIMESTAMP format (UTC)."""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+def _sse(data, event=None):
+    """Format one Server-Sent Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@main.route('/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    """Same as the JSON branch of /chat, but streams the reply as Server-Sent Events."""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '').strip()
+    user_mood = data.get('mood', None)
+    hidden = data.get('hidden', False)
+    user_id = current_user.id
+    username = current_user.username
+
+    if not message:
+        return jsonify({'error': 'Message is required.'}), 400
+
+    admission = _admit_chat(user_id)
+    if admission.rejected:
+        return _too_many_requests(admission)
+
+    def generate():
+        received_at = _utc_timestamp()
+        stream = None
+        try:
+            # Flush headers immediately so time-to-first-byte does not include model work
+            yield ": stream open\n\n"
+            if admission.degraded:
+                reply, detected_emotion, should_play_music = chatbot_respond_degraded(message, user_mood=user_mood)
+                stream = ResponseStream("", None, username, text=reply)
+            else:
+                with span("load_memory"):
+                    memory = load_conversation_memory(user_id)
+                stream, detected_emotion, should_play_music = chatbot_respond_stream(
+                    message, user_id=user_id, user_mood=user_mood, username=username, memory=memory
+                )
+            yield _sse({'emotion': detected_emotion, 'play_music': should_play_music}, event='meta')
+            for delta in stream:
+                yield _sse({'delta': delta})
+        finally:
+            # The pipeline is done once generation has finished (or the client went away)
+            admission.release()
+            # Persist the turn once the stream has finished; if the client went away
+            # mid-reply, or the reply is the canned overload one, keep only the user's message
+            if not hidden:
+                finished = stream is not None and stream.text is not None and not admission.degraded
+                with span("db_insert_chat_turn"):
+                    insert_chat_turn(user_id, message, stream.text if finished else None,
+                                     detected_emotion if finished else None, received_at,
+                                     'user' if user_mood else 'model')
+                _update_memory(user_id, username)
+        yield _sse({
+            'bot_reply': stream.text,
+            'emotion': detected_emotion,
+            'play_music': should_play_music,
+            'degraded': admission.degraded
+        }, event='done')
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also covers a stream closed before generate() started, where its finally never runs
+    response.call_on_close(admission.release)
+    return response
+
+@main.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of stage timings and pipeline counters."""
+    if not current_app.config.get('METRICS_ENABLED', True):
+        return jsonify({'error': 'Not found'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@main.route('/healthz')
+def healthz():
+    """Liveness: the process is serving requests, whether or not the models are warm."""
+    return jsonify({'status': 'ok'})
+
+@main.route('/readyz')
+def readyz():
+    """Readiness: 200 once model warm-up has finished and the database answers, else 503."""
+    report = warmup_for_app(current_app).report()
+    try:
+        get_db().execute('SELECT 1').fetchone()
+        report['database'] = 'ok'
+    except sqlite3.Error as e:
+        report['database'] = f'error: {e}'
+        report['ready'] = False
+    return jsonify(report), 200 if report['ready'] else 503
 
 @main.route('/login', methods=('GET', 'POST'))
 def login():
@@ -233,34 +399,123 @@ def journal():
     today = datetime.now().strftime('%Y-%m-%d')
     return render_template('journal.html', current_year=current_year, today=today)
 
+def _journal_range(args):
+    """
+    ``(date_from, date_to)`` for ``month=YYYY-MM`` or ``from``/``to=YYYY-MM-DD``
+    (either end may be left open); the current month if none is given.
+    Raises ValueError for malformed dates.
+    """
+    month = args.get('month')
+    if month or not (args.get('from') or args.get('to')):
+        first = datetime.strptime(month, '%Y-%m') if month else datetime.now().replace(day=1)
+        last_day = calendar.monthrange(first.year, first.month)[1]
+        return first.strftime('%Y-%m-01'), first.replace(day=last_day).strftime('%Y-%m-%d')
+    date_from = args.get('from') or '0000-01-01'
+    date_to = args.get('to') or '9999-12-31'
+    for value in (date_from, date_to):
+        datetime.strptime(value, '%Y-%m-%d')
+    return date_from, date_to
+
 @main.route('/journal/entries')
 @login_required
 def get_journal_entries():
-    db = get_db()
-    user_id = current_user.id
-    
-    entries = db.execute(
-        '''
-        SELECT id, entry_date as date, mood, content, 
-               SUBSTR(content, 1, 100) || CASE WHEN LENGTH(content) > 100 THEN "..." ELSE "" END as preview
-        FROM journal_entries 
-        WHERE user_id = ? 
-        ORDER BY entry_date DESC
-        ''',
-        (user_id,)
-    ).fetchall()
-    
-    # Convert to list of dictionaries
-    entries_list = []
-    for entry in entries:
-        entries_list.append({
-            'id': entry['id'],
-            'date': entry['date'],
-            'mood': entry['mood'],
-            'preview': entry['preview']
+    """
+    The user's entries for ``month`` (YYYY-MM, default this month) or dated
+    ``from``..``to`` (YYYY-MM-DD), newest first, at most ``limit`` per page;
+    ``next_to`` continues the range.
+
+    The ETag and Last-Modified come from the range's entry count and latest
+    ``updated_at``, so a client revalidating an unchanged range gets a 304
+    without any entries being read.
+    """
+    try:
+        date_from, date_to = _journal_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'Use month=YYYY-MM or from/to=YYYY-MM-DD'}), 400
+    limit = request.args.get('limit', 100, type=int)
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, 366)
+
+    with span("db_journal_list_state"):
+        count, last_updated = journal_list_state(current_user.id, date_from, date_to)
+    etag = hashlib.sha1(
+        f'{current_user.id}|{date_from}|{date_to}|{limit}|{count}|{last_updated}'.encode()
+    ).hexdigest()[:20]
+    last_modified = None
+    if last_updated:
+        last_modified = datetime.strptime(last_updated[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        with span("db_journal_list"):
+            rows, has_more = fetch_journal_page(current_user.id, date_from, date_to, limit)
+        next_to = None
+        if has_more:
+            next_to = (datetime.strptime(rows[-1]['entry_date'], '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        response = jsonify({
+            'entries': [
+                {'id': row['id'], 'date': row['entry_date'], 'mood': row['mood'], 'preview': row['preview']}
+                for row in rows
+            ],
+            'from': date_from,
+            'to': date_to,
+            'has_more': has_more,
+            'next_to': next_to
         })
-    
-    return jsonify(entries_list)
+    # Weak: the same validator serves the gzip and brotli encodings
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@main.route('/journal/search')
+@login_required
+def journal_search():
+    """Rank the user's entries against ``q``, optionally within ``from``..``to`` and for one ``mood``."""
+    query = request.args.get('q', '').strip()
+    date_from = request.args.get('from') or None
+    date_to = request.args.get('to') or None
+    mood = request.args.get('mood') or None
+    limit = request.args.get('limit', 20, type=int)
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    for value in (date_from, date_to):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    try:
+        with span("db_search_journal"):
+            results = search_journal(current_user.id, query, date_from, date_to, mood, min(limit, 50))
+    except sqlite3.OperationalError as e:
+        # The index comes from migration 0003
+        current_app.logger.error(f"Journal search failed: {e}")
+        return jsonify({'error': 'Journal search is unavailable; run "flask db-upgrade"'}), 503
+    return jsonify({'query': query, 'results': results})
+
+@main.route('/insights')
+@login_required
+def insights():
+    """Mood distribution, streaks and week-over-week change, from the mood rollups."""
+    days = request.args.get('days', 30, type=int)
+    if days is None or not 1 <= days <= 366:
+        return jsonify({'error': 'days must be between 1 and 366'}), 400
+    try:
+        with span("db_insights"):
+            report = mood_insights(get_db(), current_user.id, days)
+    except sqlite3.OperationalError as e:
+        # The rollups come from migration 0004
+        current_app.logger.error(f"Insights failed: {e}")
+        return jsonify({'error': 'Insights are unavailable; run "flask db-upgrade"'}), 503
+    return jsonify(report)
 
 @main.route('/journal/entry/<date>', methods=['GET', 'POST', 'DELETE'])
 @login_required
@@ -314,15 +569,17 @@ def journal_entry(date):
         if existing:
             # Update existing entry
             db.execute(
-                'UPDATE journal_entries SET content = ?, mood = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
-                (content, mood, existing['id'])
+                'UPDATE journal_entries SET content = ?, mood = ?, preview = ?, '
+                f'updated_at = {JOURNAL_TIMESTAMP_SQL} WHERE id = ?',
+                (content, mood, journal_preview(content), existing['id'])
             )
             message = 'Journal entry updated successfully'
         else:
             # Create new entry
             db.execute(
-                'INSERT INTO journal_entries (user_id, entry_date, mood, content) VALUES (?, ?, ?, ?)',
-                (user_id, date, mood, content)
+                'INSERT INTO journal_entries (user_id, entry_date, mood, content, preview, updated_at) '
+                f'VALUES (?, ?, ?, ?, ?, {JOURNAL_TIMESTAMP_SQL})',
+                (user_id, date, mood, content, journal_preview(content))
             )
             message = 'Journal entry created successfully'
         
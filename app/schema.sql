@@ -1,6 +1,13 @@
 DROP TABLE IF EXISTS users;
 DROP TABLE IF EXISTS chat_history;
 DROP TABLE IF EXISTS journal_entries;
+-- Tables added by migrations (app/migrations), dropped so init-db starts clean
+DROP TABLE IF EXISTS conversation_memory;
+DROP TABLE IF EXISTS journal_fts;
+DROP VIEW IF EXISTS journal_fts_source;
+DROP TABLE IF EXISTS mood_daily;
+DROP TABLE IF EXISTS mood_weekly;
+DROP TABLE IF EXISTS emotion_rescore_runs;
 
 CREATE TABLE users (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,6 +59,54 @@ document.addEventListener('DOMContentLoaded', () => {
         return messageDiv; // Return the created element
     }
 
+    // --- Helper function to read a streamed (Server-Sent Events) chat reply ---
+    // Renders each text delta into the placeholder as it arrives and resolves
+    // with the final 'done' payload, which has the same shape as the /chat JSON.
+    async function readChatStream(response, placeholder, container) {
+        if (!response.body || !(response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            return response.json();
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const target = placeholder ? placeholder.querySelector('p:last-child') : null;
+        let buffer = '';
+        let streamedText = '';
+        let finalData = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let dataText = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+                });
+                if (!dataText) continue; // comments / keep-alives
+
+                const payload = JSON.parse(dataText);
+                if (eventName === 'done') {
+                    finalData = payload;
+                } else if (payload.delta !== undefined && target) {
+                    streamedText += payload.delta;
+                    target.textContent = streamedText;
+                    scrollToBottom(container);
+                }
+            }
+        }
+        if (!finalData) {
+            throw new Error('Stream ended before the reply was complete.');
+        }
+        return finalData;
+    }
+
     // --- Helper function to scroll chat history ---
     function scrollToBottom(container) {
         if (container) {
@@ -85,6 +133,79 @@ document.addEventListener('DOMContentLoaded', () => {
         scrollToBottom(chatHistoryContainer);
     }
 
+    // --- Lazy-load Older Chat History ---
+    // The page only renders the latest messages; older pages are fetched from
+    // /chat/history?before=<oldest id> when the user scrolls near the top.
+    function buildHistoryMessage(msg) {
+        // Same markup as the server-rendered messages in chat.html
+        const messageDiv = document.createElement('div');
+        messageDiv.classList.add('chat-message', msg.sender);
+        messageDiv.dataset.id = msg.id;
+
+        const headerP = document.createElement('p');
+        const nameStrong = document.createElement('strong');
+        nameStrong.textContent = msg.sender === 'user' ? 'You:' : 'Therabot';
+        headerP.appendChild(nameStrong);
+        if (msg.sender !== 'user') {
+            if (msg.emotion) {
+                const emotionSpan = document.createElement('span');
+                emotionSpan.classList.add('emotion-tag');
+                emotionSpan.style.marginLeft = '5px';
+                emotionSpan.textContent = `(${msg.emotion})`;
+                headerP.appendChild(emotionSpan);
+            }
+            headerP.appendChild(document.createTextNode(' :'));
+        }
+
+        const messageP = document.createElement('p');
+        messageP.textContent = msg.message;
+
+        messageDiv.appendChild(headerP);
+        messageDiv.appendChild(messageP);
+        return messageDiv;
+    }
+
+    if (chatHistoryContainer && chatHistoryContainer.dataset.historyUrl) {
+        let oldestId = chatHistoryContainer.dataset.oldestId;
+        let hasMore = chatHistoryContainer.dataset.hasMore === 'true';
+        let loadingHistory = false;
+
+        async function loadOlderHistory() {
+            if (loadingHistory || !hasMore || !oldestId) return;
+            loadingHistory = true;
+            try {
+                const url = `${chatHistoryContainer.dataset.historyUrl}?before=${encodeURIComponent(oldestId)}`;
+                const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                const data = await response.json();
+
+                // Prepend the page and keep the messages currently in view where they are
+                const previousHeight = chatHistoryContainer.scrollHeight;
+                const fragment = document.createDocumentFragment();
+                data.messages.forEach(msg => fragment.appendChild(buildHistoryMessage(msg)));
+                chatHistoryContainer.insertBefore(fragment, chatHistoryContainer.firstChild);
+                chatHistoryContainer.scrollTop += chatHistoryContainer.scrollHeight - previousHeight;
+
+                hasMore = data.has_more;
+                if (data.messages.length) {
+                    oldestId = data.messages[0].id;
+                }
+            } catch (error) {
+                console.error('Error loading older messages:', error);
+            } finally {
+                loadingHistory = false;
+            }
+        }
+
+        chatHistoryContainer.addEventListener('scroll', () => {
+            if (chatHistoryContainer.scrollTop < 80) {
+                loadOlderHistory();
+            }
+        });
+    }
+
     // --- Add 'active' class to current nav link ---
     const navLinks = document.querySelectorAll('header nav a');
     const currentPath = window.location.pathname;
@@ -375,11 +496,13 @@ document.addEventListener('DOMContentLoaded', () => {
             let placeholderMessageElement = addMessageToChat('bot', '...', chatHistoryContainer, null, true);
 
             try {
-                const response = await fetch(chatForm.action, {
+                // Stream the reply when the page provides a streaming endpoint
+                const streamUrl = chatForm.dataset.streamUrl;
+                const response = await fetch(streamUrl || chatForm.action, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
-                        'Accept': 'application/json'
+                        'Accept': streamUrl ? 'text/event-stream' : 'application/json'
                     },
                     body: JSON.stringify(requestData)
                 });
@@ -394,6 +517,18 @@ document.addEventListener('DOMContentLoaded', () => {
                         errorMsg = errorData.error || errorMsg;
                     } catch (e) { }
                     console.error('Fetch Error:', errorMsg);
+                    if (response.status === 429) {
+                        // Turned away before anything ran and nothing was saved (see app/admission.py):
+                        // give the message back so it can be sent again after Retry-After seconds
+                        if (!chatInput.value) chatInput.value = userMessage;
+                        const retryAfter = response.headers.get('Retry-After');
+                        if (retryAfter) errorMsg += ` (try again in ${retryAfter}s)`;
+                        if (placeholder) {
+                            placeholder.querySelector('p:last-child').textContent = errorMsg;
+                            placeholder.classList.remove('placeholder');
+                        }
+                        return;
+                    }
                     if (placeholder) {
                         // Update placeholder with error
                         placeholder.querySelector('p:last-child').textContent = `Sorry, couldn't get a response. ${errorMsg}`;
@@ -405,7 +540,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     return;
                 }
 
-                const responseData = await response.json();
+                const responseData = await readChatStream(response, placeholder, chatHistoryContainer);
 
                 if (placeholder) {
                     placeholder.classList.remove('placeholder'); // Remove placeholder status
@@ -741,6 +876,8 @@ document.addEventListener('DOMContentLoaded', () => {
         const deleteEntryBtn = document.getElementById('delete-entry');
         const editorMessage = document.getElementById('editor-message');
         const moodButtons = document.querySelectorAll('.mood-btn');
+        const searchInput = document.getElementById('journal-search');
+        let searchTimer = null;
 
         // Format date as YYYY-MM-DD (for API calls)
         function formatDateForAPI(date) {
@@ -758,13 +895,16 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         }
 
-        // Load and display journal entries
+        // Load and display the journal entries of the month shown in the calendar.
+        // The browser revalidates with the ETag, so an unchanged month is a 304.
         function loadJournalEntries() {
-            fetch('/journal/entries')
+            const month = `${currentYear}-${String(currentMonth + 1).padStart(2, '0')}`;
+            fetch(`/journal/entries?month=${month}`)
                 .then(response => response.json())
                 .then(data => {
-                    journalEntries = data;
-                    renderEntriesList();
+                    if (month !== `${currentYear}-${String(currentMonth + 1).padStart(2, '0')}`) return; // navigated away
+                    journalEntries = data.entries;
+                    if (!searchInput || !searchInput.value.trim()) renderEntriesList();
                     renderCalendar();
                 })
                 .catch(error => {
@@ -773,15 +913,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
         }
 
-        // Render the list of entries
-        function renderEntriesList() {
-            if (journalEntries.length === 0) {
-                entriesList.innerHTML = '<div class="no-entries">No entries yet. Select a date to create your first entry.</div>';
+        // Render the list of entries (or search results, whose snippet_html is already escaped)
+        function renderEntriesList(entries = journalEntries, emptyMessage = 'No entries this month. Select a date to write one.') {
+            if (entries.length === 0) {
+                entriesList.innerHTML = `<div class="no-entries">${emptyMessage}</div>`;
                 return;
             }
 
             let entriesHTML = '';
-            journalEntries.forEach(entry => {
+            entries.forEach(entry => {
                 // Get emoji for mood
                 let moodEmoji = '';
                 if (entry.mood) {
@@ -806,7 +946,7 @@ document.addEventListener('DOMContentLoaded', () => {
                             <span class="entry-date">${displayDate}</span>
                             <span class="entry-mood">${moodEmoji}</span>
                         </div>
-                        <div class="entry-preview">${entry.preview}</div>
+                        <div class="entry-preview">${entry.snippet_html || entry.preview}</div>
                     </div>
                 `;
             });
@@ -817,11 +957,49 @@ document.addEventListener('DOMContentLoaded', () => {
             document.querySelectorAll('.entry-item').forEach(item => {
                 item.addEventListener('click', function () {
                     const date = this.dataset.date;
+                    // Search results can be from another month; show it in the calendar
+                    const [year, month] = date.split('-').map(Number);
+                    if (year !== currentYear || month - 1 !== currentMonth) {
+                        currentYear = year;
+                        currentMonth = month - 1;
+                        renderCalendar();
+                        loadJournalEntries();
+                    }
                     selectDate(new Date(date));
                 });
             });
         }
 
+        // Search entries as the user types; an empty box shows every entry again
+        function searchJournal() {
+            const query = searchInput.value.trim();
+            if (!query) {
+                renderEntriesList();
+                return;
+            }
+            fetch(`/journal/search?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (query !== searchInput.value.trim()) return; // a newer search is on its way
+                    if (data.error) {
+                        entriesList.innerHTML = `<div class="no-entries">${data.error}</div>`;
+                        return;
+                    }
+                    renderEntriesList(data.results, 'No entries match your search.');
+                })
+                .catch(error => {
+                    console.error('Error searching journal entries:', error);
+                    entriesList.innerHTML = '<div class="no-entries">Search failed. Please try again.</div>';
+                });
+        }
+
+        if (searchInput) {
+            searchInput.addEventListener('input', function () {
+                clearTimeout(searchTimer);
+                searchTimer = setTimeout(searchJournal, 250);
+            });
+        }
+
         // Render the calendar
         function renderCalendar() {
             // Update month and year display
@@ -1131,6 +1309,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     currentYear--;
                 }
                 renderCalendar();
+                loadJournalEntries();
             });
         }
 
@@ -1142,6 +1321,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     currentYear++;
                 }
                 renderCalendar();
+                loadJournalEntries();
             });
         }
 
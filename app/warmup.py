@@ -0,0 +1,113 @@
+"""Background model warm-up and readiness.
+
+Importing the app no longer loads torch, transformers or the Gemini client;
+``WarmUp`` loads them (plus the knowledge-base index, lexicon and generator
+connection probe) on a background thread so that ``/``, ``/login``, ``/faq``
+and ``/healthz`` are served straight away. ``/readyz`` reports 503 until every
+required step has finished, then 200.
+
+``WARM_UP`` (``THERABOT_WARM_UP``) selects the behaviour:
+
+* ``background``: start on the first request (``main.py`` starts it at boot;
+  under ``gunicorn.conf.py`` the master runs the fork-safe steps before
+  forking and each worker starts the rest, the generator, as it boots);
+* ``blocking``: finish warming up inside ``create_app`` (the old
+  ``THERABOT_PRELOAD_MODELS=1``);
+* ``off``: load everything lazily on the first chat message; always ready.
+"""
+import logging
+import threading
+import time
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_MODES = ('background', 'blocking', 'off')
+_warmups = []
+_create_lock = threading.Lock()
+
+
+class WarmUp:
+    """Runs ``(name, fn, required)`` steps once, in order, and reports their progress."""
+
+    def __init__(self, steps):
+        self._steps = list(steps)
+        self.steps = {name: {'state': 'pending', 'required': required} for name, _, required in self._steps}
+        self.finished = False
+        self._thread = None
+        self._lock = threading.Lock()
+        _warmups.append(self)
+
+    def start(self):
+        """Start warming up on a background thread; later calls, or calls after ``run``, do nothing."""
+        if self._thread is not None or self.finished:
+            return
+        with self._lock:
+            if self._thread is None and not self.finished:
+                self._thread = threading.Thread(target=self.run, name='model-warm-up', daemon=True)
+                self._thread.start()
+
+    def run(self, names=None):
+        """Run the pending steps, or only those in ``names``; finished once none is pending."""
+        start = time.perf_counter()
+        for name, fn, required in self._steps:
+            status = self.steps[name]
+            if status['state'] != 'pending' or (names is not None and name not in names):
+                continue
+            status['state'] = 'running'
+            step_start = time.perf_counter()
+            try:
+                fn()
+                status['state'] = 'ready'
+            except Exception as e:
+                status['state'] = 'failed'
+                status['error'] = str(e) or type(e).__name__
+                log = logger.error if required else logger.warning
+                log('Warm-up step %s failed: %s', name, status['error'])
+            status['seconds'] = round(time.perf_counter() - step_start, 3)
+        if any(s['state'] == 'pending' for s in self.steps.values()):
+            logger.info('Warm-up of %s done in %.2fs', ', '.join(names), time.perf_counter() - start)
+            return
+        self.finished = True
+        logger.info('Warm-up finished in %.2fs, ready=%s', time.perf_counter() - start, self.ready)
+
+    @property
+    def ready(self):
+        return self.finished and all(
+            s['state'] == 'ready' for s in self.steps.values() if s['required']
+        )
+
+    def report(self):
+        return {'ready': self.ready, 'steps': {name: dict(status) for name, status in self.steps.items()}}
+
+
+def warmup_for_app(app):
+    """The app's ``WarmUp``, created on first use; not started."""
+    warmup = app.extensions.get('warmup')
+    if warmup is None:
+        with _create_lock:
+            warmup = app.extensions.get('warmup')
+            if warmup is None:
+                mode = app.config.get('WARM_UP', 'background')
+                if mode not in WARM_UP_MODES:
+                    raise ValueError(f"Unknown WARM_UP {mode!r}; expected one of {', '.join(WARM_UP_MODES)}")
+                if mode == 'off':
+                    warmup = WarmUp([])
+                    warmup.finished = True
+                else:
+                    from emotion_chatbot import warm_up_steps
+                    warmup = WarmUp(warm_up_steps())
+                app.extensions['warmup'] = warmup
+    return warmup
+
+
+@metrics.register_collector
+def _warmup_metrics():
+    ready = [({}, int(all(w.ready for w in _warmups)))] if _warmups else []
+    seconds = [({'step': name}, status['seconds'])
+               for w in _warmups for name, status in w.steps.items() if 'seconds' in status]
+    return [
+        ('therabot_ready', 'gauge', 'Whether model warm-up has finished successfully.', ready),
+        ('therabot_warmup_step_seconds', 'gauge', 'Time each warm-up step took.', seconds),
+    ]
@@ -0,0 +1,127 @@
+"""What one flooding client does to everyone else's chat latency, with and without admission control.
+
+Simulates the chat pipeline as ``--capacity`` workers (the transformer and
+Gemini concurrency) that each take ``--service-ms`` per message. ``--fair``
+users send a message every ``--think-ms``; one flooding user keeps
+``--flood`` messages in flight at all times, resending as soon as an answer
+(or a 429) comes back. For each configuration it reports the fair users'
+latency, how many of their messages got the full pipeline, and what happened
+to the flooder's messages:
+
+* ``no limits``: every message waits for a pipeline worker, as before;
+* ``admission, fallback`` / ``admission, reject``: ``ChatAdmission`` from
+  app/admission.py with ``--rate`` messages a minute, a burst of ``--burst``
+  and ``--max-in-flight`` messages in the pipeline; over capacity, messages
+  get ``chatbot_respond_degraded`` or a 429.
+
+    python benchmarks/bench_admission.py --fair 8 --flood 32 --seconds 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.admission import ChatAdmission  # noqa: E402
+from emotion_chatbot import chatbot_respond_degraded  # noqa: E402
+
+
+class Pipeline:
+    """``capacity`` workers; a message waits for a free one, then takes ``service`` seconds."""
+
+    def __init__(self, capacity, service):
+        self._workers = threading.Semaphore(capacity)
+        self.service = service
+
+    def run(self):
+        with self._workers:
+            time.sleep(self.service)
+
+
+def run(args, admission):
+    pipeline = Pipeline(args.capacity, args.service_ms / 1000)
+    stop = time.perf_counter() + args.seconds
+    lock = threading.Lock()
+    results = {"fair": [], "flood": []}  # (latency, outcome)
+
+    def send(user_id, kind):
+        start = time.perf_counter()
+        if admission is None:
+            outcome = "full"
+            pipeline.run()
+        else:
+            decision = admission.admit(user_id)
+            if decision.admitted:
+                outcome = "full"
+                try:
+                    pipeline.run()
+                finally:
+                    decision.release()
+            elif decision.degraded:
+                outcome = "degraded"
+                chatbot_respond_degraded("I feel anxious about tomorrow")
+            else:
+                outcome = "429"
+        with lock:
+            results[kind].append((time.perf_counter() - start, outcome))
+        return outcome
+
+    def fair_user(user_id):
+        while time.perf_counter() < stop:
+            send(user_id, "fair")
+            time.sleep(args.think_ms / 1000)
+
+    def flooder():
+        while time.perf_counter() < stop:
+            if send(0, "flood") == "429":
+                # A scripted client that ignores Retry-After still gets answered in microseconds
+                time.sleep(0.001)
+
+    threads = [threading.Thread(target=fair_user, args=(u,)) for u in range(1, args.fair + 1)]
+    threads += [threading.Thread(target=flooder) for _ in range(args.flood)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(label, results):
+    fair = sorted(latency for latency, _ in results["fair"])
+    full = sum(1 for _, outcome in results["fair"] if outcome == "full")
+    flood = {}
+    for _, outcome in results["flood"]:
+        flood[outcome] = flood.get(outcome, 0) + 1
+    print(f"{label:<20} {len(fair):>6} {full / len(fair):>6.0%} {statistics.median(fair) * 1000:>8.0f} "
+          f"{fair[int(len(fair) * 0.95)] * 1000:>8.0f} {fair[-1] * 1000:>8.0f}   "
+          + ", ".join(f"{count} {outcome}" for outcome, count in sorted(flood.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fair", type=int, default=8, help="well-behaved users")
+    parser.add_argument("--flood", type=int, default=32, help="messages the flooding user keeps in flight")
+    parser.add_argument("--capacity", type=int, default=8, help="pipeline workers")
+    parser.add_argument("--service-ms", type=float, default=200, help="pipeline time per message")
+    parser.add_argument("--think-ms", type=float, default=2000, help="fair users' pause between messages")
+    parser.add_argument("--rate", type=float, default=20, help="CHAT_RATE_PER_MIN")
+    parser.add_argument("--burst", type=int, default=5, help="CHAT_BURST")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="CHAT_MAX_IN_FLIGHT")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.fair} fair users, 1 user flooding with {args.flood} messages in flight; "
+          f"{args.capacity} pipeline workers at {args.service_ms:.0f} ms\n")
+    print(f"{'':<20} {'fair':>6} {'full':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}   flooder")
+    summarize("no limits", run(args, None))
+    for overload in ("fallback", "reject"):
+        admission = ChatAdmission(args.rate, args.burst, args.max_in_flight, overload)
+        summarize(f"admission, {overload}", run(args, admission))
+
+
+if __name__ == "__main__":
+    main()
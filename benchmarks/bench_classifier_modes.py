@@ -0,0 +1,129 @@
+"""Accuracy parity, latency, throughput and memory of each classifier mode.
+
+Every mode (see classifier_modes.py) is loaded in its own subprocess, so
+resident memory is not shared between them, and run over the labeled sample in
+``benchmarks/data/emotion_sample.jsonl``. The report compares each mode with
+fp32: prediction agreement, accuracy against the labels, largest absolute
+logit difference, load time, resident memory, single-message latency and
+batched throughput. Conversions are cached in ``--cache-dir`` as in the app, so
+a second run measures the cached load path.
+
+    python benchmarks/bench_classifier_modes.py
+    python benchmarks/bench_classifier_modes.py --modes fp32,int8 --threads 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+SAMPLE = os.path.join(ROOT, "benchmarks", "data", "emotion_sample.jsonl")
+
+
+def load_sample(path):
+    with open(path, encoding="utf8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def child(args):
+    """Measure one mode; prints a JSON result on stdout."""
+    import torch
+    from model_registry import CLASSIFIER_LABELS, ModelRegistry, _process_rss_bytes
+
+    torch.set_num_threads(args.threads)
+    sample = load_sample(args.sample)
+    texts = [row["text"] for row in sample]
+    rss_before = _process_rss_bytes()
+    registry = ModelRegistry(classifier_name=args.model, classifier_mode=args.child)
+    start = time.perf_counter()
+    tokenizer, model = registry.classifier()
+    load_seconds = time.perf_counter() - start
+
+    def run(batch):
+        inputs = tokenizer(batch, return_tensors="pt", truncation=True, max_length=512, padding=True)
+        with torch.inference_mode():
+            return model(**inputs).logits
+
+    logits = torch.cat([run(texts[i:i + args.batch_size]) for i in range(0, len(texts), args.batch_size)])
+    single = []
+    for _ in range(args.repeats):
+        for text in texts:
+            t = time.perf_counter()
+            run([text])
+            single.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    for _ in range(args.repeats):
+        for i in range(0, len(texts), args.batch_size):
+            run(texts[i:i + args.batch_size])
+    batched = time.perf_counter() - t
+
+    print(json.dumps({
+        "mode": args.child,
+        "load_seconds": load_seconds,
+        "rss_mb": _process_rss_bytes() / 1e6,
+        "model_rss_mb": (_process_rss_bytes() - rss_before) / 1e6,
+        "single_p50_ms": statistics.median(single) * 1000,
+        "single_p95_ms": sorted(single)[int(0.95 * (len(single) - 1))] * 1000,
+        "batched_per_s": len(texts) * args.repeats / batched,
+        "logits": logits.tolist(),
+        "predictions": [CLASSIFIER_LABELS.get(i, "neutral") for i in logits.argmax(dim=1).tolist()],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="fp32,int8,traced,int8-traced")
+    parser.add_argument("--model", default=None, help="classifier name or path (default: the app's)")
+    parser.add_argument("--sample", default=SAMPLE)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    parser.add_argument("--cache-dir", default=None, help="THERABOT_MODEL_CACHE_DIR for conversions")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.model is None:
+        from model_registry import CLASSIFIER_NAME
+        args.model = CLASSIFIER_NAME
+    if args.child:
+        child(args)
+        return
+
+    env = dict(os.environ)
+    if args.cache_dir:
+        env["THERABOT_MODEL_CACHE_DIR"] = args.cache_dir
+    results = {}
+    for mode in args.modes.split(","):
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, "--model", args.model,
+               "--sample", args.sample, "--batch-size", str(args.batch_size),
+               "--repeats", str(args.repeats), "--threads", str(args.threads)]
+        out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{mode}: failed\n{out.stderr[-2000:]}")
+            continue
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    labels = [row["label"] for row in load_sample(args.sample)]
+    reference = results.get("fp32")
+    print(f"model: {args.model}, {len(labels)} labeled messages, {args.threads} thread(s)\n")
+    print(f"{'mode':<12} {'agree fp32':>10} {'accuracy':>9} {'max |dlogit|':>12} {'load s':>7} "
+          f"{'RSS MB':>7} {'model MB':>9} {'p50 ms':>7} {'p95 ms':>7} {'batched msg/s':>14}")
+    for mode, r in results.items():
+        accuracy = sum(p == l for p, l in zip(r["predictions"], labels)) / len(labels)
+        if reference:
+            agree = sum(p == q for p, q in zip(r["predictions"], reference["predictions"])) / len(labels)
+            max_diff = max(abs(a - b) for row, ref in zip(r["logits"], reference["logits"]) for a, b in zip(row, ref))
+            agree_s, diff_s = f"{agree:.1%}", f"{max_diff:.4f}"
+        else:
+            agree_s, diff_s = "-", "-"
+        print(f"{mode:<12} {agree_s:>10} {accuracy:>9.1%} {diff_s:>12} {r['load_seconds']:>7.2f} "
+              f"{r['rss_mb']:>7.0f} {r['model_rss_mb']:>9.0f} {r['single_p50_ms']:>7.1f} "
+              f"{r['single_p95_ms']:>7.1f} {r['batched_per_s']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
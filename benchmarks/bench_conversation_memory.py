@@ -0,0 +1,83 @@
+"""Prompt size and memory cost per turn as a conversation grows.
+
+Replays ``--turns`` chat turns for one user against a throwaway SQLite
+database (schema plus migrations) and, at each checkpoint, reports the
+estimated prompt tokens and time to load/render memory for:
+
+* ``full history``: every earlier message pasted into the prompt;
+* ``memory``: ConversationMemory (recent turns verbatim + rolling summary,
+  folded with the model-free extractive summarizer).
+
+    python benchmarks/bench_conversation_memory.py --turns 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from conversation_memory import ConversationMemory, estimate_tokens, extractive_summary  # noqa: E402
+
+MESSAGES = [
+    "I've been feeling really stressed about my exams and I can't focus on anything",
+    "My best friend hasn't replied to my texts in days and I keep wondering what I did wrong",
+    "Today was actually a good day, I went for a long walk and called my mum",
+    "I tried the breathing exercise you suggested before bed and it helped a little",
+]
+REPLY = ("That sounds like a lot to hold. It makes sense that you'd feel this way, and I'm glad you shared it. "
+         "Would it help to talk through what feels most pressing right now?")
+SYSTEM_TOKENS = 700  # roughly the size of the Therabot system prompt
+
+
+def setup(path):
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, "app", "schema.sql"), encoding="utf8") as f:
+        conn.executescript(f.read())
+    migrations = os.path.join(ROOT, "app", "migrations")
+    for name in sorted(os.listdir(migrations)):
+        with open(os.path.join(migrations, name), encoding="utf8") as f:
+            conn.executescript(f.read())
+    conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'x')")
+    conn.commit()
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--budget", type=int, default=2000, help="prompt token budget")
+    args = parser.parse_args()
+
+    memory = ConversationMemory(token_budget=args.budget)
+    checkpoints = {t for t in (1, 10, 50, 100, 500, 1000, 2000, 5000, 10000) if t <= args.turns} | {args.turns}
+    print(f"{'turn':>6} {'full-history tokens':>20} {'memory tokens':>14} {'memory load+render ms':>22} "
+          f"{'summaries':>10}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        conn = setup(os.path.join(tmpdir, "bench.db"))
+        full_history_tokens = 0
+        for turn in range(1, args.turns + 1):
+            message = MESSAGES[turn % len(MESSAGES)]
+            start = time.perf_counter()
+            snapshot = memory.load(conn, 1)
+            user_part = f"User Input: {message}\nDetected Emotion: worried\nAssistant Response:"
+            memory_text = memory.render(snapshot, args.budget - SYSTEM_TOKENS - estimate_tokens(user_part))
+            elapsed = time.perf_counter() - start
+            if turn in checkpoints:
+                print(f"{turn:>6} {SYSTEM_TOKENS + full_history_tokens + estimate_tokens(user_part):>20} "
+                      f"{SYSTEM_TOKENS + estimate_tokens(memory_text) + estimate_tokens(user_part):>14} "
+                      f"{elapsed * 1000:>22.3f} {memory.stats['summaries']:>10}")
+            with conn:
+                conn.executemany(
+                    "INSERT INTO chat_history (user_id, sender, message, emotion) VALUES (1, ?, ?, ?)",
+                    [("user", message, None), ("bot", REPLY, "worried")],
+                )
+            full_history_tokens += estimate_tokens(f"User: {message}\n") + estimate_tokens(f"Therabot: {REPLY}\n")
+            memory.update(conn, 1, lambda summary, messages: extractive_summary(summary, messages, memory.summary_tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Throughput / latency benchmark for the emotion micro-batcher.
+
+Simulates ``--concurrency`` request threads, each classifying ``--requests``
+messages, and reports throughput and p50/p99 latency for every
+(max_batch_size, max_wait_ms) setting. ``1x0ms`` is the unbatched baseline.
+
+    python benchmarks/bench_emotion_batching.py --concurrency 16 --requests 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch  # noqa: E402
+
+from emotion_batcher import EmotionBatcher  # noqa: E402
+from model_registry import ModelRegistry, CLASSIFIER_NAME  # noqa: E402
+
+SAMPLE_MESSAGES = [
+    "I'm fine",
+    "I feel really anxious about my exam tomorrow and can't sleep",
+    "thanks, that helped a lot",
+    "Everything is going wrong at work and I'm so angry with my boss",
+    "I've been feeling lonely since I moved to a new city",
+    "Today was a good day, I went for a walk in the park",
+    "ok",
+    "I don't know what to do anymore, nothing seems to matter",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_setting(load_classifier, max_batch_size, max_wait_ms, concurrency, requests):
+    batcher = EmotionBatcher(load_classifier=load_classifier,
+                             max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    batcher.predict("warm up")
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client(worker_id):
+        barrier.wait()
+        local = []
+        for i in range(requests):
+            text = SAMPLE_MESSAGES[(worker_id + i) % len(SAMPLE_MESSAGES)]
+            start = time.perf_counter()
+            batcher.predict(text)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "setting": f"{max_batch_size}x{max_wait_ms:g}ms",
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_batch": (batcher.items_processed - 1) / max(batcher.batches_run - 1, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=CLASSIFIER_NAME, help="classifier name or local path")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client thread")
+    parser.add_argument("--settings", default="1:0,4:2,8:5,16:5,32:10",
+                        help="comma-separated max_batch_size:max_wait_ms pairs")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    models = ModelRegistry(classifier_name=args.model)
+    models.classifier()
+
+    print(f"model={args.model} concurrency={args.concurrency} requests/client={args.requests} "
+          f"torch_threads={torch.get_num_threads()}")
+    print(f"{'setting':>12} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>10}")
+    for pair in args.settings.split(","):
+        size, wait = pair.split(":")
+        result = run_setting(models.classifier, int(size), float(wait), args.concurrency, args.requests)
+        print(f"{result['setting']:>12} {result['throughput']:>9.1f} {result['p50_ms']:>9.1f} "
+              f"{result['p99_ms']:>9.1f} {result['mean_batch']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Offline evaluation of the confidence-gated emotion cascade.
+
+Runs every message in the labeled sample (plus any extra ``--texts`` file,
+one message per line, unlabeled) through both tiers once, measuring CPU time
+per message. Then, for each threshold, it reports:
+
+* the share of messages tier 1 answers;
+* agreement of the cascade with the transformer alone;
+* accuracy against the labels, for the labeled messages;
+* mean CPU per message and the saving relative to the transformer alone.
+
+    python benchmarks/bench_emotion_cascade.py
+    python benchmarks/bench_emotion_cascade.py --thresholds 0.6,0.7,0.8,0.9 --texts my_messages.txt
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import torch  # noqa: E402
+
+from emotion_cascade import EmotionCascade  # noqa: E402
+from model_registry import CLASSIFIER_LABELS, ModelRegistry  # noqa: E402
+
+SAMPLE = os.path.join(ROOT, "benchmarks", "data", "emotion_sample.jsonl")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", default=SAMPLE)
+    parser.add_argument("--texts", help="extra unlabeled messages, one per line")
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.9,0.95")
+    parser.add_argument("--model", default=None, help="transformer classifier name or path")
+    parser.add_argument("--mode", default=None, help="classifier mode (fp32, int8, traced, int8-traced)")
+    args = parser.parse_args()
+
+    with open(args.sample, encoding="utf8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    if args.texts:
+        with open(args.texts, encoding="utf8") as f:
+            rows += [{"text": line.strip(), "label": None} for line in f if line.strip()]
+
+    torch.set_num_threads(1)
+    kwargs = {"classifier_mode": args.mode}
+    if args.model:
+        kwargs["classifier_name"] = args.model
+    tokenizer, model = ModelRegistry(**kwargs).classifier()
+
+    def transformer(text):
+        inputs = tokenizer([text], return_tensors="pt", truncation=True, max_length=512, padding=True)
+        with torch.inference_mode():
+            return CLASSIFIER_LABELS.get(int(model(**inputs).logits.argmax(dim=1)[0]), "neutral")
+
+    cascade = EmotionCascade(transformer, enabled=True)
+    if cascade.pipeline() is None:
+        sys.exit("Tier 1 pipeline could not be loaded (is scikit-learn installed?)")
+    transformer(rows[0]["text"])  # warm-up
+
+    measured = []
+    for row in rows:
+        start = time.process_time()
+        cheap_label, cheap_prob = cascade.cheap_predict(row["text"])
+        cheap_cpu = time.process_time() - start
+        start = time.process_time()
+        full_label = transformer(row["text"])
+        full_cpu = time.process_time() - start
+        measured.append((row["label"], cheap_label, cheap_prob, cheap_cpu, full_label, full_cpu))
+
+    labeled = [m for m in measured if m[0] is not None]
+    baseline_cpu = sum(m[5] for m in measured) / len(measured)
+    baseline_acc = sum(m[0] == m[4] for m in labeled) / len(labeled) if labeled else float("nan")
+    print(f"{len(measured)} messages ({len(labeled)} labeled); transformer alone: "
+          f"{baseline_cpu * 1000:.2f} ms CPU/message, accuracy {baseline_acc:.1%}\n")
+    print(f"{'threshold':>9} {'tier-1 share':>12} {'agree':>7} {'accuracy':>9} {'CPU ms/msg':>11} {'CPU saved':>10}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        outcomes = []
+        for label, cheap_label, cheap_prob, cheap_cpu, full_label, full_cpu in measured:
+            if cheap_prob >= threshold:
+                outcomes.append((label, cheap_label, full_label, cheap_cpu, True))
+            else:
+                outcomes.append((label, full_label, full_label, cheap_cpu + full_cpu, False))
+        share = sum(o[4] for o in outcomes) / len(outcomes)
+        agree = sum(o[1] == o[2] for o in outcomes) / len(outcomes)
+        scored = [o for o in outcomes if o[0] is not None]
+        accuracy = sum(o[0] == o[1] for o in scored) / len(scored) if scored else float("nan")
+        cpu = sum(o[3] for o in outcomes) / len(outcomes)
+        print(f"{threshold:>9.2f} {share:>12.1%} {agree:>7.1%} {accuracy:>9.1%} {cpu * 1000:>11.2f} "
+              f"{1 - cpu / baseline_cpu:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
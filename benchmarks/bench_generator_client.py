@@ -0,0 +1,88 @@
+"""Compare the old fixed-sleep retry loop with GeneratorClient under upstream faults.
+
+Runs ``--requests`` calls from ``--concurrency`` threads against
+FakeGeneratorBackend for a healthy upstream, a flaky one and a full outage, and
+reports how long each call held its worker thread (p50/p99/max) and how many
+calls succeeded or failed fast.
+
+    python benchmarks/bench_generator_client.py --concurrency 16 --requests 64
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_generator import FakeGeneratorBackend  # noqa: E402
+from generator_client import CircuitBreaker, CircuitOpenError, GeneratorClient  # noqa: E402
+
+
+def legacy_call(backend, prompt):
+    """The retry loop generate_response used before GeneratorClient."""
+    for attempt in range(1, 4):
+        try:
+            return backend.generate_content(prompt)
+        except Exception:
+            if attempt == 3:
+                raise
+            time.sleep(2)
+
+
+def run(call, concurrency, requests):
+    durations, outcomes = [], {"ok": 0, "error": 0, "fast_fail": 0}
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            call(f"prompt {i}")
+            outcome = "ok"
+        except CircuitOpenError:
+            outcome = "fast_fail"
+        except Exception:
+            outcome = "error"
+        with lock:
+            durations.append(time.perf_counter() - start)
+            outcomes[outcome] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    durations.sort()
+    return wall, durations, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="GeneratorClient slots (default: same as --concurrency)")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake upstream latency in seconds")
+    args = parser.parse_args()
+
+    scenarios = [("healthy", 0.0), ("flaky 30%", 0.3), ("outage", 1.0)]
+    print(f"{'scenario':>10} {'client':>8} {'wall s':>7} {'p50 s':>6} {'p99 s':>6} {'max s':>6}  outcomes")
+    for name, error_rate in scenarios:
+        for label in ("legacy", "client"):
+            backend = FakeGeneratorBackend(latency=f"uniform:{args.latency * 0.75}:{args.latency * 1.25}",
+                                           error_rate=error_rate)
+            if label == "legacy":
+                call = lambda prompt: legacy_call(backend, prompt)
+            else:
+                client = GeneratorClient(backend, max_concurrency=args.max_concurrency or args.concurrency, deadline=5.0,
+                                         breaker=CircuitBreaker(failure_threshold=5, reset_timeout=10.0))
+                call = client.generate
+            wall, durations, outcomes = run(call, args.concurrency, args.requests)
+            p99 = durations[min(len(durations) - 1, int(0.99 * len(durations)))]
+            print(f"{name:>10} {label:>8} {wall:>7.2f} {statistics.median(durations):>6.2f} "
+                  f"{p99:>6.2f} {durations[-1]:>6.2f}  {outcomes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""/insights latency from the mood rollups vs ad hoc GROUP BY over raw history.
+
+For each history size in ``--messages`` (bot replies per user, each with a user
+message before it, spread over ``--days`` days, plus a journal entry on most
+days), builds a throwaway database and times ``mood_insights`` for random users:
+
+* ``rollups``: reading ``mood_daily``/``mood_weekly`` as the app does;
+* ``ad hoc``: the same report with temp views of the same names that group
+  ``chat_history`` and ``journal_entries`` on every call, i.e. what computing
+  the trends without rollups costs.
+
+It also reports ``flask mood-rollups-rebuild`` time and the cost the rollup
+triggers add to saving a chat turn (one transaction per turn, as the app does
+without write-behind).
+
+    python benchmarks/bench_insights.py --users 10 --messages 1000,10000,50000
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.db import MOOD_DAILY_SQL, MOOD_WEEKLY_SQL, check_mood_rollups, connect, rebuild_mood_rollups  # noqa: E402
+from app.insights import mood_insights  # noqa: E402
+
+EMOTIONS = ["happy", "sad", "angry", "worried", "neutral"]
+MOODS = EMOTIONS + [None]
+ROLLUP_TRIGGERS = ["mood_rollup_chat_insert", "mood_rollup_chat_delete", "mood_rollup_journal_insert",
+                   "mood_rollup_journal_delete", "mood_rollup_journal_update"]
+
+
+def setup(path):
+    conn = connect(path)
+    with open(os.path.join(ROOT, "app", "schema.sql"), encoding="utf8") as f:
+        conn.executescript(f.read())
+    migrations = os.path.join(ROOT, "app", "migrations")
+    for name in sorted(os.listdir(migrations)):
+        with open(os.path.join(migrations, name), encoding="utf8") as f:
+            conn.executescript(f.read())
+    return conn
+
+
+def fill(conn, users, messages, days, end, rng):
+    """Insert the history with the rollup triggers dropped, then rebuild; returns rebuild seconds."""
+    for trigger in ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER {trigger}")
+    start = end - datetime.timedelta(days=days - 1)
+    with conn:
+        conn.executemany("INSERT INTO users (username, password) VALUES (?, 'x')",
+                         [(f"user{u}",) for u in range(users)])
+        for user_id in range(1, users + 1):
+            rows = []
+            for i in range(messages):
+                stamp = (datetime.datetime.combine(start, datetime.time())
+                         + datetime.timedelta(seconds=int(i * days * 86400 / messages)))
+                stamp = stamp.strftime("%Y-%m-%d %H:%M:%S")
+                rows.append((user_id, "user", "how are you", None, stamp))
+                rows.append((user_id, "bot", "reply", rng.choice(EMOTIONS), stamp))
+            conn.executemany("INSERT INTO chat_history (user_id, sender, message, emotion, timestamp) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO journal_entries (user_id, entry_date, mood, content) VALUES (?, ?, ?, 'x')",
+                             [(user_id, (start + datetime.timedelta(days=d)).isoformat(), rng.choice(MOODS))
+                              for d in range(days) if rng.random() < 0.7])
+    began = time.perf_counter()
+    rebuild_mood_rollups(conn)
+    return time.perf_counter() - began
+
+
+def time_insights(conn, users, end, runs, rng):
+    timings = []
+    for _ in range(runs):
+        user_id = rng.randrange(1, users + 1)
+        start = time.perf_counter()
+        mood_insights(conn, user_id, 30, today=end)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+
+def turn_cost(path, turns, triggers):
+    """Milliseconds to save one chat turn (user + bot row, one transaction)."""
+    conn = setup(path)
+    if not triggers:
+        for trigger in ROLLUP_TRIGGERS:
+            conn.execute(f"DROP TRIGGER {trigger}")
+    conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'x')")
+    conn.commit()
+    start = time.perf_counter()
+    for i in range(turns):
+        with conn:
+            conn.executemany("INSERT INTO chat_history (user_id, sender, message, emotion) VALUES (1, ?, ?, ?)",
+                             [("user", "how are you", None), ("bot", "reply", EMOTIONS[i % len(EMOTIONS)])])
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed / turns * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--messages", default="1000,10000,50000", help="comma-separated bot replies per user")
+    parser.add_argument("--days", type=int, default=730, help="days of history")
+    parser.add_argument("--runs", type=int, default=50, help="insights calls per measurement")
+    parser.add_argument("--turns", type=int, default=2000, help="chat turns for the insert-cost measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    end = datetime.date(2024, 12, 31)
+    print(f"{args.users} users, {args.days} days of history, insights over the last 30 days\n")
+    print(f"{'replies/user':>12} {'rollups p50':>12} {'p95':>7} {'ad hoc p50':>11} {'p95':>7} {'speedup':>8} "
+          f"{'rebuild s':>10}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for messages in (int(m) for m in args.messages.split(",")):
+            conn = setup(os.path.join(tmpdir, f"insights-{messages}.db"))
+            rebuild_seconds = fill(conn, args.users, messages, args.days, end, rng)
+            assert not check_mood_rollups(conn)
+            rollup_p50, rollup_p95 = time_insights(conn, args.users, end, args.runs, rng)
+            conn.execute(f"CREATE TEMP VIEW mood_daily AS {MOOD_DAILY_SQL}")
+            conn.execute(f"CREATE TEMP VIEW mood_weekly AS {MOOD_WEEKLY_SQL}")
+            adhoc_p50, adhoc_p95 = time_insights(conn, args.users, end, max(args.runs // 5, 3), rng)
+            conn.close()
+            print(f"{messages:>12} {rollup_p50:>10.2f}ms {rollup_p95:>5.2f}ms {adhoc_p50:>9.1f}ms "
+                  f"{adhoc_p95:>5.1f}ms {adhoc_p50 / rollup_p50:>7.0f}x {rebuild_seconds:>10.2f}")
+
+        with_triggers = turn_cost(os.path.join(tmpdir, "turns-triggers.db"), args.turns, True)
+        without = turn_cost(os.path.join(tmpdir, "turns-plain.db"), args.turns, False)
+    print(f"\nsaving a chat turn: {with_triggers:.3f} ms with rollup triggers, {without:.3f} ms without "
+          f"(+{(with_triggers - without) * 1000:.0f} us)")
+
+
+if __name__ == "__main__":
+    main()
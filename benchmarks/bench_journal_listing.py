@@ -0,0 +1,107 @@
+"""Bytes and time per journal-list poll: full listing vs month pages vs 304s.
+
+Creates a user with ``--years`` years of daily journal entries of about
+``--chars`` characters in a throwaway database and, through the Flask test
+client, times ``--runs`` polls of:
+
+* ``full listing``: the previous endpoint, every entry with its preview cut
+  from the content by SUBSTR on each request (replayed as SQL + JSON);
+* ``month page``: ``/journal/entries?month=...`` uncompressed, gzip and (if
+  the ``brotli`` package is installed) brotli;
+* ``304``: revalidating the month page with its ETag after nothing changed,
+  which is what the journal page does after every save to another month.
+
+    python benchmarks/bench_journal_listing.py --years 5
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ("today I felt tired but a walk helped and I talked to my sister about work and the exam "
+         "was stressful though dinner with friends was lovely").split()
+OLD_LISTING_SQL = """
+    SELECT id, entry_date as date, mood, content,
+           SUBSTR(content, 1, 100) || CASE WHEN LENGTH(content) > 100 THEN "..." ELSE "" END as preview
+    FROM journal_entries WHERE user_id = ? ORDER BY entry_date DESC
+"""
+
+
+def timed(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--chars", type=int, default=1000, help="approximate characters per entry")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["THERABOT_DATABASE"] = os.path.join(tmpdir, "journal.db")
+        os.environ.setdefault("THERABOT_WARM_UP", "off")
+        with contextlib.redirect_stdout(io.StringIO()):
+            from app import create_app
+            from app.db import get_db, init_db, journal_preview
+            from app.compression import brotli
+            app = create_app()
+            with app.app_context():
+                init_db()
+        client = app.test_client()
+        client.post("/signup", data={"username": "bench", "password": "pw"})
+        client.post("/login", data={"username": "bench", "password": "pw"})
+
+        end = datetime.date(2024, 12, 31)
+        days = 365 * args.years
+        with app.app_context():
+            db = get_db()
+            rows = []
+            for d in range(days):
+                content = " ".join(rng.choice(WORDS) for _ in range(args.chars // 5))
+                rows.append((1, (end - datetime.timedelta(days=d)).isoformat(), rng.choice(["happy", "sad", None]),
+                             content, journal_preview(content)))
+            with db:
+                db.executemany("INSERT INTO journal_entries (user_id, entry_date, mood, content, preview) "
+                               "VALUES (?, ?, ?, ?, ?)", rows)
+
+            def old_listing():
+                entries = db.execute(OLD_LISTING_SQL, (1,)).fetchall()
+                return json.dumps([{"id": e["id"], "date": e["date"], "mood": e["mood"], "preview": e["preview"]}
+                                   for e in entries]).encode()
+
+            old_ms, old_body = timed(old_listing, args.runs)
+
+        url = f"/journal/entries?month={end:%Y-%m}"
+        print(f"{days} entries of ~{args.chars} chars; median of {args.runs} polls\n")
+        print(f"{'request':<28} {'ms':>7} {'bytes':>9}")
+        print(f"{'full listing (before)':<28} {old_ms:>7.2f} {len(old_body):>9}")
+        encodings = [("identity", "identity"), ("gzip", "gzip")] + ([("br", "br")] if brotli else [])
+        etag = None
+        for label, accept in encodings:
+            ms, response = timed(lambda: client.get(url, headers={"Accept-Encoding": accept}), args.runs)
+            etag = response.headers["ETag"]
+            print(f"{'month page (' + label + ')':<28} {ms:>7.2f} {len(response.data):>9}")
+        ms, response = timed(lambda: client.get(url, headers={"If-None-Match": etag}), args.runs)
+        assert response.status_code == 304
+        print(f"{'month page, unchanged (304)':<28} {ms:>7.2f} {len(response.data):>9}")
+
+
+if __name__ == "__main__":
+    main()
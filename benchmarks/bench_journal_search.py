@@ -0,0 +1,135 @@
+"""Journal search latency at scale (FTS5 index from migration 0003).
+
+Fills a throwaway database with ``--entries`` synthetic journal entries spread
+over ``--users`` users (one entry per user per day, words drawn from a Zipf
+distribution so a few words are very common and most are rare), then reports:
+
+* insert rate with the index maintained by the triggers;
+* ``flask journal-search-backfill`` rate, re-indexing everything from empty;
+* ``search_journal`` p50/p95 for one user, by term frequency, for multi-term,
+  phrase and prefix queries, and with date-range and mood filters.
+
+    python benchmarks/bench_journal_search.py --entries 300000 --users 1000
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MOODS = ["happy", "sad", "angry", "worried", "neutral"]
+CONSONANTS = "bdfghklmnprstvz"
+VOWELS = "aeiou"
+
+
+def make_vocab(size):
+    """``size`` distinct pronounceable words; index 0 is the most frequent."""
+    words = []
+    for i in range(size):
+        word, n = "", i + len(CONSONANTS) * len(VOWELS)
+        while n:
+            n, r = divmod(n, len(CONSONANTS) * len(VOWELS))
+            word += CONSONANTS[r // len(VOWELS)] + VOWELS[r % len(VOWELS)]
+        words.append(word)
+    return words
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=300000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=80, help="words per entry")
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per row, over random users")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = make_vocab(args.vocab)
+    weights = [1 / (rank + 1) for rank in range(args.vocab)]
+    start_date = datetime.date(2015, 1, 1)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["THERABOT_DATABASE"] = os.path.join(tmpdir, "journal.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            from app import create_app
+            from app.db import backfill_journal_search, get_db, init_db, search_journal
+            app = create_app()
+        with app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            init_db()
+        with app.app_context():
+            db = get_db()
+            with db:
+                db.executemany("INSERT INTO users (username, password) VALUES (?, 'x')",
+                               [(f"user{u}",) for u in range(args.users)])
+
+            per_user = -(-args.entries // args.users)
+            inserted, insert_seconds = 0, 0.0
+            for day in range(per_user):
+                rows = []
+                for user_id in range(1, args.users + 1):
+                    if inserted + len(rows) >= args.entries:
+                        break
+                    content = " ".join(rng.choices(vocab, weights, k=args.words))
+                    rows.append((user_id, (start_date + datetime.timedelta(days=day)).isoformat(),
+                                 rng.choice(MOODS), content))
+                start = time.perf_counter()
+                with db:
+                    db.executemany("INSERT INTO journal_entries (user_id, entry_date, mood, content) "
+                                   "VALUES (?, ?, ?, ?)", rows)
+                insert_seconds += time.perf_counter() - start
+                inserted += len(rows)
+            print(f"{inserted} entries, {args.users} users, {args.words} words each, vocabulary {args.vocab}")
+            print(f"insert with triggers: {inserted / insert_seconds:,.0f} entries/s")
+
+            with db:
+                db.execute("INSERT INTO journal_fts (journal_fts) VALUES ('delete-all')")
+            start = time.perf_counter()
+            backfill_journal_search(db)
+            with db:
+                db.execute("INSERT INTO journal_fts (journal_fts) VALUES ('optimize')")
+            print(f"backfill + optimize:  {inserted / (time.perf_counter() - start):,.0f} entries/s")
+            size = db.execute("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()").fetchone()[0]
+            print(f"database size:        {size / 1e6:.0f} MB\n")
+
+            last_day = (start_date + datetime.timedelta(days=per_user - 1)).isoformat()
+            mid_day = (start_date + datetime.timedelta(days=per_user // 2)).isoformat()
+            cases = [
+                ("common word (rank 1)", lambda: vocab[0], {}),
+                ("frequent word (rank ~20)", lambda: vocab[rng.randrange(10, 30)], {}),
+                ("mid word (rank ~500)", lambda: vocab[rng.randrange(300, 700)], {}),
+                ("rare word (rank ~10k)", lambda: vocab[rng.randrange(8000, 12000)], {}),
+                ("two words", lambda: f"{vocab[rng.randrange(10, 30)]} {vocab[rng.randrange(300, 700)]}", {}),
+                ("phrase", lambda: f'"{vocab[0]} {vocab[1]}"', {}),
+                ("prefix", lambda: vocab[rng.randrange(10, 30)][:3] + "*", {}),
+                ("mid word + date range", lambda: vocab[rng.randrange(300, 700)],
+                 {"date_from": mid_day, "date_to": last_day}),
+                ("common word + mood", lambda: vocab[0], {"mood": "worried"}),
+            ]
+            print(f"{'query':<26} {'p50 ms':>7} {'p95 ms':>7} {'hits':>6}")
+            for name, make_query, filters in cases:
+                timings, hits = [], 0
+                for _ in range(args.queries):
+                    user_id = rng.randrange(1, args.users + 1)
+                    query = make_query()
+                    start = time.perf_counter()
+                    hits += len(search_journal(user_id, query, limit=20, **filters))
+                    timings.append(time.perf_counter() - start)
+                print(f"{name:<26} {percentile(timings, 50) * 1000:>7.2f} {percentile(timings, 95) * 1000:>7.2f} "
+                      f"{hits / args.queries:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
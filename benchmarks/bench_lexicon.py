@@ -0,0 +1,109 @@
+"""Keyword scanning: the compiled lexicon vs. the previous substring scans.
+
+The legacy path is the old ``fallback_emotion_detection`` (``any(word in
+text_lower ...)`` per emotion, first match wins) plus ``prepare_turn``'s
+separate rescans for the peaceful-music phrases and "anxious"/"stressed".
+The compiled path is one ``LexiconMatcher.scan`` over ``lexicon.json``.
+
+For each message length it reports microseconds per message with the shipped
+lexicon and with ``--extra`` synthetic cues added to both sides (the legacy
+cost grows with the number of keywords, the automaton's does not). It then
+lists where the two disagree on the labeled sample, which is mostly
+word-boundary fixes ("good" in "goodbye").
+
+    python benchmarks/bench_lexicon.py
+    python benchmarks/bench_lexicon.py --extra 2000 --repeats 2000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexicon import LEXICON_PATH, LexiconMatcher  # noqa: E402
+
+SAMPLE = os.path.join(ROOT, "benchmarks", "data", "emotion_sample.jsonl")
+LEGACY_KEYWORDS = {
+    "happy": ["happy", "joy", "excited", "great", "excellent", "good"],
+    "sad": ["sad", "depressed", "upset", "down", "lonely", "miserable"],
+    "angry": ["angry", "frustrated", "mad", "annoyed", "irritated", "pissed"],
+    "worried": ["worried", "anxious", "concern", "nervous", "stressed", "scared"],
+    "neutral": ["think", "consider", "maybe", "perhaps", "wonder", "know", "tell"],
+}
+LEGACY_MUSIC = ["play peaceful", "peaceful music", "play some peaceful", "peaceful sounds", "play the peaceful"]
+
+
+def legacy_scan(message, keywords=LEGACY_KEYWORDS):
+    """The scans prepare_turn used to do, as (emotion, music_request, stress)."""
+    text_lower = message.lower()
+    emotion = "neutral"
+    for candidate in ["angry", "sad", "worried", "happy", "neutral"]:
+        if any(word in text_lower for word in keywords[candidate]):
+            emotion = candidate
+            break
+    music = any(phrase in message.lower() for phrase in LEGACY_MUSIC)
+    stress = "anxious" in message.lower() or "stressed" in message.lower()
+    return emotion, music, stress
+
+
+def compiled_scan(message, matcher):
+    match = matcher.scan(message)
+    return match.emotion(), "music_request" in match.triggers, "stress" in match.triggers
+
+
+def with_extra(extra):
+    """Legacy keywords and lexicon data, each padded with ``extra`` cues that never match."""
+    with open(LEXICON_PATH, encoding="utf8") as f:
+        data = json.load(f)
+    keywords = {emotion: list(words) for emotion, words in LEGACY_KEYWORDS.items()}
+    emotions = list(keywords)
+    for i in range(extra):
+        emotion = emotions[i % len(emotions)]
+        keywords[emotion].append(f"zzcue{i}")
+        data["emotions"][emotion][f"zzcue{i}"] = 1.0
+    return keywords, LexiconMatcher(data["emotions"], data["triggers"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", default=SAMPLE)
+    parser.add_argument("--extra", type=int, default=500, help="synthetic cues for the scaling row")
+    parser.add_argument("--repeats", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(args.sample, encoding="utf8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    texts = [row["text"] for row in rows]
+    joined = " ".join(texts)
+    messages = {
+        "short (~40 chars)": texts[:20],
+        "sample": texts,
+        "journal (~2 KB)": [joined[:2000]] * 5,
+        "long (~10 KB)": [(joined * 5)[:10000]],
+    }
+    configs = {
+        f"{LexiconMatcher.from_file().size} cues": (LEGACY_KEYWORDS, LexiconMatcher.from_file()),
+        f"+{args.extra} cues": with_extra(args.extra),
+    }
+
+    print(f"{'messages':<18} {'lexicon':<10} {'legacy us/msg':>14} {'compiled us/msg':>16} {'speedup':>8}")
+    for name, batch in messages.items():
+        for label, (keywords, matcher) in configs.items():
+            legacy = timeit.timeit(lambda: [legacy_scan(m, keywords) for m in batch], number=args.repeats)
+            compiled = timeit.timeit(lambda: [compiled_scan(m, matcher) for m in batch], number=args.repeats)
+            per = args.repeats * len(batch) / 1e6
+            print(f"{name:<18} {label:<10} {legacy / per:>14.1f} {compiled / per:>16.1f} {legacy / compiled:>7.1f}x")
+
+    matcher = LexiconMatcher.from_file()
+    differ = [(row, legacy_scan(row["text"]), compiled_scan(row["text"], matcher)) for row in rows]
+    differ = [d for d in differ if d[1] != d[2]]
+    print(f"\n{len(differ)} of {len(rows)} sample messages scan differently (emotion, music, stress):")
+    for row, old, new in differ:
+        print(f"  [{row['label']}] {row['text'][:60]!r}\n      legacy {old}  compiled {new}")
+
+
+if __name__ == "__main__":
+    main()
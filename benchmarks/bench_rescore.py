@@ -0,0 +1,104 @@
+"""Throughput of ``flask rescore-emotions`` vs re-scoring one reply at a time.
+
+Fills a throwaway database with ``--turns`` chat turns (user message + bot
+reply with a stale emotion) and re-labels every reply:
+
+* ``one at a time``: ``detect_emotion`` per message (through the micro-batcher,
+  as the request path does) and one UPDATE transaction per reply, i.e. what a
+  plain loop over the history would do;
+* ``rescore, N workers``: ``rescore_emotions`` with ``N`` classifier processes
+  (0: in this process), ``--batch-rows`` replies per transaction and
+  ``--infer-batch`` messages per classifier pass.
+
+Worker start-up (spawning, importing torch and loading the classifier) is
+included, so small ``--turns`` understate the steady-state rate. Set
+``THERABOT_CASCADE=1`` to measure with the cheap tier in front, as the app
+would run.
+
+    python benchmarks/bench_rescore.py --turns 20000 --workers 0,1,2,4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.db import connect  # noqa: E402
+from app.rescore import PAIRS_SQL, rescore_emotions  # noqa: E402
+
+MESSAGES = [
+    "I've been feeling really stressed about my exams", "today was actually a good day!",
+    "I had a fight with my best friend and I'm so angry", "I moved to a new city and I don't know anyone",
+    "I can't sleep the night before a test", "thanks, I'll try that", "hi", "I finished a big project at work",
+]
+EMOTIONS = ["happy", "sad", "angry", "worried", "neutral"]
+
+
+def setup(path, turns, rng):
+    conn = connect(path)
+    with open(os.path.join(ROOT, "app", "schema.sql"), encoding="utf8") as f:
+        conn.executescript(f.read())
+    migrations = os.path.join(ROOT, "app", "migrations")
+    for name in sorted(os.listdir(migrations)):
+        with open(os.path.join(migrations, name), encoding="utf8") as f:
+            conn.executescript(f.read())
+    with conn:
+        conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'x')")
+        rows = []
+        for i in range(turns):
+            # Distinct texts, so the emotion cache cannot answer the one-at-a-time loop
+            rows.append((1, "user", f"{rng.choice(MESSAGES)} ({i})", None, None))
+            rows.append((1, "bot", "reply", rng.choice(EMOTIONS), "model"))
+        conn.executemany("INSERT INTO chat_history (user_id, sender, message, emotion, emotion_source) "
+                         "VALUES (?, ?, ?, ?, ?)", rows)
+    return conn
+
+
+def one_at_a_time(conn):
+    from emotion_chatbot import detect_emotion
+    scanned = 0
+    for row in conn.execute(PAIRS_SQL, (0, -1)).fetchall():
+        if row["emotion_source"] != "model" or row["message"] is None:
+            continue
+        label = detect_emotion(row["message"])
+        if label != row["emotion"]:
+            with conn:
+                conn.execute("UPDATE chat_history SET emotion = ? WHERE id = ?", (label, row["id"]))
+        scanned += 1
+    return scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--workers", default="0,1,2", help="comma-separated classifier process counts")
+    parser.add_argument("--batch-rows", type=int, default=512)
+    parser.add_argument("--infer-batch", type=int, default=64)
+    parser.add_argument("--skip-baseline", action="store_true", help="skip the one-at-a-time loop")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{args.turns} replies, {os.cpu_count()} CPUs\n")
+    print(f"{'':<24} {'seconds':>8} {'rows/s':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not args.skip_baseline:
+            conn = setup(os.path.join(tmpdir, "baseline.db"), args.turns, rng)
+            start = time.perf_counter()
+            scanned = one_at_a_time(conn)
+            elapsed = time.perf_counter() - start
+            conn.close()
+            print(f"{'one at a time':<24} {elapsed:>8.1f} {scanned / elapsed:>8.0f}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            conn = setup(os.path.join(tmpdir, f"rescore-{workers}.db"), args.turns, rng)
+            stats = rescore_emotions(conn, workers=workers, batch_rows=args.batch_rows, infer_batch=args.infer_batch)
+            conn.close()
+            print(f"{f'rescore, {workers} workers':<24} {stats['seconds']:>8.1f} "
+                  f"{stats['scanned'] / stats['seconds']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Recall vs. latency benchmark for the knowledge base retrieval engines.
+
+Generates a synthetic clustered corpus of normalized embeddings split into
+five emotion partitions, then compares ExactSearcher with IVFSearcher at
+several ``nprobe`` values. Recall@k is measured against the exact results for
+the same emotion-filtered queries.
+
+    python benchmarks/bench_retrieval.py --sizes 10000,100000,1000000
+
+1M rows at the MiniLM dimension (384) needs about 1.5 GB for the matrix.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from retrieval import ExactSearcher, IVFSearcher  # noqa: E402
+
+EMOTIONS = ["angry", "happy", "neutral", "sad", "worried"]
+
+
+def synthetic_corpus(size, dim, topics, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    embeddings = np.empty((size, dim), dtype=np.float32)
+    for lo in range(0, size, 100000):
+        hi = min(lo + 100000, size)
+        chunk = centers[rng.integers(0, topics, hi - lo)] + 0.6 * rng.standard_normal((hi - lo, dim)).astype(np.float32)
+        embeddings[lo:hi] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    bounds = np.linspace(0, size, len(EMOTIONS) + 1).astype(int)
+    partitions = {e: (int(bounds[i]), int(bounds[i + 1])) for i, e in enumerate(EMOTIONS)}
+    return embeddings, partitions
+
+
+def make_queries(embeddings, count, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = embeddings[rng.integers(0, len(embeddings), count)]
+    noisy = picked + 0.3 * rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(picked.shape[1])
+    return noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+
+def timed_search(searcher, queries, emotions, k, batch, **kwargs):
+    """Run all queries (grouped per emotion in batches) and return rows and ms/query."""
+    rows = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for emotion in EMOTIONS:
+        idx = np.flatnonzero(emotions == emotion)
+        for lo in range(0, len(idx), batch):
+            part = idx[lo:lo + batch]
+            _, rows[part] = searcher.search(queries[part], emotion, k, **kwargs)
+    return rows, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def recall(truth, found):
+    hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / max(sum(int((t >= 0).sum()) for t in truth), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1, help="queries per search call")
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    args = parser.parse_args()
+
+    print(f"dim={args.dim} queries={args.queries} k={args.k} batch={args.batch}")
+    print(f"{'size':>9} {'engine':>14} {'build s':>8} {'ms/query':>9} {'recall@k':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        embeddings, partitions = synthetic_corpus(size, args.dim, topics=max(10, size // 1000))
+        queries = make_queries(embeddings, args.queries)
+        emotions = np.asarray(EMOTIONS)[np.arange(args.queries) % len(EMOTIONS)]
+
+        exact = ExactSearcher(embeddings, partitions)
+        truth, exact_ms = timed_search(exact, queries, emotions, args.k, args.batch)
+        print(f"{size:>9} {'exact':>14} {0:>8.2f} {exact_ms:>9.3f} {1.0:>9.3f}")
+
+        start = time.perf_counter()
+        ivf = IVFSearcher.build(embeddings, partitions)
+        build_s = time.perf_counter() - start
+        for nprobe in (int(n) for n in args.nprobe.split(",")):
+            found, ivf_ms = timed_search(ivf, queries, emotions, args.k, args.batch, nprobe=nprobe)
+            print(f"{size:>9} {f'ivf nprobe={nprobe}':>14} {build_s:>8.2f} {ivf_ms:>9.3f} "
+                  f"{recall(truth, found):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Memory per worker and throughput scaling of the production server.
+
+For each worker count, starts ``gunicorn -c gunicorn.conf.py wsgi:app`` on a
+throwaway database, waits for ``/readyz``, drives it with the synthetic users
+from ``loadtest.py`` and reports:
+
+* throughput (chat turns/s) and chat p50/p95 latency;
+* memory from ``/proc/<pid>/smaps_rollup`` after the load: mean RSS and USS
+  (private memory) per worker, and the total PSS of master plus workers. PSS
+  splits shared pages between the processes that map them, so it is the real
+  footprint; it grows by roughly one USS per extra worker, not one RSS.
+
+The generator backend is the local fake with a fixed ``--generator-latency``
+(default 0), so throughput is bounded by the CPU work of emotion detection
+and retrieval and should scale with workers up to the number of cores. Torch
+threads per worker follow the default ``gunicorn.conf.py`` sizing unless
+``--torch-threads`` is given.
+
+    python benchmarks/bench_serving.py --workers 1,2,4 --users 32 --turns 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from loadtest import percentile, run_load  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def smaps(pid):
+    """``{field: kB}`` from ``/proc/<pid>/smaps_rollup``."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def wait_ready(base_url, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"gunicorn exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/readyz", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.25)
+    sys.exit(f"{base_url} not ready after {timeout}s")
+
+
+def init_database(path):
+    os.environ["THERABOT_DATABASE"] = path
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import create_app
+        from app.db import init_db
+        app = create_app()
+        with app.app_context():
+            init_db()
+
+
+def measure(workers, args, database, log):
+    port = free_port()
+    env = dict(os.environ, THERABOT_WORKERS=str(workers), THERABOT_BIND=f"127.0.0.1:{port}",
+               THERABOT_DATABASE=database, THERABOT_GENERATOR_BACKEND="fake",
+               THERABOT_FAKE_LATENCY=f"fixed:{args.generator_latency}",
+               THERABOT_WORKER_THREADS=str(args.threads))
+    if args.torch_threads:
+        env["THERABOT_TORCH_THREADS"] = str(args.torch_threads)
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base_url, proc, args.ready_timeout)
+        wall, timings = run_load(base_url, f"w{workers}", args.users, args.turns, "json")
+        worker_pids = children(proc.pid)
+        worker_mem = [smaps(pid) for pid in worker_pids]
+        master_mem = smaps(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+    chat = timings.get("chat_post", [])
+    n = max(len(worker_mem), 1)
+    return {
+        "workers": len(worker_pids),
+        "turns_per_s": len(chat) / wall,
+        "p50_ms": percentile(chat, 50) * 1000 if chat else float("nan"),
+        "p95_ms": percentile(chat, 95) * 1000 if chat else float("nan"),
+        "rss_mb": sum(m.get("Rss", 0) for m in worker_mem) / n / 1024,
+        "uss_mb": sum(m.get("Private_Clean", 0) + m.get("Private_Dirty", 0) for m in worker_mem) / n / 1024,
+        "pss_total_mb": (master_mem.get("Pss", 0) + sum(m.get("Pss", 0) for m in worker_mem)) / 1024,
+        "master_rss_mb": master_mem.get("Rss", 0) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default 1..cores, doubling)")
+    parser.add_argument("--users", type=int, default=32, help="concurrent synthetic users")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per user")
+    parser.add_argument("--threads", type=int, default=4, help="request threads per worker")
+    parser.add_argument("--torch-threads", type=int, default=None, help="torch threads per worker")
+    parser.add_argument("--generator-latency", type=float, default=0.0, help="fake generator seconds per reply")
+    parser.add_argument("--ready-timeout", type=float, default=600)
+    parser.add_argument("--verbose", action="store_true", help="show gunicorn's output")
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(",")]
+    else:
+        counts, w = [], 1
+        while w < cores:
+            counts.append(w)
+            w *= 2
+        counts.append(cores)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log = None if args.verbose else open(os.path.join(tmpdir, "gunicorn.log"), "w")
+        for workers in counts:
+            database = os.path.join(tmpdir, f"serving-{workers}.db")
+            init_database(database)
+            results.append(measure(workers, args, database, log))
+        if log:
+            log.close()
+
+    base = results[0]["turns_per_s"]
+    print(f"{cores} core(s), {args.users} users x {args.turns} turns, {args.threads} threads/worker\n")
+    print(f"{'workers':>7} {'turns/s':>8} {'scaling':>8} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'RSS/worker':>11} {'USS/worker':>11} {'total PSS':>10} {'master RSS':>11}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['turns_per_s']:>8.1f} {r['turns_per_s'] / base:>7.2f}x "
+              f"{r['p50_ms']:>7.0f} {r['p95_ms']:>7.0f} {r['rss_mb']:>9.0f}MB {r['uss_mb']:>9.0f}MB "
+              f"{r['pss_total_mb']:>8.0f}MB {r['master_rss_mb']:>9.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
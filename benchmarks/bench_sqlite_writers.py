@@ -0,0 +1,117 @@
+"""Concurrent chat-turn writers against SQLite: legacy connection handling vs app.db.
+
+Each worker thread replays chat turns the way the ``/chat`` handler does:
+read the user's history, then persist the user message and the bot reply.
+
+* ``legacy``: a fresh ``sqlite3.connect`` per turn, default rollback journal
+  and ``synchronous=FULL``, user and bot rows committed separately with the
+  (simulated) generation time in between.
+* ``tuned``: one pooled connection per thread from ``app.db.connect`` (WAL,
+  ``busy_timeout``, ``synchronous=NORMAL``), both rows in one transaction after
+  generation.
+
+Reports turns/s, per-turn latency percentiles and "database is locked" errors.
+
+    python benchmarks/bench_sqlite_writers.py --threads 1,8,32 --turns 50 --generation-ms 5
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import connect  # noqa: E402
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "schema.sql")
+HISTORY_SQL = "SELECT * FROM chat_history WHERE user_id = ? ORDER BY timestamp"
+USER_SQL = "INSERT INTO chat_history (user_id, sender, message) VALUES (?, ?, ?)"
+BOT_SQL = "INSERT INTO chat_history (user_id, sender, message, emotion) VALUES (?, ?, ?, ?)"
+
+
+def create_database(path, users):
+    conn = sqlite3.connect(path)
+    with open(SCHEMA, encoding="utf8") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                     [(f"user{i}", "x") for i in range(users)])
+    conn.commit()
+    conn.close()
+
+
+def legacy_turn(path, user_id, generation, busy_timeout, local):
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, timeout=busy_timeout)
+    try:
+        conn.execute(HISTORY_SQL, (user_id,)).fetchall()
+        conn.execute(USER_SQL, (user_id, "user", "I have been feeling stressed lately"))
+        conn.commit()
+        time.sleep(generation)
+        conn.execute(BOT_SQL, (user_id, "bot", "That sounds hard. Want to try a breathing exercise?", "worried"))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def tuned_turn(path, user_id, generation, busy_timeout, local):
+    conn = getattr(local, "conn", None)
+    if conn is None:
+        conn = local.conn = connect(path, busy_timeout_ms=busy_timeout * 1000)
+    conn.execute(HISTORY_SQL, (user_id,)).fetchall()
+    time.sleep(generation)
+    with conn:
+        conn.execute(USER_SQL, (user_id, "user", "I have been feeling stressed lately"))
+        conn.execute(BOT_SQL, (user_id, "bot", "That sounds hard. Want to try a breathing exercise?", "worried"))
+
+
+def run(turn, path, threads, turns, generation, busy_timeout):
+    latencies, errors = [], {"locked": 0, "other": 0}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            turn(path, i % threads + 1, generation, busy_timeout, local)
+        except sqlite3.OperationalError as e:
+            with lock:
+                errors["locked" if "locked" in str(e) else "other"] += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(threads * turns)))
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))] * 1000 if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", default="1,8,32", help="comma-separated writer thread counts")
+    parser.add_argument("--turns", type=int, default=50, help="chat turns per thread")
+    parser.add_argument("--generation-ms", type=float, default=5.0, help="simulated model time per turn")
+    parser.add_argument("--busy-timeout", type=float, default=5.0, help="seconds to wait on a locked database")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'threads':>7} {'turns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for threads in (int(t) for t in args.threads.split(",")):
+            for mode, turn in (("legacy", legacy_turn), ("tuned", tuned_turn)):
+                path = os.path.join(tmpdir, f"{mode}-{threads}.db")
+                create_database(path, threads)
+                wall, latencies, errors = run(turn, path, threads, args.turns,
+                                              args.generation_ms / 1000.0, args.busy_timeout)
+                print(f"{mode:<8} {threads:>7} {len(latencies) / wall:>9.1f} {pct(latencies, 50):>8.1f} "
+                      f"{pct(latencies, 95):>8.1f} {pct(latencies, 99):>8.1f} {errors['locked']:>7}")
+
+
+if __name__ == "__main__":
+    main()
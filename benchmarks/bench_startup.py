@@ -0,0 +1,100 @@
+"""Cold-start profile: app import time and time to first served page.
+
+Each measurement runs in a fresh interpreter (``--runs`` times, median
+reported):
+
+* ``create_app``: wall time to import the app package and build the app;
+* ``first /login``: process start until ``GET /login`` returns 200;
+* ``/readyz 200``: process start until warm-up has finished (only with
+  ``--ready``, which loads the real models);
+* the heaviest imports by cumulative time from ``python -X importtime``.
+
+Point ``--root`` at another checkout to compare, e.g. the commit before lazy
+imports::
+
+    git worktree add /tmp/therabot-old <commit>
+    python benchmarks/bench_startup.py --root /tmp/therabot-old
+    python benchmarks/bench_startup.py
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app import create_app
+app = create_app()
+created = time.perf_counter() - start
+# Checked before the first request, which may start the background warm-up
+heavy = [m for m in ('torch', 'transformers', 'sentence_transformers', 'google.generativeai') if m in sys.modules]
+client = app.test_client()
+assert client.get('/login').status_code == 200
+first_page = time.perf_counter() - start
+ready = None
+if {ready!r}:
+    while True:
+        status = client.get('/readyz').status_code
+        if status == 404:
+            break
+        if status == 200:
+            ready = time.perf_counter() - start
+            break
+        time.sleep(0.05)
+print(json.dumps({{'create_app': created, 'first_page': first_page, 'ready': ready, 'heavy': heavy}}))
+"""
+
+
+def run_child(root, ready, env):
+    out = subprocess.run([sys.executable, "-c", CHILD.format(root=root, ready=ready)],
+                         capture_output=True, text=True, env=env, cwd=root)
+    if out.returncode != 0:
+        sys.exit(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(root, env, top):
+    """``(cumulative_seconds, module)`` for the slowest imports made by ``create_app``."""
+    code = f"import sys; sys.path.insert(0, {root!r}); from app import create_app; create_app()"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         capture_output=True, text=True, env=env, cwd=root)
+    rows = []
+    for line in out.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| *(\S+)", line)
+        if match:
+            rows.append((int(match.group(1)) / 1e6, match.group(2)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=ROOT, help="checkout to measure")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ready", action="store_true", help="also time until /readyz returns 200")
+    parser.add_argument("--top", type=int, default=12, help="heaviest imports to list")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    env = dict(os.environ, THERABOT_GENERATOR_BACKEND=os.getenv("THERABOT_GENERATOR_BACKEND", "fake"))
+    results = [run_child(root, args.ready, env) for _ in range(args.runs)]
+    print(f"{root}: median of {args.runs} fresh interpreters")
+    print(f"  create_app      {statistics.median(r['create_app'] for r in results):7.2f} s")
+    print(f"  first /login    {statistics.median(r['first_page'] for r in results):7.2f} s")
+    if args.ready:
+        ready = [r["ready"] for r in results if r["ready"] is not None]
+        print(f"  /readyz 200     {statistics.median(ready):7.2f} s" if ready else "  /readyz         (no such route)")
+    print(f"  heavy modules imported by create_app: {', '.join(results[0]['heavy']) or 'none'}")
+    print("\nslowest imports (cumulative):")
+    for seconds, module in import_profile(root, env, args.top):
+        print(f"  {seconds:7.3f} s  {module}")
+
+
+if __name__ == "__main__":
+    main()
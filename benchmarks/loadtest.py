@@ -0,0 +1,292 @@
+"""End-to-end load test for the chat path.
+
+Starts the Flask app in-process on a throwaway SQLite database, served by a
+pool of ``N`` worker threads, with the generator backend defaulting to the
+local fake (``THERABOT_GENERATOR_BACKEND=fake``; tune it with the
+``THERABOT_FAKE_*`` variables). Synthetic users sign up through ``/signup``,
+log out and back in through ``/login``, load ``/chat`` and then replay a
+multi-turn conversation. For every worker count it reports throughput and:
+
+* p50/p95/p99 per request type (sign-up, login, chat post, ...), timed by the
+  client;
+* p50/p95/p99 per pipeline stage (emotion detection, retrieval, generation,
+  database writes, ...), from the server's ``therabot_stage_seconds``
+  histogram on ``/metrics``, scraped before and after the run. These are
+  interpolated within the histogram's buckets, so they are estimates.
+
+    python benchmarks/loadtest.py --workers 1,4,8 --users 16 --turns 5
+    python benchmarks/loadtest.py --mode stream          # time-to-first-delta too
+    python benchmarks/loadtest.py --target http://127.0.0.1:5000 --users 8
+
+With ``--target`` an already running server is driven instead and
+``--workers`` is ignored. Each server process keeps its own metrics, so against
+a multi-worker gunicorn the stage table covers whichever worker answered the
+``/metrics`` requests; run it with one worker for complete stage figures.
+"""
+import argparse
+import contextlib
+import http.cookiejar
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("THERABOT_GENERATOR_BACKEND", "fake")
+# Measure the pipeline itself, not admission control (see benchmarks/bench_admission.py)
+os.environ.setdefault("THERABOT_CHAT_RATE_PER_MIN", "0")
+os.environ.setdefault("THERABOT_CHAT_MAX_IN_FLIGHT", "0")
+
+CONVERSATIONS = [
+    ["hi", "I've been feeling really stressed about my exams",
+     "I can't sleep the night before a test", "tell me about breathing exercises", "thanks, I'll try that"],
+    ["hello", "I had a fight with my best friend today and I'm so angry",
+     "she said something really hurtful", "I don't know if I should text her", "ok"],
+    ["I'm feeling sad", "I moved to a new city and I don't know anyone",
+     "weekends are the worst", "maybe I could join a club", "thank you"],
+    ["hey", "today was actually a good day!", "I finished a big project at work",
+     "I want to celebrate but I'm tired", "what are some relaxation techniques"],
+]
+
+
+STAGE_SAMPLE = re.compile(r'^therabot_stage_seconds_(bucket|sum|count)\{(.*)\} (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def scrape_stages(base_url):
+    """``{stage: {"buckets": {le: count}, "sum": s, "count": n}}`` from /metrics, or None if it is off."""
+    try:
+        with urllib.request.urlopen(base_url + "/metrics", timeout=30) as response:
+            text = response.read().decode("utf8")
+    except urllib.error.HTTPError:
+        return None
+    stages = defaultdict(lambda: {"buckets": {}, "sum": 0.0, "count": 0})
+    for line in text.splitlines():
+        match = STAGE_SAMPLE.match(line)
+        if not match:
+            continue
+        kind, labels, value = match.group(1), dict(LABEL.findall(match.group(2))), float(match.group(3))
+        series = stages[labels["stage"]]
+        if kind == "bucket":
+            series["buckets"][float(labels["le"])] = value
+        else:
+            series[kind] = value
+    return dict(stages)
+
+
+def stage_deltas(before, after):
+    """What each stage observed between two scrapes."""
+    deltas = {}
+    for stage, series in after.items():
+        old = before.get(stage, {"buckets": {}, "sum": 0.0, "count": 0})
+        count = series["count"] - old["count"]
+        if count > 0:
+            deltas[stage] = {
+                "buckets": {le: n - old["buckets"].get(le, 0) for le, n in series["buckets"].items()},
+                "sum": series["sum"] - old["sum"],
+                "count": count,
+            }
+    return deltas
+
+
+def bucket_percentile(buckets, pct):
+    """Percentile of cumulative ``{le: count}`` buckets, linear within a bucket (as histogram_quantile)."""
+    bounds = sorted(buckets)
+    rank = pct / 100.0 * buckets[bounds[-1]]
+    lower, below = 0.0, 0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - below) / max(buckets[bound] - below, 1)
+        lower, below = bound, buckets[bound]
+    return lower
+
+
+class SyntheticUser:
+    """One browser-like session: its own cookie jar, timing every request by stage."""
+
+    def __init__(self, base_url, name, timings, lock):
+        self.base_url = base_url
+        self.name = name
+        self.timings = timings
+        self.lock = lock
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def _record(self, stage, seconds):
+        with self.lock:
+            self.timings[stage].append(seconds)
+
+    def _request(self, stage, path, data=None, json_body=None, headers=None):
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode("utf8")
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            data = urllib.parse.urlencode(data).encode("utf8")
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        start = time.perf_counter()
+        with self.opener.open(request, timeout=120) as response:
+            body = response.read()
+        self._record(stage, time.perf_counter() - start)
+        return body
+
+    def _stream(self, message):
+        request = urllib.request.Request(
+            self.base_url + "/chat/stream",
+            data=json.dumps({"message": message}).encode("utf8"),
+            headers={"Content-Type": "application/json", "Accept": "text/event-stream"},
+        )
+        start = time.perf_counter()
+        first_delta = None
+        with self.opener.open(request, timeout=120) as response:
+            for line in response:
+                if first_delta is None and line.startswith(b'data: {"delta"'):
+                    first_delta = time.perf_counter() - start
+        total = time.perf_counter() - start
+        self._record("chat_stream_first_delta", first_delta if first_delta is not None else total)
+        self._record("chat_stream_total", total)
+
+    def run(self, conversation, turns, mode):
+        credentials = {"username": self.name, "password": "load-test-password"}
+        self._request("signup", "/signup", data=credentials)
+        self._request("logout", "/logout")
+        self._request("login", "/login", data=credentials)
+        self._request("chat_page", "/chat")
+        for turn in range(turns):
+            message = conversation[turn % len(conversation)]
+            if mode in ("json", "both"):
+                self._request("chat_post", "/chat", json_body={"message": message},
+                              headers={"Accept": "application/json"})
+            if mode in ("stream", "both"):
+                self._stream(message)
+
+
+def start_server(workers, database):
+    """Serve the app from ``workers`` pooled threads; returns ``(base_url, shutdown)``."""
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+    from app import create_app
+    from app.db import init_db
+
+    class QuietHandler(WSGIRequestHandler):
+        def log(self, *args, **kwargs):
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        def __init__(self, app):
+            super().__init__("127.0.0.1", 0, app, handler=QuietHandler)
+            self.pool = ThreadPoolExecutor(workers, thread_name_prefix="loadtest-worker")
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    app = create_app()
+    app.config["DATABASE"] = database
+    with app.app_context():
+        init_db()
+    server = PooledWSGIServer(app)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def shutdown():
+        server.shutdown()
+        server.pool.shutdown(wait=True)
+
+    return f"http://127.0.0.1:{server.server_port}", shutdown
+
+
+def run_load(base_url, label, users, turns, mode):
+    timings = defaultdict(list)
+    lock = threading.Lock()
+    # One untimed conversation loads the models and the knowledge base index
+    SyntheticUser(base_url, f"warmup-{label}-{time.time_ns()}", defaultdict(list), lock).run(
+        CONVERSATIONS[0], 1, mode)
+
+    def one(i):
+        user = SyntheticUser(base_url, f"load-{label}-{i}-{time.time_ns()}", timings, lock)
+        user.run(CONVERSATIONS[i % len(CONVERSATIONS)], turns, mode)
+
+    before = scrape_stages(base_url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(users) as pool:
+        list(pool.map(one, range(users)))
+    wall = time.perf_counter() - start
+    after = scrape_stages(base_url)
+    stages = stage_deltas(before, after) if before is not None and after is not None else None
+    return wall, timings, stages
+
+
+def report(label, wall, timings, stages, users, turns):
+    chat_turns = max(len(timings.get("chat_post", [])), len(timings.get("chat_stream_total", [])))
+    print(f"\n[{label}] {users} users x {turns} turns in {wall:.2f}s -> "
+          f"{chat_turns / wall:.2f} chat turns/s, {sum(len(v) for v in timings.values()) / wall:.2f} requests/s")
+    print(f"  {'request':<24} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for request, values in timings.items():
+        print(f"  {request:<24} {len(values):>6} {percentile(values, 50) * 1000:>9.1f} "
+              f"{percentile(values, 95) * 1000:>9.1f} {percentile(values, 99) * 1000:>9.1f}")
+    if stages is None:
+        print("  (no pipeline stages: /metrics is disabled)")
+        return
+    print(f"\n  {'pipeline stage':<24} {'count':>6} {'mean ms':>9} {'~p50 ms':>9} {'~p95 ms':>9} {'~p99 ms':>9}")
+    for stage, series in sorted(stages.items()):
+        buckets = series["buckets"]
+        print(f"  {stage:<24} {series['count']:>6.0f} {series['sum'] / series['count'] * 1000:>9.1f} "
+              f"{bucket_percentile(buckets, 50) * 1000:>9.1f} {bucket_percentile(buckets, 95) * 1000:>9.1f} "
+              f"{bucket_percentile(buckets, 99) * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,4,8", help="comma-separated server worker-thread counts")
+    parser.add_argument("--users", type=int, default=16, help="concurrent synthetic users")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per user")
+    parser.add_argument("--mode", choices=("json", "stream", "both"), default="json")
+    parser.add_argument("--target", help="drive an already running server at this base URL")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    args = parser.parse_args()
+
+    if args.target:
+        wall, timings, stages = run_load(args.target.rstrip("/"), "target", args.users, args.turns, args.mode)
+        report(args.target, wall, timings, stages, args.users, args.turns)
+        return
+
+    print(f"generator backend: {os.environ['THERABOT_GENERATOR_BACKEND']}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for workers in (int(w) for w in args.workers.split(",")):
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                base_url, shutdown = start_server(workers, os.path.join(tmpdir, f"loadtest-{workers}.db"))
+                try:
+                    wall, timings, stages = run_load(base_url, f"w{workers}", args.users, args.turns, args.mode)
+                finally:
+                    shutdown()
+            report(f"{workers} workers", wall, timings, stages, args.users, args.turns)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Bounded, thread-safe LRU caches with per-entry TTL.
+
+Used to skip model inference for repeated short messages ("ok", "thanks",
+templated mood updates). Keys combine a hash of the normalized text with the
+model name, so swapping a model never serves stale results.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def text_key(text, model_name):
+    """Cache key for ``text`` under ``model_name``: case- and whitespace-insensitive."""
+    normalized = re.sub(r"\s+", " ", text).strip().casefold()
+    digest = hashlib.sha1(normalized.encode("utf8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class TTLCache:
+    """LRU cache holding at most ``maxsize`` entries, each valid for ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=3600.0, name="cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+CACHE_TTL = float(os.getenv("THERABOT_CACHE_TTL_SECONDS", "3600"))
+emotion_cache = TTLCache(int(os.getenv("THERABOT_EMOTION_CACHE_SIZE", "4096")), CACHE_TTL, "emotion")
+embedding_cache = TTLCache(int(os.getenv("THERABOT_EMBEDDING_CACHE_SIZE", "4096")), CACHE_TTL, "embedding")
+
+
+def cache_stats():
+    return {cache.name: cache.stats() for cache in (emotion_cache, embedding_cache)}
@@ -0,0 +1,140 @@
+"""Optimized CPU inference modes for the sentiment classifier.
+
+``THERABOT_CLASSIFIER_MODE`` selects how ``ModelRegistry`` loads it:
+
+* ``fp32``: the eager float32 model from the hub (default);
+* ``int8``: dynamic int8 quantization of every ``nn.Linear`` (weights stored
+  as int8, activations quantized on the fly);
+* ``traced``: a TorchScript graph traced from the fp32 model and frozen;
+* ``int8-traced``: the int8 model, traced and frozen.
+
+Conversions are done once and saved under ``THERABOT_MODEL_CACHE_DIR``; the
+file name includes the mode and torch version, because serialized quantized
+and TorchScript modules are not portable across torch releases. Every mode is
+returned as a module that accepts the tokenizer's keyword arguments and
+returns an object with ``.logits``, so callers do not change.
+"""
+import logging
+import os
+import re
+from types import SimpleNamespace
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+MODES = ("fp32", "int8", "traced", "int8-traced")
+CLASSIFIER_MODE = os.getenv("THERABOT_CLASSIFIER_MODE", "fp32")
+MODEL_CACHE_DIR = os.getenv("THERABOT_MODEL_CACHE_DIR", "model_cache")
+# Sentences used as example inputs when tracing; padding makes the graph batch-shaped
+TRACE_EXAMPLES = ["I feel great today!", "I'm worried about tomorrow and can't sleep at all."]
+
+
+class TracedClassifier(torch.nn.Module):
+    """Adapts a traced ``(input_ids, attention_mask) -> logits`` graph to the HF call style."""
+
+    def __init__(self, graph):
+        super().__init__()
+        self.graph = graph
+
+    def forward(self, input_ids, attention_mask=None, **unused):
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        return SimpleNamespace(logits=self.graph(input_ids, attention_mask))
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Wraps an HF model so tracing sees plain tensors in and out."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the model's Linear layers."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def trace(model, tokenizer):
+    """Trace ``model`` into a frozen TorchScript graph."""
+    inputs = tokenizer(TRACE_EXAMPLES, return_tensors="pt", padding=True, truncation=True)
+    with torch.inference_mode():
+        graph = torch.jit.trace(_LogitsOnly(model).eval(), (inputs["input_ids"], inputs["attention_mask"]),
+                                check_trace=False)
+    return torch.jit.freeze(graph.eval())
+
+
+def cache_path(model_name, mode, cache_dir=MODEL_CACHE_DIR):
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name.strip("/"))
+    return os.path.join(cache_dir, f"{safe_name}.{mode}.torch-{torch.__version__.split('+')[0]}.pt")
+
+
+def _build_int8_skeleton(model_name):
+    """An int8-quantized model with the right architecture but untrained weights."""
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+    model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(model_name))
+    model.eval()
+    return quantize_int8(model)
+
+
+def convert(model, tokenizer, mode):
+    """Convert an eval-mode fp32 ``model`` to ``mode``."""
+    if mode == "fp32":
+        return model
+    if mode == "int8":
+        return quantize_int8(model)
+    if mode == "traced":
+        return TracedClassifier(trace(model, tokenizer))
+    if mode == "int8-traced":
+        return TracedClassifier(trace(quantize_int8(model), tokenizer))
+    raise ValueError(f"Unknown classifier mode {mode!r}; expected one of {', '.join(MODES)}")
+
+
+def _save(converted, path, mode):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if mode == "int8":
+        torch.save(converted.state_dict(), tmp_path)
+    else:
+        torch.jit.save(converted.graph, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _load_cached(model_name, path, mode):
+    if mode == "int8":
+        model = _build_int8_skeleton(model_name)
+        model.load_state_dict(torch.load(path, weights_only=False))
+        return model
+    return TracedClassifier(torch.jit.load(path))
+
+
+def load_classifier(model_name, tokenizer, load_fp32, mode=CLASSIFIER_MODE, cache_dir=MODEL_CACHE_DIR):
+    """
+    Return the classifier in ``mode``, reusing a cached conversion when one exists.
+
+    ``load_fp32`` loads the eval-mode float32 model; it is only called on a
+    cache miss (or for ``fp32`` itself).
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown classifier mode {mode!r}; expected one of {', '.join(MODES)}")
+    if mode == "fp32":
+        return load_fp32()
+    path = cache_path(model_name, mode, cache_dir)
+    if os.path.exists(path):
+        try:
+            model = _load_cached(model_name, path, mode)
+            logger.info("Loaded %s classifier from %s", mode, path)
+            return model.eval()
+        except Exception as e:
+            logger.warning("Cached %s classifier at %s unusable, converting again: %s", mode, path, e)
+    converted = convert(load_fp32(), tokenizer, mode).eval()
+    try:
+        _save(converted, path, mode)
+        logger.info("Saved %s classifier to %s", mode, path)
+    except OSError as e:
+        logger.warning("Could not cache %s classifier at %s: %s", mode, path, e)
+    return converted
@@ -0,0 +1,207 @@
+"""Token-budgeted conversation memory with an incrementally updated summary.
+
+A user's memory is their last ``recent_turns`` turns verbatim plus a rolling
+summary of everything older, kept in the ``conversation_memory`` table
+together with ``summarized_through_id``, the last chat_history row folded into
+it. After a turn, once at least ``fold_turns`` turns have fallen out of the
+verbatim window, they are folded into the summary on a background thread; the
+previous summary is the only other input, so each update costs the same no
+matter how long the history is.
+
+``render`` fits the memory into whatever is left of ``token_budget`` after the
+system prompt and the current message, newest turns first. Token counts are
+estimated (about four characters per token) since Gemini's tokenizer is not
+available locally.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+# Cap on how many unsummarized rows one update reads, so users with a long
+# history from before memory existed are caught up gradually, not all at once
+MAX_FOLD_ROWS = 200
+
+prompt_tokens = metrics.histogram(
+    "therabot_prompt_tokens", "Estimated tokens per prompt part (system, memory, message, total).",
+    buckets=(32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384),
+)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def truncate_tokens(text, max_tokens, keep="head"):
+    """Cut ``text`` to roughly ``max_tokens``, keeping its start (``head``) or end (``tail``)."""
+    max_chars = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 3:
+        return ""
+    return text[:max_chars - 3] + "..." if keep == "head" else "..." + text[-(max_chars - 3):]
+
+
+def extractive_summary(previous_summary, messages, max_tokens=300):
+    """Model-free fallback: append the gist of each user message to the summary."""
+    notes = []
+    for sender, text in messages:
+        if sender == "user":
+            first_sentence = text.strip().split("\n")[0].split(". ")[0]
+            notes.append(f"User said: {truncate_tokens(first_sentence, 30)}")
+    combined = " ".join(part for part in [previous_summary] + notes if part)
+    return truncate_tokens(combined, max_tokens, keep="tail")
+
+
+class MemorySnapshot:
+    """A user's summary and recent ``(sender, message)`` pairs, oldest first."""
+
+    def __init__(self, summary="", messages=()):
+        self.summary = summary
+        self.messages = list(messages)
+
+
+class ConversationMemory:
+    """Loads, renders and incrementally summarizes per-user conversation memory."""
+
+    def __init__(self, enabled=True, recent_turns=6, token_budget=2000, summary_tokens=300,
+                 fold_turns=4, max_message_tokens=200):
+        self.enabled = enabled
+        self.recent_turns = max(0, int(recent_turns))
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.fold_turns = max(1, int(fold_turns))
+        self.max_message_tokens = max_message_tokens
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._scheduled = set()
+        self.stats = {"summaries": 0, "folded_rows": 0, "failed_updates": 0}
+
+    def load(self, db, user_id):
+        if not self.enabled:
+            return None
+        row = db.execute(
+            'SELECT summary, summarized_through_id FROM conversation_memory WHERE user_id = ?',
+            (user_id,)
+        ).fetchone()
+        summary, through_id = (row[0], row[1]) if row else ("", 0)
+        rows = db.execute(
+            'SELECT sender, message FROM chat_history WHERE user_id = ? AND id > ? '
+            'ORDER BY id DESC LIMIT ?',
+            (user_id, through_id, self.recent_turns * 2)
+        ).fetchall()
+        return MemorySnapshot(summary, [(r[0], r[1]) for r in reversed(rows)])
+
+    def render(self, snapshot, available_tokens):
+        """Memory text for the prompt, using at most ``available_tokens``."""
+        if snapshot is None or available_tokens <= 0 or not (snapshot.summary or snapshot.messages):
+            return ""
+        header = "Conversation So Far:\n"
+        remaining = available_tokens - estimate_tokens(header) - 1
+        summary_line = ""
+        if snapshot.summary:
+            summary = truncate_tokens(snapshot.summary, min(self.summary_tokens, remaining // 2), keep="tail")
+            if summary:
+                summary_line = f"Summary of earlier conversation: {summary}\n"
+                remaining -= estimate_tokens(summary_line)
+        lines = []
+        for sender, text in reversed(snapshot.messages):
+            line = f"{'User' if sender == 'user' else 'Therabot'}: {truncate_tokens(text, self.max_message_tokens)}\n"
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                break
+            lines.append(line)
+            remaining -= cost
+        if not summary_line and not lines:
+            return ""
+        return header + summary_line + "".join(reversed(lines)) + "\n"
+
+    def record_prompt(self, system_text, memory_text, user_text):
+        parts = {"system": estimate_tokens(system_text), "memory": estimate_tokens(memory_text),
+                 "message": estimate_tokens(user_text)}
+        for part, tokens in parts.items():
+            prompt_tokens.observe(tokens, part=part)
+        prompt_tokens.observe(sum(parts.values()), part="total")
+        return parts
+
+    def update(self, db, user_id, summarize):
+        """Fold turns that left the verbatim window into the summary. Returns True if it did."""
+        row = db.execute(
+            'SELECT summary, summarized_through_id FROM conversation_memory WHERE user_id = ?',
+            (user_id,)
+        ).fetchone()
+        summary, through_id = (row[0], row[1]) if row else ("", 0)
+        window = self.recent_turns * 2
+        rows = db.execute(
+            'SELECT id, sender, message FROM chat_history WHERE user_id = ? AND id > ? '
+            'ORDER BY id DESC LIMIT ?',
+            (user_id, through_id, window + MAX_FOLD_ROWS)
+        ).fetchall()
+        fold = list(reversed(rows))[:max(0, len(rows) - window)]
+        if len(fold) < self.fold_turns * 2:
+            return False
+        new_summary = summarize(summary, [(r[1], r[2]) for r in fold]) or summary
+        new_summary = truncate_tokens(new_summary.strip(), self.summary_tokens, keep="tail")
+        with db:
+            db.execute(
+                'INSERT INTO conversation_memory (user_id, summary, summarized_through_id, updated_at) '
+                'VALUES (?, ?, ?, CURRENT_TIMESTAMP) '
+                'ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary, '
+                'summarized_through_id = excluded.summarized_through_id, updated_at = excluded.updated_at',
+                (user_id, new_summary, fold[-1][0])
+            )
+        self.stats["summaries"] += 1
+        self.stats["folded_rows"] += len(fold)
+        return True
+
+    def schedule_update(self, connect, user_id, summarize):
+        """Run ``update`` for ``user_id`` on the background summarizer thread (deduplicated)."""
+        if not self.enabled:
+            return
+        with self._executor_lock:
+            if user_id in self._scheduled:
+                return
+            self._scheduled.add(user_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(1, thread_name_prefix="memory-summarizer")
+        self._executor.submit(self._run_update, connect, user_id, summarize)
+
+    def _run_update(self, connect, user_id, summarize):
+        try:
+            db = connect()
+            try:
+                self.update(db, user_id, summarize)
+            finally:
+                db.close()
+        except Exception as e:
+            self.stats["failed_updates"] += 1
+            logger.warning("Conversation memory update failed for user %s: %s", user_id, e)
+        finally:
+            with self._executor_lock:
+                self._scheduled.discard(user_id)
+
+
+conversation_memory = ConversationMemory(
+    enabled=os.getenv("THERABOT_MEMORY", "1") == "1",
+    recent_turns=int(os.getenv("THERABOT_MEMORY_RECENT_TURNS", "6")),
+    token_budget=int(os.getenv("THERABOT_PROMPT_TOKEN_BUDGET", "2000")),
+    summary_tokens=int(os.getenv("THERABOT_MEMORY_SUMMARY_TOKENS", "300")),
+    fold_turns=int(os.getenv("THERABOT_MEMORY_FOLD_TURNS", "4")),
+)
+
+
+@metrics.register_collector
+def _memory_metrics():
+    return [
+        ("therabot_memory_summaries_total", "counter", "Rolling summary updates.",
+         [({}, conversation_memory.stats["summaries"])]),
+        ("therabot_memory_folded_rows_total", "counter", "chat_history rows folded into summaries.",
+         [({}, conversation_memory.stats["folded_rows"])]),
+        ("therabot_memory_failed_updates_total", "counter", "Summary updates that raised.",
+         [({}, conversation_memory.stats["failed_updates"])]),
+    ]
@@ -0,0 +1,98 @@
+"""Dynamic micro-batching for the emotion classifier.
+
+Request threads hand their text to a single background worker, which waits up
+to ``max_wait_ms`` for other requests to arrive and then runs one padded
+forward pass for up to ``max_batch_size`` texts. Each caller gets back only
+its own label. Under concurrency this turns many batch-size-1 passes into a
+few larger ones; when idle, a lone request waits at most ``max_wait_ms``.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from model_registry import CLASSIFIER_LABELS, registry
+
+
+class EmotionBatcher:
+    """Groups concurrent ``predict`` calls into batched classifier passes."""
+
+    def __init__(self, load_classifier=None, max_batch_size=16, max_wait_ms=5.0,
+                 max_length=512, labels=CLASSIFIER_LABELS):
+        self._load_classifier = load_classifier or registry.classifier
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_length = max_length
+        self.labels = labels
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self.batches_run = 0
+        self.items_processed = 0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="emotion-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, text):
+        """Queue ``text`` for classification and return a Future for its label."""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def predict(self, text, timeout=None):
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            pending = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            try:
+                labels = self.classify([text for text, _ in pending])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            for (_, future), label in zip(pending, labels):
+                future.set_result(label)
+
+    def classify(self, texts):
+        """Labels for ``texts`` from one padded forward pass on the calling thread."""
+        import torch
+        tokenizer, model = self._load_classifier()
+        inputs = tokenizer(texts, return_tensors="pt", truncation=True,
+                           max_length=self.max_length, padding=True)
+        with torch.inference_mode():
+            logits = model(**inputs).logits
+        pred_ids = torch.argmax(logits, dim=1).tolist()
+        self.batches_run += 1
+        self.items_processed += len(texts)
+        return [self.labels.get(pred_id, "neutral") for pred_id in pred_ids]
+
+
+batcher = EmotionBatcher(
+    max_batch_size=int(os.getenv("THERABOT_BATCH_MAX_SIZE", "16")),
+    max_wait_ms=float(os.getenv("THERABOT_BATCH_MAX_WAIT_MS", "5")),
+)
@@ -0,0 +1,150 @@
+"""Confidence-gated emotion classifier cascade.
+
+Tier 1 is the bag-of-words logistic-regression pipeline from
+``therabot-clean/Emotion_detection_model.ipynb`` (saved as
+``emotion_pipeline_model_old.pkl``), which costs a few microseconds per
+message once compiled. When its top emotion probability is at least ``threshold`` its
+answer is used; otherwise the message goes to tier 2, the transformer
+classifier (through the micro-batcher).
+
+The pipeline was trained on neutral/happy/sad/love/anger; love counts towards
+"happy" and anger is "angry". It has no "worried" class, so worried messages
+are only answered by tier 1 if it is confidently wrong about them, which the
+threshold is there to prevent; see ``benchmarks/bench_emotion_cascade.py``
+for the agreement vs. CPU trade-off at each threshold.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PIPELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "therabot-clean", "emotion_pipeline_model_old.pkl"
+)
+# Pipeline class index -> app emotion label
+PIPELINE_LABELS = {0: "neutral", 1: "happy", 2: "sad", 3: "happy", 4: "angry"}
+
+tier_total = metrics.counter("therabot_emotion_tier_total", "Emotion predictions answered by each cascade tier.")
+tier_seconds = metrics.counter("therabot_emotion_tier_seconds_total", "Time spent in each cascade tier.")
+
+
+class CompiledTextClassifier:
+    """
+    CountVectorizer + multinomial LogisticRegression evaluated directly.
+
+    scikit-learn's per-call input validation costs ~1 ms for a single message,
+    more than the model itself; a vocabulary lookup and one softmax over the
+    summed coefficient rows gives identical probabilities in a few microseconds.
+    """
+
+    def __init__(self, pipeline):
+        vectorizer = pipeline.named_steps["vectorizer"]
+        classifier = pipeline.named_steps["classifier"]
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.weights = np.ascontiguousarray(classifier.coef_.T)
+        self.intercept = classifier.intercept_.copy()
+        self.classes_ = classifier.classes_
+
+    def predict_proba(self, texts):
+        out = np.empty((len(texts), len(self.classes_)))
+        for i, text in enumerate(texts):
+            rows = [self.vocabulary[token] for token in self.analyzer(text) if token in self.vocabulary]
+            scores = self.intercept + self.weights[rows].sum(axis=0) if rows else self.intercept.copy()
+            scores = np.exp(scores - scores.max())
+            out[i] = scores / scores.sum()
+        return out
+
+
+PARITY_PROBES = ["I feel so sad and lonely", "I hate this so much", "what a great day", "hi", "ok ok ok"]
+
+
+def load_pipeline(path=DEFAULT_PIPELINE_PATH):
+    """Load the pickled pipeline, compiled to ``CompiledTextClassifier`` when it is exactly equivalent."""
+    import joblib
+    import warnings
+    with warnings.catch_warnings():
+        # Pickled with an older scikit-learn; the estimators it uses are unchanged
+        warnings.simplefilter("ignore")
+        pipeline = joblib.load(path)
+        try:
+            compiled = CompiledTextClassifier(pipeline)
+            if np.allclose(compiled.predict_proba(PARITY_PROBES), pipeline.predict_proba(PARITY_PROBES), atol=1e-6):
+                return compiled
+            logger.info("Cascade pipeline is not a multinomial count model; using scikit-learn directly")
+        except (AttributeError, KeyError) as e:
+            logger.info("Cascade pipeline could not be compiled (%s); using scikit-learn directly", e)
+    return pipeline
+
+
+class EmotionCascade:
+    """Answers from the cheap pipeline when confident, else from the transformer."""
+
+    def __init__(self, predict_transformer, enabled=False, threshold=0.8, pipeline_path=DEFAULT_PIPELINE_PATH,
+                 load=load_pipeline):
+        self._predict_transformer = predict_transformer
+        self.enabled = enabled
+        self.threshold = threshold
+        self.pipeline_path = pipeline_path or DEFAULT_PIPELINE_PATH
+        self._load = load
+        self._pipeline = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def cache_tag(self):
+        """Distinguishes cached labels produced under this cascade configuration."""
+        return f"cascade@{self.threshold}" if self.enabled else ""
+
+    def pipeline(self):
+        if self._pipeline is None and not self._load_failed:
+            with self._lock:
+                if self._pipeline is None and not self._load_failed:
+                    try:
+                        self._pipeline = self._load(self.pipeline_path)
+                    except Exception as e:
+                        # Missing scikit-learn or model file: every message goes to the transformer
+                        self._load_failed = True
+                        logger.warning("Cascade tier 1 unavailable, using the transformer only: %s", e)
+        return self._pipeline
+
+    def cheap_predict(self, text):
+        """``(label, probability)`` from tier 1, or ``None`` if it is unavailable."""
+        predictions = self.cheap_predict_batch([text])
+        return predictions[0] if predictions is not None else None
+
+    def cheap_predict_batch(self, texts):
+        """``[(label, probability), ...]`` from tier 1 for each of ``texts``, or ``None`` if it is unavailable."""
+        pipeline = self.pipeline()
+        if pipeline is None:
+            return None
+        predictions = []
+        for probs in pipeline.predict_proba(texts):
+            scores = {}
+            for index, prob in zip(pipeline.classes_, probs):
+                label = PIPELINE_LABELS.get(int(index), "neutral")
+                scores[label] = scores.get(label, 0.0) + float(prob)
+            label = max(scores, key=scores.get)
+            predictions.append((label, scores[label]))
+        return predictions
+
+    def predict(self, text):
+        """Return ``(label, tier)`` where tier is ``"cheap"`` or ``"transformer"``."""
+        if self.enabled:
+            start = time.perf_counter()
+            cheap = self.cheap_predict(text)
+            tier_seconds.inc(time.perf_counter() - start, tier="cheap")
+            if cheap is not None and cheap[1] >= self.threshold:
+                tier_total.inc(tier="cheap")
+                return cheap[0], "cheap"
+        start = time.perf_counter()
+        label = self._predict_transformer(text)
+        tier_seconds.inc(time.perf_counter() - start, tier="transformer")
+        tier_total.inc(tier="transformer")
+        return label, "transformer"
@@ -1,79 +1,136 @@
 import json
+import logging
 import os
-import torch
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
-from sentence_transformers import SentenceTransformer, util
-import google.generativeai as genai
+import threading
+import time
 from dotenv import load_dotenv
+from model_registry import registry
+from emotion_batcher import batcher
+from emotion_cascade import EmotionCascade
+from lexicon import lexicon
+from kb_index import KnowledgeBaseIndex
+from caches import cache_stats, emotion_cache, embedding_cache, text_key
+from generator_client import client_from_env
+from semantic_cache import response_cache
+from conversation_memory import conversation_memory, estimate_tokens, extractive_summary
+from observability import metrics, record_event, span, stage_seconds
+
+logger = logging.getLogger(__name__)
 
 # Global variables
 gemini_model = None
+gemini_client = None  # GeneratorClient wrapping gemini_model (retries, deadlines, circuit breaker)
 THERABOT_SYSTEM_PROMPT = ""
+KNOWLEDGE_BASE_PATH = "knowledge_base.json"
 
-def detect_emotion(text: str) -> str:
-    try:
-        tokenizer = AutoTokenizer.from_pretrained("tabularisai/multilingual-sentiment-analysis")
-        model = AutoModelForSequenceClassification.from_pretrained("tabularisai/multilingual-sentiment-analysis")
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-        outputs = model(**inputs)
-        pred_id = torch.argmax(outputs.logits, dim=1).item()
+# Confident messages are labelled by the cheap pipeline; the rest go to the
+# transformer, batched with any other in-flight requests (see emotion_batcher.py)
+emotion_cascade = EmotionCascade(
+    lambda text: batcher.predict(text, timeout=30),
+    enabled=os.getenv("THERABOT_CASCADE", "0") == "1",
+    threshold=float(os.getenv("THERABOT_CASCADE_THRESHOLD", "0.8")),
+    pipeline_path=os.getenv("THERABOT_CASCADE_MODEL") or None,
+)
 
-        emotion_map = {0: "sad", 1: "neutral", 2: "happy", 3: "angry", 4: "worried"}
-        prediction = emotion_map.get(pred_id, "neutral")
+@span("detect_emotion")
+def detect_emotion(text: str, cues=None) -> str:
+    try:
+        cache_key = text_key(text, registry.classifier_name + emotion_cascade.cache_tag)
+        prediction = emotion_cache.get(cache_key)
+        if prediction is None:
+            prediction, _ = emotion_cascade.predict(text)
+            emotion_cache.put(cache_key, prediction)
 
-        print(f"Detected emotion: {prediction}")
+        logger.debug("Detected emotion: %s", prediction)
         return prediction
     except Exception as e:
-        print(f"Error in emotion detection: {e}")
-        return fallback_emotion_detection(text)
-
-def fallback_emotion_detection(text: str) -> str:
-    keywords = {
-        "happy": ["happy", "joy", "excited", "great", "excellent", "good"],
-        "sad": ["sad", "depressed", "upset", "down", "lonely", "miserable"],
-        "angry": ["angry", "frustrated", "mad", "annoyed", "irritated", "pissed"],
-        "worried": ["worried", "anxious", "concern", "nervous", "stressed", "scared"],
-        "neutral": ["think", "consider", "maybe", "perhaps", "wonder", "know", "tell"]
-    }
-    text_lower = text.lower()
-    for emotion in ["angry", "sad", "worried", "happy", "neutral"]:
-        if any(word in text_lower for word in keywords[emotion]):
-            return emotion
-    return "neutral"
+        logger.warning("Error in emotion detection, using keyword fallback: %s", e)
+        record_event("emotion_fallback")
+        return fallback_emotion_detection(text, cues)
+
+def detect_emotions_batch(texts, batch_size=64):
+    """
+    Labels for many texts, as ``detect_emotion`` would give them one at a time
+    (cascade included), for offline jobs such as ``flask rescore-emotions``.
+
+    Texts the cheap tier is not confident about go to the transformer in padded
+    passes of ``batch_size``, sorted by length so each pass pads little. There
+    is no cache and no keyword fallback: classifier errors are raised.
+    """
+    labels = [None] * len(texts)
+    if emotion_cascade.enabled:
+        cheap = emotion_cascade.cheap_predict_batch(texts)
+        for i, (label, probability) in enumerate(cheap or ()):
+            if probability >= emotion_cascade.threshold:
+                labels[i] = label
+    pending = sorted((i for i, label in enumerate(labels) if label is None), key=lambda i: len(texts[i]))
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        for i, label in zip(chunk, batcher.classify([texts[i] for i in chunk])):
+            labels[i] = label
+    return labels
+
+def fallback_emotion_detection(text: str, cues=None) -> str:
+    """Highest weighted emotion among the lexicon cues in ``text`` (see lexicon.py)."""
+    if cues is None:
+        cues = lexicon.scan(text)
+    return cues.emotion()
 
 def verify_api_connection():
     """Verify connection to the Gemini API before starting the application"""
     global gemini_model
     if gemini_model is None:
-        print("Gemini model not initialized yet")
+        logger.warning("Gemini model not initialized yet")
         return False
         
     try:
         # Simple test prompt to check connectivity
         test_response = gemini_model.generate_content("Hello, testing connection.")
         if test_response and test_response.parts:
-            print("✓ Gemini API connection successful")
+            logger.info("Gemini API connection successful")
             return True
         else:
-            print("✗ Gemini API connection test failed - empty response")
+            logger.error("Gemini API connection test failed: empty response")
             return False
     except Exception as e:
-        print(f"✗ Gemini API connection test failed: {e}")
+        logger.error("Gemini API connection test failed: %s", e)
         return False
 
+def create_generator(backend=None):
+    """Build the generation backend named by THERABOT_GENERATOR_BACKEND ("gemini" or "fake")."""
+    backend = backend or os.getenv("THERABOT_GENERATOR_BACKEND", "gemini")
+    if backend == "fake":
+        # Deterministic local stand-in for load testing; needs no API key or network
+        from fake_generator import FakeGeneratorBackend
+        logger.info("Using local fake generator backend")
+        return FakeGeneratorBackend.from_env()
+    if backend != "gemini":
+        raise ValueError(f"Unknown generator backend: {backend}")
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise RuntimeError("GOOGLE_API_KEY environment variable not set.")
+    import google.generativeai as genai
+    genai.configure(api_key=google_api_key)
+    logger.info("Using Gemini 2.0 Flash model")
+    return genai.GenerativeModel('gemini-2.0-flash')
+
+_load_models_lock = threading.Lock()
+
 def load_models():
+    """Load the embedder and configure the generator once; safe to call from several threads."""
+    with _load_models_lock:
+        if gemini_model is not None:
+            return registry.embedder(), gemini_model
+        return _load_models()
+
+def _load_models():
     load_dotenv()
-    global gemini_model
+    global gemini_model, gemini_client
     try:
-        print("Loading models...")
-        embedder = SentenceTransformer("paraphrase-MiniLM-L3-v2")
-        google_api_key = os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
-            print("ERROR: GOOGLE_API_KEY environment variable not set.")
-            exit(1)
-        genai.configure(api_key=google_api_key)
-        gemini_model = genai.GenerativeModel('gemini-2.0-flash')
-        print("Using Gemini 2.0 Flash model")
+        logger.info("Loading models...")
+        embedder = registry.embedder()
+        model = create_generator()
+        client = client_from_env(model)
 
         global THERABOT_SYSTEM_PROMPT
         THERABOT_SYSTEM_PROMPT = (
@@ -106,23 +163,22 @@ def load_models():
             "- Crisis Support: [Find A Helpline🆘](https://findahelpline.com) (Mention this carefully if the user expresses severe distress)\n"
             "- General Mental Health Info: [NIMH](https://www.nimh.nih.gov), [Mind UK](https://www.mind.org.uk)\n"
         )
-        print("Models loaded successfully (Embedder + Gemini configured)")
-        
-        # Verify API connection
-        connection_success = verify_api_connection()
-        if not connection_success:
-            print("WARNING: Could not establish connection to Gemini API. Responses may be unreliable.")
+        # Published last, so a failed load is retried by the next caller
+        gemini_model, gemini_client = model, client
+        logger.info("Models loaded successfully (Embedder + Gemini configured)")
         
         return embedder, gemini_model
     except Exception as e:
-        print(f"Error loading models or configuring Gemini: {e}")
-        exit(1)
+        logger.error("Error loading models or configuring Gemini: %s", e)
+        # Not SystemExit: this also runs on request threads (prepare_turn), where
+        # the chat pipeline answers with its fallback reply instead
+        raise RuntimeError(f"Could not load models or configure the generator: {e}") from e
 
 def load_knowledge_base():
     try:
-        kb_path = "knowledge_base.json"
+        kb_path = KNOWLEDGE_BASE_PATH
         if not os.path.exists(kb_path):
-            print("Knowledge base not found. Creating a simple one...")
+            logger.info("Knowledge base not found. Creating a simple one...")
             sample_kb = [
                 {"emotion": "happy", "text": "It's great to hear you're feeling positive! 🌟"},
                 {"emotion": "sad", "text": "I'm sorry you're feeling down. Remember, it's okay to feel sad. 🫂"},
@@ -135,44 +191,79 @@ def load_knowledge_base():
 
         with open(kb_path, "r") as f:
             knowledge_data = json.load(f)
-        print(f"Loaded {len(knowledge_data)} entries from knowledge base")
+        logger.info("Loaded %d entries from knowledge base", len(knowledge_data))
         return knowledge_data
     except Exception as e:
-        print(f"Error loading knowledge base: {e}")
+        logger.error("Error loading knowledge base: %s", e)
         return [{"emotion": "neutral", "text": "I'm here to help. 🫂"}]
 
-def retrieve_context(user_input, emotion, corpus, corpus_embeddings, embedder, knowledge_data, k=1):
-    try:
-        emotion_texts = [entry["text"] for entry in knowledge_data if entry["emotion"] == emotion]
-        relevant_corpus = emotion_texts or corpus
+# Compiled, memory-mapped embeddings of the knowledge base; rebuilt only when the JSON changes
+knowledge_index = KnowledgeBaseIndex(
+    KNOWLEDGE_BASE_PATH, load_knowledge_base, registry.embedder, registry.embedder_name
+)
 
-        if not relevant_corpus:
-            return ["I'm here for you. Let's talk. 🌟"]
 
-        target_embeddings = (
-            embedder.encode(relevant_corpus, convert_to_tensor=True)
-            if emotion_texts or corpus_embeddings is None
-            else corpus_embeddings
-        )
+def probe_generator():
+    """Live Gemini round trip; run during warm-up rather than in load_models."""
+    if not verify_api_connection():
+        raise RuntimeError("Could not establish connection to Gemini API. Responses may be unreliable.")
 
-        user_emb = embedder.encode(user_input, convert_to_tensor=True)
-        scores = util.pytorch_cos_sim(user_emb, target_embeddings)
-        actual_k = min(k, len(relevant_corpus))
 
-        if actual_k == 0:
-            return ["How does that make you feel? 💬"]
+# Warm-up steps that only load weights and files, so a gunicorn master can run them before
+# forking; the generator's gRPC channel is not fork-safe and must be created in each worker
+FORK_SAFE_WARM_UP_STEPS = ("classifier", "embedder", "knowledge_index", "lexicon", "cascade")
+
+
+def warm_up_steps():
+    """``(name, fn, required)`` steps that load what the first chat message would otherwise wait for."""
+    steps = [
+        ("classifier", registry.classifier, True),
+        ("embedder", registry.embedder, True),
+        ("knowledge_index", knowledge_index.current, True),
+        ("lexicon", lexicon.matcher, True),
+        ("generator", load_models, True),
+    ]
+    if emotion_cascade.enabled:
+        # Falls back to the transformer by itself if the pipeline cannot load
+        steps.append(("cascade", emotion_cascade.pipeline, False))
+    if os.getenv("THERABOT_GENERATOR_BACKEND", "gemini") == "gemini":
+        # Informational: generation has its own retries and circuit breaker
+        steps.append(("generator_probe", probe_generator, False))
+    return steps
 
-        top_results = torch.topk(scores, k=actual_k)
-        top_indices, top_scores = top_results[1][0], top_results[0][0]
+
+def embed_query(text, embedder):
+    """Normalized query embedding, served from the embedding cache when possible."""
+    cache_key = text_key(text, registry.embedder_name)
+    embedding = embedding_cache.get(cache_key)
+    if embedding is None:
+        embedding = embedder.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+        embedding_cache.put(cache_key, embedding)
+    return embedding
+
+@span("retrieve_context")
+def retrieve_context(user_input, emotion, index, embedder, k=1):
+    try:
+        if not len(index):
+            return ["I'm here for you. Let's talk. 🌟"]
+
+        # One query encode (skipped for repeated messages) plus a matrix product over the emotion's rows
+        user_emb = embed_query(user_input, embedder)
+        results = index.search(user_emb, emotion, k=k)
+
+        if not results:
+            return ["How does that make you feel? 💬"]
 
         score_threshold = 0.3
-        contexts = [relevant_corpus[idx] for i, idx in enumerate(top_indices) if top_scores[i] >= score_threshold]
+        contexts = [text for text, score in results if score >= score_threshold]
 
         return contexts if contexts else ["Tell me more about that. 🫂"]
     except Exception as e:
-        print(f"Error retrieving context: {e}")
+        logger.warning("Error retrieving context: %s", e)
+        record_event("retrieval_fallback")
         return ["I'm here to listen and help you with your concerns. 🌼"]
 
+@span("build_prompt_user_part")
 def build_prompt_user_part(user_input: str, emotion: str, context: list[str]) -> str:
     context_str = "\n".join(f"- {c}" for c in context) if context else "No specific context retrieved."
     return (
@@ -182,72 +273,262 @@ def build_prompt_user_part(user_input: str, emotion: str, context: list[str]) ->
         f"Assistant Response:"
     )
 
-def generate_response(user_prompt_part: str, generator, username: str) -> str:
-    global gemini_model
+SUMMARY_PROMPT = (
+    "You keep a short running summary of a supportive conversation between {username} and Therabot, "
+    "a mental health assistant. Update the summary with the new messages below. Keep what matters "
+    "for future replies: how {username} has been feeling, important events or people, and coping "
+    "strategies discussed or tried. Write at most {max_words} words in the third person and reply "
+    "with the summary only.\n\n"
+    "Current Summary:\n{summary}\n\n"
+    "New Messages:\n{messages}\n\n"
+    "Updated Summary:"
+)
+
+def summarize_conversation(previous_summary, messages, username="the user"):
+    """Fold ``messages`` into ``previous_summary`` with the generator; extractive fallback on failure."""
+    max_words = int(conversation_memory.summary_tokens * 0.75)
+    if gemini_client is not None:
+        prompt = SUMMARY_PROMPT.format(
+            username=username,
+            max_words=max_words,
+            summary=previous_summary or "(none yet)",
+            messages="\n".join(f"{'User' if sender == 'user' else 'Therabot'}: {text}" for sender, text in messages),
+        )
+        try:
+            response = gemini_client.generate(prompt)
+            if response.parts and response.text.strip():
+                return response.text.strip()
+        except Exception as e:
+            logger.warning("Summary generation failed, using extractive summary: %s", e)
+    record_event("memory_summary_fallback")
+    return extractive_summary(previous_summary, messages, conversation_memory.summary_tokens)
+
+PEACEFUL_MUSIC_ACK = "\n\nI've started playing some peaceful music to help you relax. You can adjust the volume or stop it using the controls at the top. 🎵"
+RESPONSE_MARKER = "Assistant Response:"
+# Sent instead of a generated reply when the server is too busy (see chatbot_respond_degraded)
+DEGRADED_REPLY = "I'm talking with a lot of people right now, so I can only give you a short answer. I'm still here for you, and I've noted how you're feeling. Please send your message again in a moment for a fuller reply. 💙"
+
+def _clean_response(text: str, formatted_system_prompt: str) -> str:
+    cleaned_response = text.strip()
+    if formatted_system_prompt in cleaned_response:
+        cleaned_response = cleaned_response.replace(formatted_system_prompt, "")
+    if RESPONSE_MARKER in cleaned_response:
+        cleaned_response = cleaned_response.split(RESPONSE_MARKER)[-1].strip()
+    return cleaned_response
+
+def _generation_error_reply(e: Exception) -> str:
+    if isinstance(e, ConnectionError):
+        logger.warning("Connection error with Gemini API: %s", e)
+        record_event("generation_fallback", reason="connection")
+        return "I'm having trouble connecting to my services. Please check your internet connection and try again in a moment. 🌐💫"
+    if isinstance(e, TimeoutError):
+        logger.warning("Timeout error with Gemini API: %s", e)
+        record_event("generation_fallback", reason="timeout")
+        return "It's taking longer than expected to process your request. Please try again shortly. ⏱️💙"
+    logger.error("Error generating response with Gemini: %s", e)
+    record_event("generation_fallback", reason="error")
+    # Check for specific network-related errors
+    error_str = str(e).lower()
+    if any(term in error_str for term in ["network", "connection", "timeout", "connect", "socket"]):
+        return "I'm having trouble connecting to my AI services. Please check your internet connection and try again. 🌐🔄"
+    return "I'm here for you, even if I'm having technical issues. 🛠️💙"
+
+def _blocked_reply(response):
+    """Reply for a response with no parts, distinguishing safety blocks."""
+    try:
+        if response.prompt_feedback.block_reason:
+            logger.info("Content blocked due to: %s", response.prompt_feedback.block_reason)
+            record_event("safety_block")
+            return "I cannot respond to that request as it may violate safety guidelines. 🚫"
+    except Exception:
+        pass
+    return "I'm having trouble formulating a response right now. Could you try rephrasing? 🌀"
+
+@span("generate_response")
+def _generate_response(user_prompt_part: str, generator, username: str):
+    """Like ``generate_response`` but returns ``(reply, ok)``; ``ok`` is False for fallback replies."""
     if generator is None:
-        print("Error: Gemini model not initialized.")
-        return "Sorry, I encountered an issue. Please try again later. 🛠️"
+        logger.error("Gemini model not initialized.")
+        record_event("generation_fallback", reason="not_initialized")
+        return "Sorry, I encountered an issue. Please try again later. 🛠️", False
 
     try:
         formatted_system_prompt = THERABOT_SYSTEM_PROMPT.format(username=username)
         full_prompt = f"{formatted_system_prompt}\n\n{user_prompt_part}"
 
-        # Add retry logic for network issues
-        max_retries = 3
-        retry_count = 0
-        last_error = None
-        
-        while retry_count < max_retries:
-            try:
-                # Add timeout for API calls
-                response = generator.generate_content(full_prompt)
-                break  # If successful, exit retry loop
-            except Exception as e:
-                retry_count += 1
-                last_error = e
-                print(f"API call attempt {retry_count}/{max_retries} failed: {str(e)}")
-                if retry_count < max_retries:
-                    import time
-                    time.sleep(2)  # Wait before retrying
-                else:
-                    # All retries failed
-                    raise last_error
+        # Retries with backoff, the deadline and the circuit breaker live in the client
+        response = generator.generate(full_prompt)
 
         if not response.parts:
-            print("Warning: Gemini response has no parts.")
-            try:
-                if response.prompt_feedback.block_reason:
-                    print(f"Content blocked due to: {response.prompt_feedback.block_reason}")
-                    return "I cannot respond to that request as it may violate safety guidelines. 🚫"
-            except Exception:
-                pass
-            return "I'm having trouble formulating a response right now. Could you try rephrasing? 🌀"
-
-        cleaned_response = response.text.strip()
-        if formatted_system_prompt in cleaned_response:
-            cleaned_response = cleaned_response.replace(formatted_system_prompt, "")
-        if "Assistant Response:" in cleaned_response:
-            cleaned_response = cleaned_response.split("Assistant Response:")[-1].strip()
+            logger.warning("Gemini response has no parts.")
+            return _blocked_reply(response), False
+
+        cleaned_response = _clean_response(response.text, formatted_system_prompt)
 
         if not cleaned_response:
-            return "I'm listening. Could you elaborate a bit? 👂"
+            return "I'm listening. Could you elaborate a bit? 👂", False
 
-        return cleaned_response
-    except ConnectionError as ce:
-        print(f"Connection error with Gemini API: {ce}")
-        return "I'm having trouble connecting to my services. Please check your internet connection and try again in a moment. 🌐💫"
-    except TimeoutError as te:
-        print(f"Timeout error with Gemini API: {te}")
-        return "It's taking longer than expected to process your request. Please try again shortly. ⏱️💙"
+        return cleaned_response, True
     except Exception as e:
-        print(f"Error generating response with Gemini: {e}")
-        # Check for specific network-related errors
-        error_str = str(e).lower()
-        if any(term in error_str for term in ["network", "connection", "timeout", "connect", "socket"]):
-            return "I'm having trouble connecting to my AI services. Please check your internet connection and try again. 🌐🔄"
-        return "I'm here for you, even if I'm having technical issues. 🛠️💙"
-
-def chatbot_respond(message, user_id=None, user_mood=None, username=None):
+        return _generation_error_reply(e), False
+
+def generate_response(user_prompt_part: str, generator, username: str) -> str:
+    return _generate_response(user_prompt_part, generator, username)[0]
+
+class ResponseStream:
+    """
+    Iterates over a Gemini streaming reply, yielding cleaned text deltas.
+
+    The "Assistant Response:" clean-up is applied incrementally: leading
+    whitespace is dropped, a short tail is held back in case the marker spans
+    two chunks, and anything before a marker is discarded. Once iteration
+    finishes, ``text`` holds the final reply with the same clean-up as
+    ``generate_response`` (clients should replace the streamed text with it).
+    """
+
+    def __init__(self, user_prompt_part: str, generator, username: str, suffix: str = "", text: str = None,
+                 on_complete=None):
+        self.user_prompt_part = user_prompt_part
+        self.generator = generator
+        self.username = username
+        self.suffix = suffix
+        # A stream created with ``text`` just replays that fixed reply
+        self.text = text
+        # Called with the cleaned reply (without suffix) when the model answered normally
+        self.on_complete = on_complete
+
+    def _chunks(self, full_prompt):
+        emitted = False
+        last_chunk = None
+        for chunk in self.generator.stream(full_prompt):
+            last_chunk = chunk
+            if chunk.parts:
+                emitted = True
+                yield chunk.text
+        if not emitted:
+            logger.warning("Gemini response has no parts.")
+            self.text = _blocked_reply(last_chunk)
+
+    def __iter__(self):
+        start = time.perf_counter()
+        first = True
+        try:
+            for delta in self._cleaned_deltas():
+                if first:
+                    stage_seconds.observe(time.perf_counter() - start, stage="generate_first_delta")
+                    first = False
+                yield delta
+        finally:
+            stage_seconds.observe(time.perf_counter() - start, stage="generate_response_stream")
+
+    def _cleaned_deltas(self):
+        if self.text is not None:
+            yield self.text
+            return
+        if self.generator is None:
+            logger.error("Gemini model not initialized.")
+            record_event("generation_fallback", reason="not_initialized")
+            self.text = "Sorry, I encountered an issue. Please try again later. 🛠️"
+            yield self.text
+            return
+
+        formatted_system_prompt = THERABOT_SYSTEM_PROMPT.format(username=self.username)
+        full_prompt = f"{formatted_system_prompt}\n\n{self.user_prompt_part}"
+        raw = ""
+        pending = ""
+        holdback = len(RESPONSE_MARKER) - 1
+        started = False
+        try:
+            for piece in self._chunks(full_prompt):
+                raw += piece
+                pending += piece
+                if RESPONSE_MARKER in pending:
+                    pending = pending.split(RESPONSE_MARKER)[-1]
+                if not started:
+                    pending = pending.lstrip()
+                if len(pending) > holdback:
+                    delta, pending = pending[:-holdback], pending[-holdback:]
+                    started = True
+                    yield delta
+        except Exception as e:
+            reply = _generation_error_reply(e)
+            if started:
+                # Keep what the user has already seen rather than replacing it with an error
+                self.text = _clean_response(raw, formatted_system_prompt) or reply
+            else:
+                self.text = reply
+                yield reply
+            return
+
+        if self.text is not None:
+            # The model produced no parts (e.g. a safety block)
+            yield self.text
+            return
+        tail = pending.rstrip()
+        if tail:
+            started = True
+            yield tail
+        cleaned = _clean_response(raw, formatted_system_prompt)
+        self.text = cleaned or "I'm listening. Could you elaborate a bit? 👂"
+        if not started:
+            yield self.text
+        if cleaned and self.on_complete:
+            self.on_complete(cleaned)
+        if self.suffix:
+            self.text += self.suffix
+            yield self.suffix
+
+def prepare_turn(message, user_id=None, user_mood=None, username=None, memory=None):
+    """
+    Run everything that happens before generation for one chat message.
+
+    ``memory`` is the user's ``MemorySnapshot`` (see conversation_memory.py); as
+    much of it as fits in the prompt token budget is included.
+
+    Returns:
+        tuple: (user_prompt_part, detected_emotion, username, peaceful_music_request, should_play_music,
+        personalized), where ``personalized`` is True when the prompt includes the user's memory
+    """
+    # Initialize if not already done
+    global gemini_model
+    if gemini_model is None:
+        embedder, gemini_model = load_models()
+    else:
+        embedder = registry.embedder()
+    
+    # Load the knowledge base index (reloaded only if knowledge_base.json changed)
+    kb_index = knowledge_index.current()
+    
+    # One lexicon pass finds the music triggers and the keyword-fallback emotion cues
+    cues = lexicon.scan(message)
+    
+    # Detect emotion or use provided mood
+    emotion = user_mood if user_mood else detect_emotion(message, cues)
+    
+    # Get username (default if not provided)
+    if not username:
+        username = f"User_{user_id}" if user_id else "friend"
+    
+    # Check for explicit request to play peaceful music
+    peaceful_music_request = "music_request" in cues.triggers
+    
+    # Retrieve relevant context
+    contexts = retrieve_context(message, emotion, kb_index, embedder)
+    
+    # Build the prompt, giving conversation memory whatever the token budget leaves
+    system_prompt = THERABOT_SYSTEM_PROMPT.format(username=username) if THERABOT_SYSTEM_PROMPT else ""
+    user_prompt_part = build_prompt_user_part(message, emotion, contexts)
+    available = conversation_memory.token_budget - estimate_tokens(system_prompt) - estimate_tokens(user_prompt_part)
+    memory_text = conversation_memory.render(memory, available)
+    conversation_memory.record_prompt(system_prompt, memory_text, user_prompt_part)
+    user_prompt_part = memory_text + user_prompt_part
+    
+    # Determine if we should play peaceful music (for explicit requests or calming effect during stress)
+    should_play_music = peaceful_music_request or "worried" in emotion.lower() or "stress" in cues.triggers
+    
+    return user_prompt_part, emotion, username, peaceful_music_request, should_play_music, bool(memory_text)
+
+def chatbot_respond(message, user_id=None, user_mood=None, username=None, memory=None):
     """
     Main entry point for chatbot functionality.
     
@@ -256,55 +537,141 @@ def chatbot_respond(message, user_id=None, user_mood=None, username=None):
         user_id (int, optional): The user's ID for personalization
         user_mood (str, optional): The user's selected mood if provided
         username (str, optional): The user's name
+        memory (MemorySnapshot, optional): The user's conversation memory
     
     Returns:
         tuple: (bot_response, detected_emotion, should_play_rain)
     """
     try:
-        # Initialize if not already done
-        global gemini_model
-        if gemini_model is None:
-            embedder, gemini_model = load_models()
-        else:
-            embedder = SentenceTransformer("paraphrase-MiniLM-L3-v2")
-        
-        # Load the knowledge base
-        knowledge_data = load_knowledge_base()
-        
-        # Detect emotion or use provided mood
-        emotion = user_mood if user_mood else detect_emotion(message)
-        
-        # Get username (default if not provided)
-        if not username:
-            username = f"User_{user_id}" if user_id else "friend"
-        
-        # Check for explicit request to play peaceful music
-        peaceful_music_request = any(phrase in message.lower() for phrase in ["play peaceful", "peaceful music", "play some peaceful", "peaceful sounds", "play the peaceful"])
-        
-        # Retrieve relevant context
-        contexts = retrieve_context(
-            message, 
-            emotion, 
-            corpus=[entry["text"] for entry in knowledge_data],
-            corpus_embeddings=None, 
-            embedder=embedder, 
-            knowledge_data=knowledge_data
+        user_prompt_part, emotion, username, peaceful_music_request, should_play_music, personalized = prepare_turn(
+            message, user_id=user_id, user_mood=user_mood, username=username, memory=memory
         )
         
-        # Build the prompt
-        user_prompt_part = build_prompt_user_part(message, emotion, contexts)
-        
-        # Generate response
-        response = generate_response(user_prompt_part, gemini_model, username)
-        
-        # Determine if we should play peaceful music (for explicit requests or calming effect during stress)
-        should_play_music = peaceful_music_request or "worried" in emotion.lower() or "anxious" in message.lower() or "stressed" in message.lower()
+        # Generic, templated prompts may be answered from the semantic cache, but never
+        # a prompt that carries this user's conversation memory: its reply is theirs alone
+        category = response_cache.allows(message) if not personalized else None
+        query_emb = embed_query(message, registry.embedder()) if category else None
+        response = response_cache.lookup(category, emotion, query_emb, username) if category else None
+
+        if response is None:
+            # Generate response
+            start = time.perf_counter()
+            response, ok = _generate_response(user_prompt_part, gemini_client, username)
+            if category and ok:
+                response_cache.store(category, emotion, query_emb, response, username, time.perf_counter() - start)
         
         # Add explicit acknowledgment of peaceful music if requested
         if peaceful_music_request:
-            response += "\n\nI've started playing some peaceful music to help you relax. You can adjust the volume or stop it using the controls at the top. 🎵"
+            response += PEACEFUL_MUSIC_ACK
         
         return response, emotion, should_play_music
     except Exception as e:
-        print(f"Error in chatbot_respond: {e}")
+        logger.exception("Error in chatbot_respond: %s", e)
+        record_event("pipeline_error")
         return "I'm having some trouble right now, but I'm still here for you. 💙", "neutral", False
+
+def chatbot_respond_degraded(message, user_mood=None):
+    """
+    Reply to a message turned away from the full pipeline under load (see
+    app/admission.py): the emotion comes from the keyword fallback and the
+    reply is canned, so no model or Gemini call is made.
+
+    Returns:
+        tuple: (bot_response, detected_emotion, should_play_music)
+    """
+    cues = lexicon.scan(message)
+    emotion = user_mood if user_mood else fallback_emotion_detection(message, cues)
+    peaceful_music_request = "music_request" in cues.triggers
+    should_play_music = peaceful_music_request or "worried" in emotion.lower() or "stress" in cues.triggers
+    response = DEGRADED_REPLY
+    if peaceful_music_request:
+        response += PEACEFUL_MUSIC_ACK
+    return response, emotion, should_play_music
+
+def chatbot_respond_stream(message, user_id=None, user_mood=None, username=None, memory=None):
+    """
+    Streaming variant of ``chatbot_respond``.
+    
+    Returns:
+        tuple: (ResponseStream, detected_emotion, should_play_music). Iterate the
+        stream for text deltas; its ``text`` attribute holds the final reply.
+    """
+    try:
+        user_prompt_part, emotion, username, peaceful_music_request, should_play_music, personalized = prepare_turn(
+            message, user_id=user_id, user_mood=user_mood, username=username, memory=memory
+        )
+        suffix = PEACEFUL_MUSIC_ACK if peaceful_music_request else ""
+
+        category = response_cache.allows(message) if not personalized else None
+        if category:
+            query_emb = embed_query(message, registry.embedder())
+            cached = response_cache.lookup(category, emotion, query_emb, username)
+            if cached is not None:
+                return ResponseStream("", None, username, text=cached + suffix), emotion, should_play_music
+            start = time.perf_counter()
+            on_complete = lambda reply: response_cache.store(
+                category, emotion, query_emb, reply, username, time.perf_counter() - start
+            )
+        else:
+            on_complete = None
+        stream = ResponseStream(user_prompt_part, gemini_client, username, suffix, on_complete=on_complete)
+        return stream, emotion, should_play_music
+    except Exception as e:
+        logger.exception("Error in chatbot_respond_stream: %s", e)
+        record_event("pipeline_error")
+        reply = "I'm having some trouble right now, but I'm still here for you. 💙"
+        return ResponseStream("", None, username, text=reply), "neutral", False
+
+@metrics.register_collector
+def _pipeline_metrics():
+    """Expose counters owned by the pipeline components on /metrics."""
+    families = []
+    caches = dict(cache_stats(), semantic=response_cache.stats())
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        families.append((
+            f"therabot_cache_{field}" + ("_total" if kind == "counter" else ""), kind,
+            f"Cache {field} per cache.",
+            [({"cache": name}, stats.get(field, 0)) for name, stats in caches.items()],
+        ))
+    families.append((
+        "therabot_semantic_cache_saved_seconds_total", "counter",
+        "Generation time avoided by semantic cache hits.",
+        [({}, caches["semantic"]["saved_seconds"])],
+    ))
+    families.append((
+        "therabot_emotion_batches_total", "counter", "Batched classifier forward passes.",
+        [({}, batcher.batches_run)],
+    ))
+    families.append((
+        "therabot_emotion_batch_items_total", "counter", "Messages classified through the batcher.",
+        [({}, batcher.items_processed)],
+    ))
+    model_stats = registry.stats()
+    families.append((
+        "therabot_model_load_seconds", "gauge", "Time taken to load each model.",
+        [({"model": name}, value["load_seconds"]) for name, value in model_stats.items() if isinstance(value, dict)],
+    ))
+    families.append((
+        "therabot_model_param_bytes", "gauge", "Bytes held by each model's weights.",
+        [({"model": name}, value["param_bytes"]) for name, value in model_stats.items() if isinstance(value, dict)],
+    ))
+    families.append((
+        "therabot_process_resident_bytes", "gauge", "Resident set size of this process.",
+        [({}, model_stats["process_rss_bytes"])],
+    ))
+    if gemini_client is not None:
+        client_stats = gemini_client.snapshot()
+        for field in ("calls", "retries", "failures", "rejected"):
+            families.append((
+                f"therabot_generator_{field}_total", "counter", f"Generator client {field}.",
+                [({}, client_stats[field])],
+            ))
+        families.append((
+            "therabot_generator_in_flight", "gauge", "Generation calls currently holding a slot.",
+            [({}, client_stats["in_flight"])],
+        ))
+        families.append((
+            "therabot_generator_circuit_open", "gauge", "1 while the generator circuit breaker is open.",
+            [({}, 1 if client_stats["circuit_state"] == "open" else 0)],
+        ))
+    return families
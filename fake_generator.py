@@ -0,0 +1,164 @@
+"""Local stand-in for the Gemini generation backend.
+
+``FakeGeneratorBackend`` implements the subset of
+``google.generativeai.GenerativeModel`` the chatbot uses
+(``generate_content(prompt, stream=False, request_options=None)``) and returns
+objects shaped like Gemini responses. Latency, errors and safety blocks are
+drawn from an RNG seeded by ``(seed, prompt, n-th occurrence of prompt)``, so
+the same workload produces the same outcomes regardless of thread scheduling,
+without network access or an API key. Occurrences are counted for the
+``max_prompts`` most recently seen prompts only, so a long run does not grow
+memory without bound.
+
+Select it with ``THERABOT_GENERATOR_BACKEND=fake``; ``from_env`` reads the
+``THERABOT_FAKE_*`` settings.
+"""
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+FAKE_REPLIES = [
+    "Thank you for sharing that with me. It sounds like a lot to carry, and I'm here to listen. 💙",
+    "That makes a lot of sense. Would you like to try a slow breathing exercise together? 🌬️",
+    "I hear you. What do you think has been weighing on you the most today? 🫂",
+    "It's wonderful that you noticed that feeling. What helped you get there? 🌟",
+]
+# Including this marker in a prompt always produces a safety block
+BLOCK_TRIGGER = "[[fake-block]]"
+
+
+class FakeBackendError(ConnectionError):
+    """Injected upstream failure."""
+
+    def __init__(self, message, code=503):
+        super().__init__(message)
+        self.code = code
+
+
+class _Feedback:
+    def __init__(self, block_reason=None):
+        self.block_reason = block_reason
+
+
+class FakeChunk:
+    def __init__(self, text, block_reason=None):
+        self.text = text
+        self.parts = [text] if text else []
+        self.prompt_feedback = _Feedback(block_reason)
+
+
+class FakeResponse:
+    """Gemini-like response: ``parts``/``text``/``prompt_feedback``, iterable as chunks."""
+
+    def __init__(self, chunks, block_reason=None, chunk_delays=None, sleep=time.sleep):
+        self._chunks = chunks
+        self._chunk_delays = chunk_delays or [0.0] * len(chunks)
+        self._sleep = sleep
+        self.prompt_feedback = _Feedback(block_reason)
+        self.parts = [c for c in chunks if c]
+        self.text = "".join(chunks)
+
+    def __iter__(self):
+        if not self._chunks:
+            yield FakeChunk("", self.prompt_feedback.block_reason)
+            return
+        for chunk, delay in zip(self._chunks, self._chunk_delays):
+            if delay:
+                self._sleep(delay)
+            yield FakeChunk(chunk)
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec into ``rng -> seconds``.
+
+    ``fixed:0.5``, ``uniform:0.2:1.0``, ``exponential:0.5`` (mean) or
+    ``lognormal:0.8:0.5`` (median, sigma). A bare number means ``fixed``.
+    """
+    parts = str(spec).split(":")
+    if len(parts) == 1:
+        parts = ["fixed", parts[0]]
+    kind, args = parts[0], [float(p) for p in parts[1:]]
+    if kind == "fixed":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(args[0]), args[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeGeneratorBackend:
+    """Deterministic fake generator with configurable latency, errors and safety blocks."""
+
+    def __init__(self, latency="fixed:0.05", first_chunk_fraction=0.3, error_rate=0.0,
+                 block_rate=0.0, seed=0, replies=None, chunk_size=4, sleep=time.sleep, max_prompts=10000):
+        self.sample_latency = parse_latency(latency)
+        self.first_chunk_fraction = first_chunk_fraction
+        self.error_rate = error_rate
+        self.block_rate = block_rate
+        self.seed = seed
+        self.replies = replies or FAKE_REPLIES
+        self.chunk_size = chunk_size
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.max_prompts = max(1, int(max_prompts))
+        self._occurrences = OrderedDict()  # prompt digest -> times seen, least recent first
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=os.getenv("THERABOT_FAKE_LATENCY", "lognormal:0.8:0.4"),
+            first_chunk_fraction=float(os.getenv("THERABOT_FAKE_FIRST_CHUNK_FRACTION", "0.3")),
+            error_rate=float(os.getenv("THERABOT_FAKE_ERROR_RATE", "0")),
+            block_rate=float(os.getenv("THERABOT_FAKE_BLOCK_RATE", "0")),
+            seed=int(os.getenv("THERABOT_FAKE_SEED", "0")),
+        )
+
+    def _rng(self, prompt):
+        with self._lock:
+            self.calls += 1
+            key = hashlib.sha256(str(prompt).encode("utf8")).digest()
+            occurrence = self._occurrences.pop(key, 0)
+            self._occurrences[key] = occurrence + 1
+            if len(self._occurrences) > self.max_prompts:
+                self._occurrences.popitem(last=False)
+        digest = hashlib.sha256(f"{self.seed}:{occurrence}:{prompt}".encode("utf8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _chunks(self, reply):
+        words = reply.split(" ")
+        chunks = [" ".join(words[i:i + self.chunk_size]) + " " for i in range(0, len(words), self.chunk_size)]
+        chunks[-1] = chunks[-1].rstrip()
+        return chunks
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        rng = self._rng(prompt)
+        delay = max(self.sample_latency(rng), 0.0)
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            self._sleep(timeout)
+            raise TimeoutError(f"Fake backend exceeded request timeout of {timeout:.2f}s")
+        if rng.random() < self.error_rate:
+            # Failures surface after a short connect/handshake delay
+            self._sleep(delay * 0.1)
+            raise FakeBackendError("Fake backend injected 503 Service Unavailable")
+        if BLOCK_TRIGGER in prompt or rng.random() < self.block_rate:
+            self._sleep(delay * 0.1)
+            return FakeResponse([], block_reason="SAFETY")
+
+        chunks = self._chunks(rng.choice(self.replies))
+        if not stream:
+            self._sleep(delay)
+            return FakeResponse(chunks)
+        # The first chunk arrives after a fraction of the total; the rest is spread evenly
+        first = delay * self.first_chunk_fraction
+        rest = (delay - first) / max(len(chunks) - 1, 1)
+        return FakeResponse(chunks, chunk_delays=[first] + [rest] * (len(chunks) - 1), sleep=self._sleep)
@@ -0,0 +1,342 @@
+"""Resilient client around the text-generation backend (Gemini).
+
+``GeneratorClient`` wraps any object with a
+``generate_content(prompt, stream=False, request_options=None)`` method and adds:
+
+* a bounded concurrency semaphore, so a burst of slow upstream calls cannot
+  occupy every worker thread;
+* a per-call deadline covering queueing, the call itself and any retries;
+* exponential backoff with full jitter for retryable errors;
+* a circuit breaker that fails fast while the upstream is unhealthy;
+* ``agenerate`` for asyncio callers.
+
+Errors surface as ``ConnectionError`` / ``TimeoutError`` subclasses so the
+chatbot's existing error replies keep working.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from observability import record_event
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised without calling the backend while the circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """The call (including queueing and retries) ran past its deadline."""
+
+
+class GeneratorBusyError(TimeoutError):
+    """No concurrency slot became free before the deadline."""
+
+
+# HTTP-style status codes worth retrying; other 4xx errors will not succeed on retry
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    if isinstance(error, (CircuitOpenError, GeneratorBusyError)):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_CODES
+    return True
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open breaker keyed on consecutive failures."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        """
+        Raise ``CircuitOpenError`` unless a call may go through now. Returns
+        True if the call is the half-open probe; its caller must then call
+        ``release_probe`` once the call is over, however it ended.
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                # Let exactly one probe through to test the upstream
+                self._probe_in_flight = True
+                return True
+        raise CircuitOpenError("Generation backend unavailable (circuit open)")
+
+    def release_probe(self):
+        """
+        Free the probe slot if no outcome was recorded for the probe (it was
+        cancelled or its stream closed early), so the next call can probe.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probe_in_flight:
+                    self.times_opened += 1
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+
+class GeneratorClient:
+    """Concurrency-limited, deadline-bounded, retrying client for a generation backend."""
+
+    def __init__(self, backend, max_concurrency=8, deadline=30.0, max_retries=3,
+                 base_delay=0.5, max_delay=4.0, breaker=None, sleep=time.sleep):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        # agenerate's backend calls; each running one holds a slot, so this never backs up
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._sleep = sleep
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "in_flight": 0}
+
+    def _count(self, key, delta=1):
+        with self._stats_lock:
+            self.stats[key] += delta
+
+    def backoff(self, attempt):
+        """Full-jitter delay before retry number ``attempt`` (1-based)."""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+    def _check_open(self):
+        # Fail fast before queueing for a slot while the upstream is known to be down
+        if self.breaker.state == CircuitBreaker.OPEN:
+            self._count("rejected")
+            record_event("circuit_open_rejection")
+            raise CircuitOpenError("Generation backend unavailable (circuit open)")
+
+    def _acquired(self, acquired):
+        if not acquired:
+            self._count("rejected")
+            raise GeneratorBusyError("All generation slots busy; deadline reached while queued")
+        self._count("in_flight")
+        self._count("calls")
+
+    def _release(self):
+        self._count("in_flight", -1)
+        self._semaphore.release()
+
+    def _before_attempt(self, expires_at):
+        """Returns ``(timeout, probe)``; ``probe`` is True for the breaker's half-open probe."""
+        if time.monotonic() >= expires_at:
+            raise DeadlineExceededError("Generation deadline exceeded")
+        probe = self.breaker.before_call()
+        return max(expires_at - time.monotonic(), 0.001), probe
+
+    def _retry_delay(self, error, attempt, expires_at, probe=False):
+        """Record a failed attempt and return the backoff delay, or raise if it should not be retried."""
+        retryable = is_retryable(error)
+        # A failed probe reopens the breaker whatever the error, or it would stay half-open
+        if retryable or probe:
+            self.breaker.record_failure()
+        self._count("failures")
+        logger.warning("API call attempt %d/%d failed: %s", attempt, self.max_retries, error)
+        if not retryable or attempt >= self.max_retries:
+            raise error
+        delay = self.backoff(attempt)
+        if time.monotonic() + delay >= expires_at:
+            raise DeadlineExceededError("Generation deadline exceeded while backing off") from error
+        self._count("retries")
+        record_event("generation_retry")
+        return delay
+
+    def generate(self, prompt, deadline=None):
+        """Blocking, non-streaming generation; returns the backend's response object."""
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        self._check_open()
+        self._acquired(self._semaphore.acquire(timeout=max(expires_at - time.monotonic(), 0)))
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                timeout, probe = self._before_attempt(expires_at)
+                try:
+                    response = self.backend.generate_content(prompt, request_options={"timeout": timeout})
+                except Exception as e:
+                    self._sleep(self._retry_delay(e, attempt, expires_at, probe))
+                    continue
+                else:
+                    self.breaker.record_success()
+                    return response
+                finally:
+                    if probe:
+                        self.breaker.release_probe()
+        finally:
+            self._release()
+
+    def stream(self, prompt, deadline=None):
+        """
+        Streaming generation; yields backend chunks.
+
+        Retries only happen before the first chunk is produced, since later
+        retries would duplicate text the caller has already consumed. The
+        concurrency slot is held until the stream is exhausted or closed.
+        """
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        self._check_open()
+        self._acquired(self._semaphore.acquire(timeout=max(expires_at - time.monotonic(), 0)))
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                timeout, probe = self._before_attempt(expires_at)
+                emitted = False
+                try:
+                    for chunk in self.backend.generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+                        emitted = True
+                        yield chunk
+                except GeneratorExit:
+                    # The caller stopped reading; the upstream was answering
+                    self.breaker.record_success()
+                    raise
+                except Exception as e:
+                    if emitted:
+                        self.breaker.record_failure()
+                        self._count("failures")
+                        raise
+                    self._sleep(self._retry_delay(e, attempt, expires_at, probe))
+                    continue
+                else:
+                    self.breaker.record_success()
+                    return
+                finally:
+                    if probe:
+                        self.breaker.release_probe()
+        finally:
+            self._release()
+
+    def _call_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="generator-call")
+        return self._executor
+
+    async def _acquire_async(self, timeout):
+        """Wait for a slot without blocking the event loop; a slot taken after the caller was cancelled is given back."""
+        lock = threading.Lock()
+        state = {"abandoned": False, "acquired": False}
+
+        def acquire():
+            acquired = self._semaphore.acquire(timeout=timeout)
+            with lock:
+                if acquired and state["abandoned"]:
+                    self._semaphore.release()
+                    return False
+                state["acquired"] = acquired
+            return acquired
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, acquire)
+        except asyncio.CancelledError:
+            with lock:
+                state["abandoned"] = True
+                if state["acquired"]:
+                    self._semaphore.release()
+            raise
+
+    async def agenerate(self, prompt, deadline=None):
+        """
+        asyncio variant of ``generate``. The slot is awaited on the default
+        executor and the blocking backend call runs on the client's own pool;
+        backoff uses ``asyncio.sleep``. A call abandoned by a timeout or a
+        cancelled task keeps its slot until the backend returns.
+        """
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        self._check_open()
+        self._acquired(await self._acquire_async(max(expires_at - time.monotonic(), 0)))
+        pending = None
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                timeout, probe = self._before_attempt(expires_at)
+                pending = self._call_executor().submit(
+                    self.backend.generate_content, prompt, request_options={"timeout": timeout})
+                try:
+                    response = await asyncio.wait_for(asyncio.wrap_future(pending), timeout)
+                except asyncio.TimeoutError:
+                    await asyncio.sleep(self._retry_delay(
+                        DeadlineExceededError("Generation attempt timed out"), attempt, expires_at, probe))
+                    continue
+                except Exception as e:
+                    await asyncio.sleep(self._retry_delay(e, attempt, expires_at, probe))
+                    continue
+                else:
+                    self.breaker.record_success()
+                    return response
+                finally:
+                    # Also reached when the task is cancelled
+                    if probe:
+                        self.breaker.release_probe()
+        finally:
+            if pending is not None and not pending.done():
+                # The backend is still working on it: keep the slot until it returns
+                pending.add_done_callback(lambda _: self._release())
+            else:
+                self._release()
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["circuit_state"] = self.breaker.state
+        stats["circuit_opened"] = self.breaker.times_opened
+        return stats
+
+
+def client_from_env(backend):
+    return GeneratorClient(
+        backend,
+        max_concurrency=int(os.getenv("THERABOT_GEN_MAX_CONCURRENCY", "8")),
+        deadline=float(os.getenv("THERABOT_GEN_DEADLINE_SECONDS", "30")),
+        max_retries=int(os.getenv("THERABOT_GEN_MAX_RETRIES", "3")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("THERABOT_GEN_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("THERABOT_GEN_BREAKER_RESET_SECONDS", "30")),
+        ),
+    )
@@ -0,0 +1,83 @@
+"""Production serving with gunicorn: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+The master process imports the app (``preload_app``) and runs the fork-safe
+part of the model warm-up (app/warmup.py: classifier, embedder, knowledge-base
+index, lexicon and cascade) before forking any worker, so every worker shares
+the model weights, the memory-mapped knowledge-base index and the rest of the
+master's heap copy-on-write instead of loading its own copy. ``gc.freeze()``
+keeps the garbage collector from writing to (and so copying) those shared
+objects. The generator client holds a gRPC channel, which does not survive a
+fork, so each worker creates and probes its own in the background as it
+boots; ``/readyz`` reports 503 until that has finished.
+
+Sizing, for C usable cores:
+
+* workers, W = ``THERABOT_WORKERS`` (default C): emotion classification and
+  embedding are CPU-bound and hold the GIL for part of each pass, so
+  processes, not threads, scale them across cores. Each worker beyond the
+  first costs only its private memory (``benchmarks/bench_serving.py``
+  reports it); lower W if C x private memory does not fit.
+* request threads per worker, T = ``THERABOT_WORKER_THREADS`` (default 4):
+  most of a chat request waits on the generator API, and the emotion
+  batcher funnels a worker's classifier calls into one forward pass at a
+  time, so a few threads keep a core busy.
+* torch intra-op threads per worker, K = ``THERABOT_TORCH_THREADS``
+  (default max(1, C // W)), so that W x K <= C and workers never oversubscribe
+  the cores.
+
+The master keeps torch single-threaded: a child forked after the parent has
+used torch's OpenMP pool deadlocks in its first parallel op.
+"""
+import gc
+import os
+
+try:
+    cores = len(os.sched_getaffinity(0))
+except AttributeError:
+    cores = os.cpu_count() or 1
+
+bind = os.getenv("THERABOT_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("THERABOT_WORKERS") or cores)
+threads = int(os.getenv("THERABOT_WORKER_THREADS", "4"))
+worker_class = "gthread"
+preload_app = True
+timeout = int(os.getenv("THERABOT_WORKER_TIMEOUT", "120"))
+torch_threads = int(os.getenv("THERABOT_TORCH_THREADS") or max(1, cores // workers))
+
+# Tokenizers' Rust thread pool is not fork-safe either
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+# The master warms up in on_starting, once torch is pinned to one thread;
+# a blocking warm-up inside create_app would run before that
+if os.getenv("THERABOT_WARM_UP") != "off":
+    os.environ["THERABOT_WARM_UP"] = "background"
+    os.environ.pop("THERABOT_PRELOAD_MODELS", None)
+# Write-behind's read-your-writes only covers turns queued in the same process
+# (app/chat_writer.py); a user's next request may go to another worker
+write_behind_disabled = workers > 1 and os.getenv("THERABOT_CHAT_WRITE_BEHIND") == "1"
+if write_behind_disabled:
+    os.environ["THERABOT_CHAT_WRITE_BEHIND"] = "0"
+
+
+def on_starting(server):
+    """Load the fork-safe models once in the master, before the first fork."""
+    import torch
+    from app.warmup import warmup_for_app
+    from emotion_chatbot import FORK_SAFE_WARM_UP_STEPS
+
+    if write_behind_disabled:
+        server.log.warning("THERABOT_CHAT_WRITE_BEHIND ignored: it needs a single worker, running %d", workers)
+    torch.set_num_threads(1)
+    warmup = warmup_for_app(server.app.wsgi())
+    warmup.run(FORK_SAFE_WARM_UP_STEPS)
+    server.log.info("Models loaded in the master; forking %d workers x %d threads, "
+                    "%d torch thread(s) each", workers, threads, torch_threads)
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Create and probe this worker's own generator client in the background."""
+    import torch
+    from app.warmup import warmup_for_app
+
+    torch.set_num_threads(torch_threads)
+    warmup_for_app(server.app.wsgi()).start()
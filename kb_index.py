@@ -0,0 +1,168 @@
+"""Precomputed, on-disk embedding index for the knowledge base.
+
+The knowledge base is compiled once into a normalized float32 embedding
+matrix whose rows are grouped by emotion, plus a small JSON sidecar holding
+the texts and each emotion's ``[start, end)`` row range. Both files are keyed
+by the JSON's content hash and the embedder name, and the matrix is opened
+with ``mmap_mode='r'`` so several workers share the same pages. The JSON is
+only re-hashed when its mtime or size changes, and only re-embedded when the
+hash does.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from retrieval import make_searcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.getenv("THERABOT_KB_INDEX_DIR", "kb_index")
+
+
+class KnowledgeIndex:
+    """An immutable snapshot of the compiled knowledge base."""
+
+    def __init__(self, embeddings, texts, partitions, content_hash, model_name, base=None):
+        self.embeddings = embeddings
+        self.texts = texts
+        self.partitions = partitions
+        self.content_hash = content_hash
+        self.model_name = model_name
+        self.base = base
+        self._searcher = None
+        self._searcher_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def searcher(self):
+        """Exact or IVF engine (see retrieval.py), built on first use."""
+        if self._searcher is None:
+            with self._searcher_lock:
+                if self._searcher is None:
+                    cache_path = f"{self.base}.ivf.npz" if self.base else None
+                    self._searcher = make_searcher(self.embeddings, self.partitions, cache_path=cache_path)
+        return self._searcher
+
+    def search_batch(self, query_embeddings, emotion=None, k=1):
+        """Return one ``[(text, score), ...]`` list per query row, best first."""
+        if not len(self.texts) or k <= 0:
+            return [[] for _ in range(len(np.atleast_2d(query_embeddings)))]
+        scores, rows = self.searcher.search(query_embeddings, emotion, k)
+        return [
+            [(self.texts[row], float(score)) for score, row in zip(query_scores, query_rows) if row >= 0]
+            for query_scores, query_rows in zip(scores, rows)
+        ]
+
+    def search(self, query_embedding, emotion=None, k=1):
+        """Return ``[(text, score), ...]`` for the ``k`` nearest entries by cosine similarity."""
+        return self.search_batch(np.atleast_2d(query_embedding), emotion, k)[0]
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+
+def compile_index(knowledge_data, embedder, model_name, content_hash, index_dir):
+    """Embed ``knowledge_data`` and write the matrix and metadata to ``index_dir``."""
+    os.makedirs(index_dir, exist_ok=True)
+    # Group rows by emotion so each emotion is one contiguous slice of the matrix
+    entries = sorted(knowledge_data, key=lambda entry: entry.get("emotion", ""))
+    texts = [entry["text"] for entry in entries]
+    partitions = {}
+    for row, entry in enumerate(entries):
+        emotion = entry.get("emotion", "")
+        start, _ = partitions.get(emotion, (row, row))
+        partitions[emotion] = (start, row + 1)
+
+    if texts:
+        embeddings = embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    else:
+        embeddings = np.zeros((0, 0), dtype=np.float32)
+
+    base = os.path.join(index_dir, f"kb-{content_hash[:16]}-{_slug(model_name)}")
+    # Write to temp files and rename so concurrent readers never see a partial index
+    tmp_matrix = f"{base}.{os.getpid()}.tmp.npy"
+    np.save(tmp_matrix, embeddings)
+    os.replace(tmp_matrix, f"{base}.npy")
+    tmp_meta = f"{base}.{os.getpid()}.tmp.json"
+    with open(tmp_meta, "w") as f:
+        json.dump({
+            "content_hash": content_hash,
+            "model_name": model_name,
+            "texts": texts,
+            "partitions": partitions,
+        }, f)
+    os.replace(tmp_meta, f"{base}.json")
+    return base
+
+
+def open_index(base):
+    """Memory-map a compiled index written by ``compile_index``."""
+    with open(f"{base}.json") as f:
+        meta = json.load(f)
+    embeddings = np.load(f"{base}.npy", mmap_mode="r")
+    partitions = {emotion: tuple(rows) for emotion, rows in meta["partitions"].items()}
+    return KnowledgeIndex(embeddings, meta["texts"], partitions, meta["content_hash"], meta["model_name"], base)
+
+
+class KnowledgeBaseIndex:
+    """Keeps a compiled index in sync with the knowledge base JSON file."""
+
+    def __init__(self, kb_path, load_data, get_embedder, model_name, index_dir=DEFAULT_INDEX_DIR):
+        self.kb_path = kb_path
+        self.load_data = load_data
+        self.get_embedder = get_embedder
+        self.model_name = model_name
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._index = None
+        self._file_sig = None
+
+    def _signature(self):
+        try:
+            st = os.stat(self.kb_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def current(self):
+        """Return the up-to-date index, rebuilding only if the JSON content changed."""
+        signature = self._signature()
+        if self._index is not None and signature == self._file_sig:
+            return self._index
+        with self._lock:
+            signature = self._signature()
+            if self._index is not None and signature == self._file_sig:
+                return self._index
+            # load_data creates a default knowledge base if the file is missing
+            knowledge_data = self.load_data()
+            content_hash = hashlib.sha256(
+                json.dumps(knowledge_data, sort_keys=True).encode("utf8")
+            ).hexdigest()
+            if self._index is None or self._index.content_hash != content_hash:
+                self._index = self._open_or_compile(knowledge_data, content_hash)
+            self._file_sig = self._signature()
+            return self._index
+
+    def _open_or_compile(self, knowledge_data, content_hash):
+        base = os.path.join(self.index_dir, f"kb-{content_hash[:16]}-{_slug(self.model_name)}")
+        if os.path.exists(f"{base}.npy") and os.path.exists(f"{base}.json"):
+            try:
+                index = open_index(base)
+                if index.content_hash == content_hash and index.model_name == self.model_name:
+                    logger.info("Opened knowledge base index %s (%d entries)", base, len(index))
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Knowledge base index %s unreadable, rebuilding: %s", base, e)
+        compile_index(knowledge_data, self.get_embedder(), self.model_name, content_hash, self.index_dir)
+        index = open_index(base)
+        logger.info("Compiled knowledge base index %s (%d entries)", base, len(index))
+        return index
@@ -0,0 +1,201 @@
+"""Compiled keyword lexicon for emotion cues and chat triggers.
+
+``lexicon.json`` (or the file named by ``THERABOT_LEXICON``) lists weighted
+emotion cues and named trigger phrases::
+
+    {"emotions": {"sad": {"sad": 1.0, "feeling down": 1.0, ...}, ...},
+     "triggers": {"music_request": ["play peaceful", ...], ...}}
+
+Every phrase is compiled into one Aho-Corasick automaton over word tokens, so
+a message is scanned once, in time linear in its length, however many cues
+there are, and matches always fall on word boundaries ("good" no longer
+matches "goodbye"). A single-word cue ending in ``*`` matches any word with
+that prefix (``concern*`` matches "concerned" and "concerning").
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+LEXICON_PATH = os.getenv(
+    "THERABOT_LEXICON", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon.json")
+)
+# Ties between equally scored emotions go to the earlier one
+EMOTION_PRIORITY = ("angry", "sad", "worried", "happy", "neutral")
+
+_TOKEN_RE = re.compile(r"[\w']+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.casefold())
+
+
+class LexiconMatch:
+    """Everything one scan found: summed emotion weights, triggers and the phrases hit."""
+
+    __slots__ = ("scores", "triggers", "hits")
+
+    def __init__(self):
+        self.scores = {}
+        self.triggers = set()
+        self.hits = []
+
+    def emotion(self, default="neutral"):
+        """The highest-scoring emotion, or ``default`` if no cue matched."""
+        if not self.scores:
+            return default
+        best = max(self.scores.values())
+        for emotion in EMOTION_PRIORITY:
+            if self.scores.get(emotion) == best:
+                return emotion
+        return max(self.scores, key=self.scores.get)
+
+
+class LexiconMatcher:
+    """Aho-Corasick automaton over word tokens, plus a table of prefix cues."""
+
+    def __init__(self, emotions=None, triggers=None):
+        # Each phrase's actions: ("emotion", label, weight) or ("trigger", name, None)
+        self._actions = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._prefixes = {}
+        for emotion, cues in (emotions or {}).items():
+            for phrase, weight in cues.items():
+                self._add(phrase, ("emotion", emotion, float(weight)))
+        for name, phrases in (triggers or {}).items():
+            for phrase in phrases:
+                self._add(phrase, ("trigger", name, None))
+        self._prefix_lengths = sorted({len(p) for p in self._prefixes})
+        # Most words are in no phrase: they reset the automaton and need no transition lookups
+        self._vocab = frozenset(token for edges in self._goto for token in edges)
+        shortest = self._prefix_lengths[0] if self._prefix_lengths else 0
+        self._prefix_heads = frozenset(p[:shortest] for p in self._prefixes)
+        self._shortest_prefix = shortest
+        self._link()
+
+    @classmethod
+    def from_file(cls, path=LEXICON_PATH):
+        with open(path, encoding="utf8") as f:
+            data = json.load(f)
+        return cls(data.get("emotions"), data.get("triggers"))
+
+    @property
+    def size(self):
+        return len(self._actions)
+
+    def _add(self, phrase, action):
+        if phrase in self._actions:
+            self._actions[phrase].append(action)
+            return
+        self._actions[phrase] = [action]
+        if phrase.endswith("*"):
+            tokens = tokenize(phrase[:-1])
+            if len(tokens) != 1:
+                raise ValueError(f"Prefix cue {phrase!r} must be a single word")
+            self._prefixes.setdefault(tokens[0], []).append(phrase)
+            return
+        tokens = tokenize(phrase)
+        if not tokens:
+            raise ValueError(f"Empty lexicon phrase {phrase!r}")
+        state = 0
+        for token in tokens:
+            nxt = self._goto[state].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][token] = nxt
+            state = nxt
+        self._out[state].append(phrase)
+
+    def _link(self):
+        """Breadth-first failure links; each state's output includes its suffixes' outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(token, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text):
+        """Find every cue and trigger in ``text`` in one pass over its words."""
+        match = LexiconMatch()
+        goto, fail, out = self._goto, self._fail, self._out
+        vocab, heads, shortest = self._vocab, self._prefix_heads, self._shortest_prefix
+        state = 0
+        for token in tokenize(text):
+            if token in vocab:
+                while state and token not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(token, 0)
+                if out[state]:
+                    for phrase in out[state]:
+                        self._apply(match, phrase)
+            else:
+                state = 0
+            if heads and token[:shortest] in heads:
+                self._match_prefixes(match, token)
+        return match
+
+    def _match_prefixes(self, match, token):
+        for length in self._prefix_lengths:
+            if length > len(token):
+                break
+            for phrase in self._prefixes.get(token[:length], ()):
+                self._apply(match, phrase)
+
+    def _apply(self, match, phrase):
+        for kind, name, weight in self._actions[phrase]:
+            if kind == "emotion":
+                match.scores[name] = match.scores.get(name, 0.0) + weight
+            else:
+                match.triggers.add(name)
+        match.hits.append(phrase)
+
+
+class Lexicon:
+    """The lexicon file, compiled on first use and recompiled when it changes."""
+
+    def __init__(self, path=LEXICON_PATH):
+        self.path = path
+        self._matcher = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def matcher(self):
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+        if self._matcher is None or signature != self._signature:
+            with self._lock:
+                if self._matcher is None or signature != self._signature:
+                    try:
+                        self._matcher = LexiconMatcher.from_file(self.path)
+                        logger.info("Compiled %d lexicon phrases from %s", self._matcher.size, self.path)
+                    except (OSError, ValueError) as e:
+                        # Keep the last good lexicon; with none, nothing matches
+                        logger.error("Could not load lexicon %s: %s", self.path, e)
+                        if self._matcher is None:
+                            self._matcher = LexiconMatcher()
+                    self._signature = signature
+        return self._matcher
+
+    def scan(self, text):
+        return self.matcher().scan(text)
+
+
+lexicon = Lexicon()
@@ -1,5 +1,8 @@
 # run.py (or your main execution script)
+import os
+
 from app import create_app
+from app.warmup import warmup_for_app
 
 # Create the Flask app instance using the factory
 app = create_app()
@@ -11,9 +14,9 @@ if __name__ == '__main__':
     # This uses the default host '127.0.0.1' (localhost) and port 5000
     # It also enables the interactive debugger and automatic reloader
     print("Starting Flask app in LOCAL DEBUG mode on http://127.0.0.1:5000")
+    # With the reloader, this first process only watches files and restarts a
+    # child (WERKZEUG_RUN_MAIN=true) that serves; only the child loads the
+    # models, in the background, while pages are already being served.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and app.config['WARM_UP'] == 'background':
+        warmup_for_app(app).start()
     app.run(debug=True)
-    # The reloader might cause the AI models to load twice if 'load_models'
-    # is called directly at the top level of routes.py. If this is an issue,
-    # you might need to implement lazy loading or disable the reloader
-    # temporarily (app.run(debug=True, use_reloader=False)), but the
-    # reloader is very convenient for development.
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""Process-wide registry of warm ML models.
+
+Loading the sentiment classifier and the sentence embedder takes seconds and
+several hundred MB, so every caller shares a single instance of each. Models
+are loaded lazily on first use (or eagerly via ``warm_up``), switched to eval
+mode with gradients disabled, and never reloaded for the life of the process.
+torch and transformers are only imported when the first model loads, so
+importing this module (and the app) stays cheap.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLASSIFIER_NAME = "tabularisai/multilingual-sentiment-analysis"
+EMBEDDER_NAME = "paraphrase-MiniLM-L3-v2"
+# Output index -> emotion label for the sentiment classifier
+CLASSIFIER_LABELS = {0: "sad", 1: "neutral", 2: "happy", 3: "angry", 4: "worried"}
+
+
+def _process_rss_bytes():
+    """Best-effort resident set size of the current process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is a peak value (KB on Linux, bytes on macOS) but still a useful signal
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return 0
+
+
+def _tensor_bytes(module):
+    """Bytes held by a module's weights, including packed int8 weights of quantized layers."""
+    import torch
+
+    def size(value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(size(v) for v in value)
+        return 0
+    return sum(size(value) for value in module.state_dict().values())
+
+
+class ModelRegistry:
+    """Thread-safe, load-once holder for the classifier, tokenizer and embedder."""
+
+    def __init__(self, classifier_name=CLASSIFIER_NAME, embedder_name=EMBEDDER_NAME, classifier_mode=None):
+        self.classifier_name = classifier_name
+        self.embedder_name = embedder_name
+        # fp32 | int8 | traced | int8-traced; see classifier_modes.py (not imported
+        # here because it imports torch)
+        self.classifier_mode = classifier_mode or os.getenv("THERABOT_CLASSIFIER_MODE", "fp32")
+        # Re-entrant: loading the classifier may load the tokenizer it depends on
+        self._lock = threading.RLock()
+        self._models = {}
+        self._stats = {}
+
+    def _load(self, key, loader):
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                return model
+            import torch
+            rss_before = _process_rss_bytes()
+            start = time.perf_counter()
+            model = loader()
+            elapsed = time.perf_counter() - start
+            rss_after = _process_rss_bytes()
+            self._models[key] = model
+            self._stats[key] = {
+                "load_seconds": round(elapsed, 3),
+                "param_bytes": _tensor_bytes(model) if isinstance(model, torch.nn.Module) else 0,
+                "rss_delta_bytes": max(rss_after - rss_before, 0),
+            }
+            logger.info("Loaded %s in %.2fs (~%.0f MB weights)",
+                        key, elapsed, self._stats[key]["param_bytes"] / 1e6)
+            return model
+
+    def _load_tokenizer(self):
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(self.classifier_name)
+
+    def _load_fp32_classifier(self):
+        from transformers import AutoModelForSequenceClassification
+        model = AutoModelForSequenceClassification.from_pretrained(self.classifier_name)
+        model.eval()
+        model.requires_grad_(False)
+        return model
+
+    def _load_classifier(self):
+        from classifier_modes import load_classifier
+        return load_classifier(self.classifier_name, self.tokenizer(), self._load_fp32_classifier,
+                               mode=self.classifier_mode)
+
+    def _load_embedder(self):
+        from sentence_transformers import SentenceTransformer
+        embedder = SentenceTransformer(self.embedder_name)
+        embedder.eval()
+        embedder.requires_grad_(False)
+        return embedder
+
+    def tokenizer(self):
+        return self._load("tokenizer", self._load_tokenizer)
+
+    def classifier(self):
+        """Return the shared ``(tokenizer, model)`` pair for emotion detection."""
+        return self.tokenizer(), self._load("classifier", self._load_classifier)
+
+    def embedder(self):
+        return self._load("embedder", self._load_embedder)
+
+    def warm_up(self):
+        """Eagerly load every model so the first request does not pay for it."""
+        self.classifier()
+        self.embedder()
+
+    def is_loaded(self, key):
+        return key in self._models
+
+    def stats(self):
+        """Load time and memory footprint for each model loaded so far."""
+        with self._lock:
+            stats = {key: dict(value) for key, value in self._stats.items()}
+        stats["process_rss_bytes"] = _process_rss_bytes()
+        return stats
+
+
+registry = ModelRegistry()
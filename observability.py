@@ -0,0 +1,216 @@
+"""Metrics, timing spans and logging setup.
+
+A small, dependency-free metrics registry that renders the Prometheus text
+exposition format for the ``/metrics`` endpoint:
+
+* ``Counter`` and ``Histogram`` instruments with labels;
+* ``span(stage)``, a context manager/decorator that records how long a
+  pipeline stage took into the ``therabot_stage_seconds`` histogram;
+* collectors, callbacks that report values owned by other components
+  (cache counters, model load stats, ...) at scrape time.
+
+``configure_logging`` routes log records through a ``QueueHandler`` so request
+threads never block on writing to stderr.
+"""
+import atexit
+import functools
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = key + (("le", _format_value(bound)),)
+                    lines.append(f"{self.name}_bucket{_format_labels(labels)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            return metric
+
+    def counter(self, name, documentation):
+        return self._get_or_create(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def register_collector(self, collector):
+        """
+        Register ``collector() -> [(name, type, help, [(labels_dict, value), ...]), ...]``,
+        called at scrape time for values owned by other components.
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                families = collector()
+            except Exception as e:
+                logging.getLogger(__name__).warning("Metrics collector %r failed: %s", collector, e)
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("therabot_stage_seconds", "Time spent in each chat pipeline stage.")
+events_total = metrics.counter(
+    "therabot_events_total", "Notable pipeline events (retries, fallbacks, safety blocks, ...)."
+)
+
+
+class span:
+    """Time a pipeline stage: ``with span("retrieve_context"):`` or ``@span("detect_emotion")``."""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._start
+        stage_seconds.observe(self.elapsed, stage=self.stage)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def record_event(event, **labels):
+    events_total.inc(event=event, **labels)
+
+
+_listener = None
+
+
+def configure_logging(level=None):
+    """Send log records through a queue drained by a background thread (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    level = level or os.getenv("THERABOT_LOG_LEVEL", "INFO")
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    log_queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def _restart_listener_in_child():
+    """The listener thread does not survive fork; give a forked worker its own queue and thread."""
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.Queue(-1)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is _listener.queue:
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_in_child)
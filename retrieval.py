@@ -0,0 +1,197 @@
+"""Top-k retrieval over the knowledge base embedding matrix.
+
+Two engines share one interface, ``search(queries, emotion=None, k=1)``,
+which takes a ``(Q, d)`` batch of normalized query vectors and returns
+``(scores, rows)`` arrays of shape ``(Q, k)`` (rows are global matrix rows,
+``-1`` where fewer than ``k`` candidates exist):
+
+* ``ExactSearcher`` scores every row of the emotion's slice with one
+  chunked matrix product.
+* ``IVFSearcher`` is an inverted-file index. Each emotion partition is
+  clustered with spherical k-means; a query scores the centroids of its
+  partition and only scans the ``nprobe`` closest lists.
+
+Because the matrix is grouped by emotion, filtering never rescans other
+emotions' rows in either mode.
+"""
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODE = os.getenv("THERABOT_RETRIEVAL_MODE", "auto")  # exact | ivf | auto
+IVF_NPROBE = int(os.getenv("THERABOT_IVF_NPROBE", "8"))
+# In "auto" mode the IVF index is only built for knowledge bases at least this large
+IVF_MIN_ROWS = int(os.getenv("THERABOT_IVF_MIN_ROWS", "50000"))
+
+
+def _topk(scores, k):
+    """Row-wise top-k of a ``(Q, n)`` score matrix, sorted descending."""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(n), scores.shape)
+    top = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-top, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+
+def _pad(scores, rows, k):
+    """Pad ``(Q, m)`` results with ``-inf`` / ``-1`` up to ``k`` columns."""
+    missing = k - scores.shape[1]
+    if missing <= 0:
+        return scores, rows
+    q = scores.shape[0]
+    return (np.hstack([scores, np.full((q, missing), -np.inf, dtype=scores.dtype)]),
+            np.hstack([rows, np.full((q, missing), -1, dtype=rows.dtype)]))
+
+
+def _as_queries(queries):
+    queries = np.asarray(queries, dtype=np.float32)
+    return queries[None, :] if queries.ndim == 1 else queries
+
+
+class ExactSearcher:
+    """Brute-force cosine similarity over an emotion's slice of the matrix."""
+
+    def __init__(self, embeddings, partitions, chunk_rows=65536):
+        self.embeddings = embeddings
+        self.partitions = partitions
+        self.chunk_rows = chunk_rows
+
+    def _range(self, emotion):
+        if emotion is None:
+            return 0, len(self.embeddings)
+        return self.partitions.get(emotion, (0, len(self.embeddings)))
+
+    def search(self, queries, emotion=None, k=1):
+        queries = _as_queries(queries)
+        start, end = self._range(emotion)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        # Chunking bounds the (Q, rows) score buffer for very large partitions
+        for lo in range(start, end, self.chunk_rows):
+            hi = min(lo + self.chunk_rows, end)
+            scores, idx = _topk(queries @ self.embeddings[lo:hi].T, k)
+            best_scores = np.hstack([best_scores, scores])
+            best_rows = np.hstack([best_rows, idx + lo])
+            if best_scores.shape[1] > k:
+                best_scores, order = _topk(best_scores, k)
+                best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return _pad(best_scores, best_rows, k)
+
+
+def _spherical_kmeans(vectors, nlist, iterations=10, sample_size=None, seed=0):
+    """Cluster normalized ``vectors`` and return ``(centroids, assignments)``."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, sample_size or 64 * nlist)
+    sample = vectors[np.sort(rng.choice(n, sample_size, replace=False))] if sample_size < n else np.asarray(vectors)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty clusters from random sample points
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = sums / norms
+    assignments = np.empty(n, dtype=np.int64)
+    for lo in range(0, n, 65536):
+        assignments[lo:lo + 65536] = np.argmax(vectors[lo:lo + 65536] @ centroids.T, axis=1)
+    return centroids.astype(np.float32), assignments
+
+
+class IVFSearcher:
+    """Inverted-file approximate search, one set of lists per emotion partition."""
+
+    def __init__(self, embeddings, centroids, centroid_ranges, list_offsets, list_rows, nprobe=IVF_NPROBE):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.centroid_ranges = centroid_ranges
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, embeddings, partitions, nlist=None, nprobe=IVF_NPROBE, iterations=10):
+        centroids, ranges, offsets, rows = [], {}, [0], []
+        for emotion, (start, end) in sorted(partitions.items(), key=lambda item: item[1]):
+            size = end - start
+            if size <= 0:
+                continue
+            part_nlist = max(1, min(size, nlist or int(np.sqrt(size))))
+            part_centroids, assignments = _spherical_kmeans(embeddings[start:end], part_nlist, iterations)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=part_nlist)
+            first = sum(len(c) for c in centroids)
+            ranges[emotion] = (first, first + part_nlist)
+            centroids.append(part_centroids)
+            rows.append(order + start)
+            offsets.extend((offsets[-1] + np.cumsum(counts)).tolist())
+        dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+        return cls(
+            embeddings,
+            np.vstack(centroids) if centroids else np.zeros((0, dim), dtype=np.float32),
+            ranges,
+            np.asarray(offsets, dtype=np.int64),
+            np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64),
+            nprobe,
+        )
+
+    def save(self, path):
+        emotions = sorted(self.centroid_ranges)
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows,
+                 emotions=np.asarray(emotions, dtype=str),
+                 ranges=np.asarray([self.centroid_ranges[e] for e in emotions], dtype=np.int64).reshape(-1, 2))
+
+    @classmethod
+    def load(cls, path, embeddings, nprobe=IVF_NPROBE):
+        data = np.load(path)
+        ranges = {str(e): tuple(int(x) for x in r) for e, r in zip(data["emotions"], data["ranges"])}
+        return cls(embeddings, data["centroids"], ranges, data["list_offsets"], data["list_rows"], nprobe)
+
+    def search(self, queries, emotion=None, k=1, nprobe=None):
+        queries = _as_queries(queries)
+        nprobe = nprobe or self.nprobe
+        c_start, c_end = self.centroid_ranges.get(emotion, (0, len(self.centroids)))
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        if c_end <= c_start:
+            return out_scores, out_rows
+        _, probes = _topk(queries @ self.centroids[c_start:c_end].T, nprobe)
+        probes += c_start
+        for q, query in enumerate(queries):
+            candidates = np.concatenate([
+                self.list_rows[self.list_offsets[l]:self.list_offsets[l + 1]] for l in probes[q]
+            ])
+            if not len(candidates):
+                continue
+            scores, idx = _topk((self.embeddings[candidates] @ query)[None, :], k)
+            out_scores[q, :scores.shape[1]] = scores[0]
+            out_rows[q, :idx.shape[1]] = candidates[idx[0]]
+        return out_scores, out_rows
+
+
+def make_searcher(embeddings, partitions, mode=RETRIEVAL_MODE, cache_path=None, nprobe=IVF_NPROBE):
+    """Pick an engine for ``mode``, loading or persisting the IVF index at ``cache_path``."""
+    use_ivf = mode == "ivf" or (mode == "auto" and len(embeddings) >= IVF_MIN_ROWS)
+    if not use_ivf or len(embeddings) == 0:
+        return ExactSearcher(embeddings, partitions)
+    if cache_path and os.path.exists(cache_path):
+        try:
+            return IVFSearcher.load(cache_path, embeddings, nprobe)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("IVF index %s unreadable, rebuilding: %s", cache_path, e)
+    searcher = IVFSearcher.build(embeddings, partitions, nprobe=nprobe)
+    if cache_path:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        searcher.save(tmp_path)
+        os.replace(tmp_path, cache_path)
+    return searcher
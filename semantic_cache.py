@@ -0,0 +1,143 @@
+"""Opt-in semantic cache for generated replies to generic, templated prompts.
+
+Entries are keyed on (detected emotion, query embedding): a new message under
+the same emotion whose embedding has cosine similarity >= ``threshold`` with a
+cached one reuses that reply instead of calling Gemini. Only messages that
+fall into an allow-listed *category* are ever looked up or stored, so replies
+to personal disclosures are never shared. Callers also skip the cache for
+prompts that include the user's conversation memory, whose replies may draw on
+it. The user's name is turned into a placeholder on store and filled back in on
+hit.
+"""
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+# Message categories considered safe to answer from cache. Anything that does
+# not match one of these patterns is "personal" and always goes to the model.
+CATEGORY_PATTERNS = {
+    "mood_update": re.compile(r"^i'?m feeling (happy|sad|angry|worried|neutral)$"),
+    "greeting": re.compile(r"^(hi|hello|hey|hiya|good (morning|afternoon|evening)|thanks|thank you|ok|okay)( there)?( therabot)?$"),
+    "coping_info": re.compile(
+        r"^(can you |could you |please )?(tell me about|what are|what is|how do i do|how can i do|explain|teach me|suggest|give me)"
+        r"( some| a| an)? (breathing exercises?|grounding( techniques?| exercises?)?|5-4-3-2-1|mindfulness|meditation|"
+        r"relaxation techniques?|coping (strategies|skills|techniques)|journaling prompts?|box breathing)$"
+    ),
+}
+DEFAULT_CATEGORIES = "mood_update,greeting,coping_info"
+USERNAME_PLACEHOLDER = "\x00username\x00"
+
+
+def categorize(message):
+    """Return the cacheable category for ``message``, or ``"personal"``."""
+    normalized = re.sub(r"\s+", " ", message).strip().casefold().rstrip("?!. ")
+    for category, pattern in CATEGORY_PATTERNS.items():
+        if pattern.match(normalized):
+            return category
+    return "personal"
+
+
+class _Entry:
+    __slots__ = ("embedding", "template", "category", "expires_at", "last_used", "generation_seconds")
+
+    def __init__(self, embedding, template, category, expires_at, generation_seconds):
+        self.embedding = embedding
+        self.template = template
+        self.category = category
+        self.expires_at = expires_at
+        self.last_used = time.monotonic()
+        self.generation_seconds = generation_seconds
+
+
+class SemanticResponseCache:
+    """Similarity-thresholded, TTL- and size-bounded reply cache partitioned by emotion."""
+
+    def __init__(self, enabled=False, threshold=0.92, ttl=6 * 3600.0, maxsize=512,
+                 categories=DEFAULT_CATEGORIES):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.categories = {c.strip() for c in categories.split(",") if c.strip()}
+        self._entries = {}  # emotion -> list[_Entry]
+        self._lock = threading.Lock()
+        self.counters = {"lookups": 0, "hits": 0, "misses": 0, "bypassed": 0,
+                         "stores": 0, "evictions": 0, "expirations": 0}
+        self.saved_seconds = 0.0
+        self.hit_similarity_sum = 0.0
+
+    def allows(self, message):
+        """Category of ``message`` if it may be served from cache, else ``None``."""
+        if not self.enabled:
+            return None
+        category = categorize(message)
+        if category not in self.categories:
+            with self._lock:
+                self.counters["bypassed"] += 1
+            return None
+        return category
+
+    def lookup(self, category, emotion, embedding, username):
+        """Return a cached reply personalized for ``username``, or ``None``."""
+        now = time.monotonic()
+        with self._lock:
+            self.counters["lookups"] += 1
+            entries = self._entries.get(emotion, [])
+            live = [e for e in entries if e.expires_at > now]
+            self.counters["expirations"] += len(entries) - len(live)
+            self._entries[emotion] = live
+            candidates = [e for e in live if e.category == category]
+            if candidates:
+                scores = np.stack([e.embedding for e in candidates]) @ embedding
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = candidates[best]
+                    entry.last_used = now
+                    self.counters["hits"] += 1
+                    self.saved_seconds += entry.generation_seconds
+                    self.hit_similarity_sum += float(scores[best])
+                    return entry.template.replace(USERNAME_PLACEHOLDER, username)
+            self.counters["misses"] += 1
+            return None
+
+    def store(self, category, emotion, embedding, reply, username, generation_seconds):
+        template = reply
+        if username:
+            template = re.sub(rf"\b{re.escape(username)}\b", USERNAME_PLACEHOLDER, reply)
+        entry = _Entry(np.asarray(embedding, dtype=np.float32), template, category,
+                       time.monotonic() + self.ttl, generation_seconds)
+        with self._lock:
+            self._entries.setdefault(emotion, []).append(entry)
+            self.counters["stores"] += 1
+            total = sum(len(v) for v in self._entries.values())
+            while total > self.maxsize:
+                # Evict the least recently used entry across all emotions
+                emotion_key, idx = min(
+                    ((key, i) for key, items in self._entries.items() for i in range(len(items))),
+                    key=lambda pair: self._entries[pair[0]][pair[1]].last_used,
+                )
+                del self._entries[emotion_key][idx]
+                self.counters["evictions"] += 1
+                total -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["size"] = sum(len(v) for v in self._entries.values())
+            stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+            stats["saved_seconds"] = round(self.saved_seconds, 3)
+            stats["mean_hit_similarity"] = round(self.hit_similarity_sum / stats["hits"], 4) if stats["hits"] else 0.0
+            stats["threshold"] = self.threshold
+            return stats
+
+
+response_cache = SemanticResponseCache(
+    enabled=os.getenv("THERABOT_SEMANTIC_CACHE", "0") == "1",
+    threshold=float(os.getenv("THERABOT_SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    ttl=float(os.getenv("THERABOT_SEMANTIC_CACHE_TTL_SECONDS", str(6 * 3600))),
+    maxsize=int(os.getenv("THERABOT_SEMANTIC_CACHE_SIZE", "512")),
+    categories=os.getenv("THERABOT_SEMANTIC_CACHE_CATEGORIES", DEFAULT_CATEGORIES),
+)
@@ -0,0 +1,53 @@
+"""``GeneratorClient.agenerate`` keeps its concurrency bound through cancellations and timeouts."""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_generator import FakeGeneratorBackend  # noqa: E402
+from generator_client import DeadlineExceededError, GeneratorBusyError, GeneratorClient  # noqa: E402
+
+
+class OverrunningBackend(FakeGeneratorBackend):
+    """Ignores the request timeout, like an upstream that keeps answering after the client gave up."""
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        return super().generate_content(prompt, stream=stream)
+
+
+def test_cancelled_while_queued_gives_the_slot_back():
+    client = GeneratorClient(FakeGeneratorBackend(latency="fixed:0.2"), max_concurrency=1, deadline=5)
+
+    async def scenario():
+        first = asyncio.ensure_future(client.agenerate("first"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(client.agenerate("queued"))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        await first
+        return await client.agenerate("after", deadline=1)
+
+    assert asyncio.run(scenario()).text
+    assert client.snapshot()["in_flight"] == 0
+    assert client._semaphore.acquire(blocking=False)
+
+
+def test_timed_out_call_keeps_its_slot_until_the_backend_returns():
+    client = GeneratorClient(OverrunningBackend(latency="fixed:0.5"), max_concurrency=1, deadline=0.1)
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(client.agenerate("slow"))
+    # The abandoned backend call is still running and still counts against the bound
+    with pytest.raises(GeneratorBusyError):
+        client.generate("next", deadline=0.05)
+
+    time.sleep(0.6)
+    assert client.snapshot()["in_flight"] == 0
+    assert client.generate("next", deadline=1).text
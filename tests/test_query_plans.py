@@ -0,0 +1,20 @@
+"""The hot queries in app/db.py are answered from indexes once every migration has run."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.db import available_migrations, check_query_plans, connect, migrate, schema_version  # noqa: E402
+
+
+def test_migrated_database_has_no_unindexed_hot_queries(tmp_path):
+    db = connect(str(tmp_path / "therabot.sqlite"))
+    with open(os.path.join(ROOT, "app", "schema.sql"), encoding="utf8") as f:
+        db.executescript(f.read())
+    migrate(db)
+    assert schema_version(db) == available_migrations()[-1][0]
+
+    problems = {name: (plan, problems) for name, (plan, problems) in check_query_plans(db).items() if problems}
+    db.close()
+    assert not problems
@@ -0,0 +1,11 @@
+"""WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+``main.py`` is the local development server (debugger and reloader); see
+``gunicorn.conf.py`` for how models are shared between workers and how
+workers and threads are sized.
+"""
+from app import create_app
+
+app = create_app()